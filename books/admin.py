@@ -1,6 +1,10 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR
+from django.utils import timezone
 
+from .catalog_cache import bump_catalog_version
 from .models import Book, Category
+from .search import search_books
 
 
 @admin.register(Category)
@@ -9,6 +13,11 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ("name",)
     ordering = ("name",)
 
+    def delete_queryset(self, request, queryset):
+        # 批量删除不经过 Category.delete
+        super().delete_queryset(request, queryset)
+        bump_catalog_version()
+
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
@@ -26,12 +35,25 @@ class BookAdmin(admin.ModelAdmin):
     list_filter = ("status", "category")
     search_fields = ("title", "author", "isbn", "publisher")
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+        # 检索结果默认按相关度排序；点击列头排序时保留 ChangeList 已设置的排序
+        return search_books(queryset, search_term, rank=ORDER_VAR not in request.GET), False
+
+    def delete_queryset(self, request, queryset):
+        # 批量删除不经过 Book.delete
+        super().delete_queryset(request, queryset)
+        bump_catalog_version()
+
     @admin.action(description="上架所选图书")
     def mark_on_shelf(self, request, queryset):
-        queryset.update(status=Book.Status.ON_SHELF)
+        queryset.update(status=Book.Status.ON_SHELF, updated_at=timezone.now())
+        bump_catalog_version()
 
     @admin.action(description="下架所选图书")
     def mark_off_shelf(self, request, queryset):
-        queryset.update(status=Book.Status.OFF_SHELF)
+        queryset.update(status=Book.Status.OFF_SHELF, updated_at=timezone.now())
+        bump_catalog_version()
 
     actions = ("mark_on_shelf", "mark_off_shelf")
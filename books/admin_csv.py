@@ -1,17 +1,31 @@
+import codecs
 import csv
+import gzip
+import hashlib
 import io
+import json
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from dataclasses import dataclass
 from datetime import date
+from itertools import islice
 
 from django.apps import apps
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
 from django.utils.dateparse import parse_date
 
-from .models import Book, Category
+from .catalog_cache import bump_catalog_version
+from .models import Book, BookCopy, Category
+from .search_tokens import book_search_tokens
+from .streaming import ITERATOR_CHUNK_SIZE
 
 
 CLEAR_TOKEN = "__CLEAR__"
+DEFAULT_IMPORT_BATCH_SIZE = 1000
 
 BOOK_CSV_COLUMNS = [
     "isbn",
@@ -80,26 +94,60 @@ def _normalize_status(value: str) -> str:
     return mapping.get(token, normalized)
 
 
+def book_records(qs):
+    """逐行产出带原始类型的 dict（日期为 date，缺失为 None）；按 id 分块读取，内存占用与表大小无关。"""
+
+    for book in qs.select_related("category").order_by("id").iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        yield {
+            "isbn": book.isbn,
+            "title": book.title,
+            "author": book.author,
+            "publisher": book.publisher,
+            "publish_date": book.publish_date,
+            "description": book.description,
+            "category_name": book.category.name if book.category_id else None,
+            "total_copies": book.total_copies,
+            "available_copies": book.available_copies,
+            "location": book.location,
+            "status": book.status,
+        }
+
+
+def csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+def book_csv_rows(qs):
+    for record in book_records(qs):
+        yield {key: csv_cell(value) for key, value in record.items()}
+
+
+# 列式导出的列类型，见 books.columnar
+BOOK_COLUMNAR_SCHEMA = [
+    ("isbn", "text"),
+    ("title", "text"),
+    ("author", "category"),
+    ("publisher", "category"),
+    ("publish_date", "date"),
+    ("description", "text"),
+    ("category_name", "category"),
+    ("total_copies", "int"),
+    ("available_copies", "int"),
+    ("location", "category"),
+    ("status", "category"),
+]
+
+
 def export_books_to_csv(qs, out) -> None:
     writer = csv.DictWriter(out, fieldnames=BOOK_CSV_COLUMNS, lineterminator="\n")
     writer.writeheader()
-
-    for book in qs.select_related("category").order_by("id"):
-        writer.writerow(
-            {
-                "isbn": book.isbn,
-                "title": book.title,
-                "author": book.author,
-                "publisher": book.publisher,
-                "publish_date": book.publish_date.isoformat() if book.publish_date else "",
-                "description": book.description,
-                "category_name": book.category.name if book.category_id else "",
-                "total_copies": book.total_copies,
-                "available_copies": book.available_copies,
-                "location": book.location,
-                "status": book.status,
-            }
-        )
+    writer.writerows(book_csv_rows(qs))
 
 
 def _apply_clearable_text(book: Book, field: str, value: str) -> bool:
@@ -116,7 +164,17 @@ def _apply_clearable_text(book: Book, field: str, value: str) -> bool:
     return False
 
 
-def _apply_clearable_optional_date(book: Book, field: str, value: str) -> bool:
+def _parse_optional_date(value: str, *, field: str):
+    if value in ("", CLEAR_TOKEN):
+        return value
+    parsed: date | None = parse_date(value)
+    if parsed is None:
+        raise ValidationError({field: f"{field} 格式应为 YYYY-MM-DD"})
+    return parsed
+
+
+def _apply_clearable_optional_date(book: Book, field: str, value) -> bool:
+    _raise_if_invalid(value)
     if value == "":
         return False
     if value == CLEAR_TOKEN:
@@ -125,26 +183,30 @@ def _apply_clearable_optional_date(book: Book, field: str, value: str) -> bool:
             return True
         return False
 
-    parsed: date | None = parse_date(value)
-    if parsed is None:
-        raise ValidationError({field: f"{field} 格式应为 YYYY-MM-DD"})
-    if getattr(book, field) != parsed:
-        setattr(book, field, parsed)
+    if getattr(book, field) != value:
+        setattr(book, field, value)
         return True
     return False
 
 
-def _apply_status(book: Book, value: str) -> bool:
+def _parse_status(value: str, *, field: str = "status") -> str:
     if value == "":
-        return False
+        return ""
     if value == CLEAR_TOKEN:
         raise ValidationError({"status": "status 不支持清空"})
 
     normalized = _normalize_status(value)
     if normalized not in {Book.Status.ON_SHELF, Book.Status.OFF_SHELF}:
         raise ValidationError({"status": "status 只能为 on_shelf/off_shelf（也支持：上架/下架/1/0）"})
-    if book.status != normalized:
-        book.status = normalized
+    return normalized
+
+
+def _apply_status(book: Book, value) -> bool:
+    _raise_if_invalid(value)
+    if value == "":
+        return False
+    if book.status != value:
+        book.status = value
         return True
     return False
 
@@ -174,147 +236,847 @@ def _parse_int_field(value: str, *, field: str) -> int | None:
     return parsed
 
 
-def import_books_from_csv(
-    uploaded,
+def _apply_category(book: Book, value: str, *, dry_run: bool, categories: dict[str, Category]) -> bool:
+    if value == "":
+        return False
+    if value == CLEAR_TOKEN:
+        if book.category_id is not None:
+            book.category = None
+            return True
+        return False
+
+    if dry_run:
+        changed = False
+        current_name = None
+        if book.category_id:
+            current_name = getattr(book.category, "name", None)
+        if current_name != value:
+            changed = True
+
+        category = categories.get(value)
+        if category and book.category_id != category.id:
+            book.category = category
+        return changed
+
+    category = categories.get(value)
+    if category is None:
+        category, _ = Category.objects.get_or_create(name=value)
+        categories[value] = category
+    if book.category_id != category.id:
+        book.category = category
+        return True
+    return False
+
+
+def _apply_copies(book: Book, total_parsed, *, creating: bool, borrowed_count: int) -> bool:
+    _raise_if_invalid(total_parsed)
+
+    if creating:
+        if total_parsed is None:
+            total_parsed = 1
+        if total_parsed < 0:
+            raise ValidationError({"total_copies": "total_copies 不能为负数"})
+
+        book.total_copies = total_parsed
+        # 导入时忽略 available_copies：新建默认全可借
+        book.available_copies = total_parsed
+        return True
+
+    if total_parsed is None:
+        return False
+
+    changed = False
+    new_total = total_parsed
+    new_available = new_total - borrowed_count
+
+    if new_total < 0:
+        raise ValidationError({"total_copies": "total_copies 不能为负数"})
+    if new_available < 0:
+        raise ValidationError({"available_copies": "available_copies 不能为负数"})
+    if new_available > new_total:
+        raise ValidationError({"available_copies": "available_copies 不能大于 total_copies"})
+    if new_total < borrowed_count:
+        raise ValidationError({"total_copies": "total_copies 不能小于已借出数量"})
+
+    if book.total_copies != new_total:
+        book.total_copies = new_total
+        changed = True
+    if book.available_copies != new_available:
+        book.available_copies = new_available
+        changed = True
+    return changed
+
+
+def _apply_row(
+    book: Book,
+    record: dict,
     *,
-    dry_run: bool = False,
-    atomic: bool = False,
-) -> dict:
+    creating: bool,
+    dry_run: bool,
+    categories: dict[str, Category],
+    borrowed_count: int,
+) -> bool:
+    changed = False
+
+    changed |= _apply_required_text(book, "title", record["title"], creating=creating)
+    changed |= _apply_required_text(book, "author", record["author"], creating=creating)
+    changed |= _apply_clearable_text(book, "publisher", record["publisher"])
+    changed |= _apply_clearable_optional_date(book, "publish_date", record["publish_date"])
+    changed |= _apply_clearable_text(book, "description", record["description"])
+    changed |= _apply_category(book, record["category_name"], dry_run=dry_run, categories=categories)
+    changed |= _apply_copies(book, record["total_copies"], creating=creating, borrowed_count=borrowed_count)
+    changed |= _apply_clearable_text(book, "location", record["location"])
+    changed |= _apply_status(book, record["status"])
+    return changed
+
+
+class _Invalid:
+    """预校验阶段解析失败的字段；应用阶段处理到该字段时再抛出，保证报错顺序与逐行处理一致。"""
+
+    __slots__ = ("errors",)
+
+    def __init__(self, errors: dict):
+        self.errors = errors
+
+
+def _raise_if_invalid(value) -> None:
+    if isinstance(value, _Invalid):
+        raise ValidationError(value.errors)
+
+
+def _parsed(parse, value: str, field: str):
+    try:
+        return parse(value, field=field)
+    except ValidationError as exc:
+        return _Invalid(exc.message_dict)
+
+
+# 只依赖本行取值的字段规则（长度等），在预校验阶段用 clean_fields 检查
+_PREVALIDATED_TEXT_FIELDS = ("isbn", "title", "author", "publisher", "description", "location")
+
+
+def _prepare_record(row: dict) -> dict:
     """
-    规则：
-    - 主键 isbn：存在则更新，不存在则创建
-    - 空字段：保持原值
-    - __CLEAR__：仅对允许清空的字段生效（publish_date/category/location/publisher/description）
+    纯 CPU 的逐行预处理：清洗单元格、解析整数/日期/状态、检查字段长度。
+    不访问数据库，可在子进程中执行；结果按原顺序交给应用阶段。
     """
 
-    errors: list[ImportErrorItem] = []
-    created = 0
-    updated = 0
-    skipped = 0
+    if _ROW_ERROR_KEY in row:
+        return {"isbn": "", "category_name": "", "row_error": row[_ROW_ERROR_KEY]}
 
-    def process() -> None:
-        nonlocal created, updated, skipped
+    record = {
+        "row_error": None,
+        "isbn": _normalize_cell(row.get("isbn")),
+        "title": _normalize_cell(row.get("title")),
+        "author": _normalize_cell(row.get("author")),
+        "publisher": _normalize_cell(row.get("publisher")),
+        "publish_date": _parsed(_parse_optional_date, _normalize_cell(row.get("publish_date")), "publish_date"),
+        "description": _normalize_cell(row.get("description")),
+        "category_name": _normalize_cell(row.get("category_name")),
+        "total_copies": _parsed(_parse_int_field, _normalize_cell(row.get("total_copies")), "total_copies"),
+        "location": _normalize_cell(row.get("location")),
+        "status": _parsed(_parse_status, _normalize_cell(row.get("status")), "status"),
+        "field_errors": None,
+    }
 
-        reader = csv.DictReader(uploaded)
-        if not reader.fieldnames:
-            errors.append(ImportErrorItem(row=1, isbn=None, message="CSV 表头缺失"))
-            return
+    supplied = {
+        name: record[name] for name in _PREVALIDATED_TEXT_FIELDS if record[name] not in ("", CLEAR_TOKEN)
+    }
+    try:
+        Book(**supplied).clean_fields(exclude=[f.name for f in Book._meta.fields if f.name not in supplied])
+    except ValidationError as exc:
+        record["field_errors"] = exc.message_dict
+    return record
+
+
+def _prepare_records(rows: list) -> list:
+    return [_prepare_record(row) for row in rows]
+
+
+def _init_validation_worker() -> None:
+    # spawn 方式启动的子进程需要重新初始化 Django；fork 方式下已就绪
+    if not apps.ready:
+        import django
+
+        django.setup()
+
+
+def _prepared_chunks(chunks, workers: int):
+    """
+    chunks 产出 (rows, offset)；返回 (rows, offset, records)，顺序与输入一致。
+    workers > 1 时在进程池中预处理，最多同时处理 workers * 2 批，不会一次读入整个文件。
+    """
+
+    if workers <= 1:
+        for rows, offset in chunks:
+            yield rows, offset, _prepare_records([row for _idx, row in rows])
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_validation_worker) as executor:
+        pending: deque = deque()
+        for rows, offset in chunks:
+            pending.append((rows, offset, executor.submit(_prepare_records, [row for _idx, row in rows])))
+            if len(pending) >= workers * 2:
+                done_rows, done_offset, future = pending.popleft()
+                yield done_rows, done_offset, future.result()
+        while pending:
+            done_rows, done_offset, future = pending.popleft()
+            yield done_rows, done_offset, future.result()
+
+
+# 导入会修改的列（attname），用于失败行回滚内存中的改动
+_IMPORT_ATTNAMES = (
+    "title",
+    "author",
+    "publisher",
+    "publish_date",
+    "description",
+    "category_id",
+    "total_copies",
+    "available_copies",
+    "location",
+    "status",
+)
+_IMPORT_UPDATE_FIELDS = [
+    "title",
+    "author",
+    "publisher",
+    "publish_date",
+    "description",
+    "category",
+    "total_copies",
+    "location",
+    "status",
+    "updated_at",
+]
+
+
+def _snapshot(book: Book):
+    return {name: book.__dict__.get(name) for name in _IMPORT_ATTNAMES}, dict(book._state.fields_cache)
+
+
+def _restore(book: Book, snapshot) -> None:
+    values, fields_cache = snapshot
+    book.__dict__.update(values)
+    book._state.fields_cache = fields_cache
+
+
+class _TextDigest:
+    """快照中的长文本只保存摘要；与字符串比较时按摘要比较。"""
+
+    __slots__ = ("digest",)
+
+    def __init__(self, text: str):
+        self.digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def __eq__(self, other):
+        if isinstance(other, str):
+            return self.digest == _TextDigest(other).digest
+        if isinstance(other, _TextDigest):
+            return self.digest == other.digest
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.digest)
+
+
+# 快照总会读入的列：定位图书、比对分类和馆藏数所需
+_SNAPSHOT_KEY_COLUMNS = ("id", "isbn", "category_id", "total_copies", "available_copies")
+# 其余可比对的列只在输入中出现非空值时才读入
+_SNAPSHOT_OPTIONAL_COLUMNS = ("title", "author", "publisher", "publish_date", "description", "location", "status")
+_SNAPSHOT_DIGEST_OVER = 64
+# 按 isbn/分类名/图书 id 分块查询，避免超出数据库的参数个数上限
+SNAPSHOT_QUERY_CHUNK_SIZE = 500
 
-        for idx, row in enumerate(reader, start=2):
+
+def _in_chunks(values):
+    values = list(values)
+    for start in range(0, len(values), SNAPSHOT_QUERY_CHUNK_SIZE):
+        yield values[start : start + SNAPSHOT_QUERY_CHUNK_SIZE]
+
+
+class CatalogSnapshot:
+    """
+    试运行用的目录快照：先扫描一遍输入，只读入其中出现的 isbn 与分类名；
+    图书只取会被比对的列（长简介只存摘要），按块查询。之后整份文件在内存中比对，不再按批查询。
+    """
+
+    def __init__(self, isbns, category_names, columns):
+        Borrow = apps.get_model("borrows", "Borrow")
+
+        self.categories: dict[str, Category] = {}
+        for names in _in_chunks(sorted(category_names)):
+            self.categories.update((c.name, c) for c in Category.objects.filter(name__in=names).only("id", "name"))
+
+        self._columns = (*_SNAPSHOT_KEY_COLUMNS, *(c for c in _SNAPSHOT_OPTIONAL_COLUMNS if c in columns))
+        description = self._columns.index("description") if "description" in self._columns else None
+        self._rows: dict[str, tuple] = {}
+        for chunk in _in_chunks(sorted(isbns)):
+            for row in Book.objects.filter(isbn__in=chunk).values_list(*self._columns):
+                if description is not None and len(row[description]) > _SNAPSHOT_DIGEST_OVER:
+                    row = (*row[:description], _TextDigest(row[description]), *row[description + 1 :])
+                self._rows[row[1]] = row
+
+        # 快照只覆盖输入中出现的分类名；按 id 找回原分类时补查其余分类
+        category_ids = {row[2] for row in self._rows.values() if row[2] is not None}
+        self._categories_by_id = {c.id: c for c in self.categories.values()}
+        for ids in _in_chunks(category_ids - set(self._categories_by_id)):
+            self._categories_by_id.update((c.id, c) for c in Category.objects.filter(pk__in=ids).only("id", "name"))
+
+        self.borrowed: dict[int, int] = {}
+        for ids in _in_chunks([row[0] for row in self._rows.values()]):
+            self.borrowed.update(
+                Borrow.objects.filter(book_id__in=ids, return_date__isnull=True)
+                .values("book_id")
+                .annotate(n=Count("id"))
+                .values_list("book_id", "n")
+            )
+
+    @classmethod
+    def for_rows(cls, rows) -> "CatalogSnapshot":
+        """rows 为输入的原始行（dict）；收集 isbn、分类名和出现过非空值的列。"""
+
+        isbns: set[str] = set()
+        category_names: set[str] = set()
+        columns: set[str] = set()
+        for row in rows:
+            if row is None or _ROW_ERROR_KEY in row:
+                continue
+            isbn = _normalize_cell(row.get("isbn"))
+            if not isbn:
+                continue
+            isbns.add(isbn)
+            category_name = _normalize_cell(row.get("category_name"))
+            if category_name not in ("", CLEAR_TOKEN):
+                category_names.add(category_name)
+            columns.update(c for c in _SNAPSHOT_OPTIONAL_COLUMNS if c not in columns and _normalize_cell(row.get(c)))
+        return cls(isbns, category_names, columns)
+
+    def books(self, isbns) -> dict[str, Book]:
+        found: dict[str, Book] = {}
+        for isbn in isbns:
+            row = self._rows.get(isbn)
             if row is None:
                 continue
+            values = dict(zip(self._columns, row))
+            category = self._categories_by_id.get(values.pop("category_id"))
+            found[isbn] = Book(**values, category=category)
+        return found
 
-            isbn = _normalize_cell(row.get("isbn"))
+
+class _ImportChunk:
+    """
+    一批 CSV 行：先按 isbn/分类名/在借数各一条查询预取，逐行在内存中校验与修改，
+    最后用 bulk_create/bulk_update 和集合化的副本、检索词写入统一落库。
+    """
+
+    def __init__(
+        self,
+        rows: list[tuple[int, dict]],
+        records: list[dict | None],
+        *,
+        dry_run: bool,
+        catalog: CatalogSnapshot | None = None,
+    ):
+        Borrow = apps.get_model("borrows", "Borrow")
+
+        self.rows = [(idx, record) for (idx, _row), record in zip(rows, records)]
+        self.dry_run = dry_run
+        self.field_changes: Counter = Counter()
+
+        present = [record for record in records if record is not None]
+        isbns = {record["isbn"] for record in present} - {""}
+        if catalog is not None:
+            self.books: dict[str, Book] = catalog.books(isbns)
+            self.categories: dict[str, Category] = catalog.categories
+            self.borrowed: dict[int, int] = catalog.borrowed
+        else:
+            self.books = {
+                book.isbn: book for book in Book.objects.select_related("category").filter(isbn__in=isbns)
+            }
+            names = {record["category_name"] for record in present} - {"", CLEAR_TOKEN}
+            self.categories = {c.name: c for c in Category.objects.filter(name__in=names)}
+            self.borrowed = dict(
+                Borrow.objects.filter(book_id__in=[b.id for b in self.books.values()], return_date__isnull=True)
+                .values("book_id")
+                .annotate(n=Count("id"))
+                .values_list("book_id", "n")
+            )
+        self.original = {
+            book.id: (book.total_copies, book._search_text()) for book in self.books.values()
+        }
+
+        self.to_create: dict[str, Book] = {}
+        self.to_update: dict[int, Book] = {}
+        self.last_row: dict[str, int] = {}
+
+    def process(self, errors: list[ImportErrorItem], counts: dict[str, int]) -> None:
+        for idx, record in self.rows:
+            if record["row_error"]:
+                counts["skipped"] += 1
+                errors.append(ImportErrorItem(row=idx, isbn=None, message=record["row_error"]))
+                continue
+
+            isbn = record["isbn"]
             if not isbn:
-                skipped += 1
+                counts["skipped"] += 1
                 errors.append(ImportErrorItem(row=idx, isbn=None, message="isbn 为必填"))
                 continue
 
+            book = self.books.get(isbn) or self.to_create.get(isbn)
+            creating = book is None
+            if creating:
+                book = Book(isbn=isbn)
+            snapshot = None if creating else _snapshot(book)
+
             try:
-                book = Book.objects.select_related("category").filter(isbn=isbn).first()
-                creating = book is None
-                if creating:
-                    book = Book(isbn=isbn)
-
-                changed = False
-
-                changed |= _apply_required_text(book, "title", _normalize_cell(row.get("title")), creating=creating)
-                changed |= _apply_required_text(book, "author", _normalize_cell(row.get("author")), creating=creating)
-                changed |= _apply_clearable_text(book, "publisher", _normalize_cell(row.get("publisher")))
-                changed |= _apply_clearable_optional_date(
-                    book, "publish_date", _normalize_cell(row.get("publish_date"))
+                changed = _apply_row(
+                    book,
+                    record,
+                    creating=creating,
+                    dry_run=self.dry_run,
+                    categories=self.categories,
+                    borrowed_count=self.borrowed.get(book.id, 0) if book.id else 0,
                 )
-                changed |= _apply_clearable_text(book, "description", _normalize_cell(row.get("description")))
-
-                category_name = _normalize_cell(row.get("category_name"))
-                if category_name != "":
-                    if category_name == CLEAR_TOKEN:
-                        if book.category_id is not None:
-                            book.category = None
-                            changed = True
-                    else:
-                        if dry_run:
-                            current_name = None
-                            if book.category_id:
-                                current_name = getattr(book.category, "name", None)
-                            if current_name != category_name:
-                                changed = True
-
-                            category = Category.objects.filter(name=category_name).first()
-                            if category and book.category_id != category.id:
-                                book.category = category
-                        else:
-                            category, _ = Category.objects.get_or_create(name=category_name)
-                            if book.category_id != category.id:
-                                book.category = category
-                                changed = True
-
-                total_raw = _normalize_cell(row.get("total_copies"))
-                total_parsed = _parse_int_field(total_raw, field="total_copies")
-
-                Borrow = apps.get_model("borrows", "Borrow")
-
-                if creating:
-                    if total_parsed is None:
-                        total_parsed = 1
-                    if total_parsed < 0:
-                        raise ValidationError({"total_copies": "total_copies 不能为负数"})
-
-                    book.total_copies = total_parsed
-                    # 导入时忽略 available_copies：新建默认全可借
-                    book.available_copies = total_parsed
-                    changed = True
-                else:
-                    if total_parsed is not None:
-                        borrowed_count = Borrow.objects.filter(
-                            book_id=book.id, return_date__isnull=True
-                        ).count()
-                        new_total = total_parsed
-                        new_available = new_total - borrowed_count
-
-                        if new_total < 0:
-                            raise ValidationError({"total_copies": "total_copies 不能为负数"})
-                        if new_available < 0:
-                            raise ValidationError({"available_copies": "available_copies 不能为负数"})
-                        if new_available > new_total:
-                            raise ValidationError({"available_copies": "available_copies 不能大于 total_copies"})
-                        if new_total < borrowed_count:
-                            raise ValidationError({"total_copies": "total_copies 不能小于已借出数量"})
-
-                        if book.total_copies != new_total:
-                            book.total_copies = new_total
-                            changed = True
-                        if book.available_copies != new_available:
-                            book.available_copies = new_available
-                            changed = True
-
-                changed |= _apply_clearable_text(book, "location", _normalize_cell(row.get("location")))
-                changed |= _apply_status(book, _normalize_cell(row.get("status")))
 
                 if not creating and not changed:
-                    skipped += 1
+                    counts["skipped"] += 1
                     continue
 
-                book.full_clean()
+                # 本行给出的字段已在预校验阶段跑过 clean_fields，其余字段来自数据库；
+                # isbn 唯一性由按 isbn 预取保证，可借数约束已在上面校验
+                if record["field_errors"]:
+                    raise ValidationError(record["field_errors"])
+            except ValidationError as exc:
+                if snapshot is not None:
+                    _restore(book, snapshot)
+                counts["skipped"] += 1
+                errors.append(ImportErrorItem(row=idx, isbn=isbn, message=_format_validation_error(exc)))
+                continue
+
+            counts["created" if creating else "updated"] += 1
+            if self.dry_run:
+                # 试运行不落库，后续行仍以数据库中的原值为准
+                if snapshot is not None:
+                    self._count_field_changes(book, snapshot, record)
+                    _restore(book, snapshot)
+                continue
+
+            self.last_row[isbn] = idx
+            if creating:
+                self.to_create[isbn] = book
+            elif book.id:
+                self.to_update[book.id] = book
+
+    def _count_field_changes(self, book: Book, snapshot, record: dict) -> None:
+        before, fields_cache = snapshot
+        for name in _IMPORT_ATTNAMES:
+            if name != "category_id" and book.__dict__.get(name) != before[name]:
+                self.field_changes[name] += 1
+
+        # 分类按名称比较：试运行不会创建新分类
+        value = record["category_name"]
+        if value != "":
+            old_name = getattr(fields_cache.get("category"), "name", None)
+            new_name = None if value == CLEAR_TOKEN else value
+            if old_name != new_name:
+                self.field_changes["category"] += 1
+
+    def flush(self, errors: list[ImportErrorItem], counts: dict[str, int]) -> None:
+        if self.dry_run or not (self.to_create or self.to_update):
+            return
+
+        with transaction.atomic():
+            created = list(self.to_create.values())
+            if created:
+                Book.objects.bulk_create(created)
+
+            updated = list(self.to_update.values())
+            # available_copies 随借还并发变化：只写调整了 total_copies 的图书，且在加锁后重新计算
+            resized = [book for book in updated if book.total_copies != self.original[book.id][0]]
+            rejected = self._recount_available(resized) if resized else set()
+            new_copies, deactivate, short = self._plan_copies(
+                created, [book for book in resized if book.id not in rejected]
+            )
+            rejected |= short
+            if rejected:
+                # 整行记为失败：本行的其它字段、副本和检索词都不写入
+                for book in updated:
+                    if book.id in rejected:
+                        self._reject_resize(book, errors, counts)
+                updated = [book for book in updated if book.id not in rejected]
+                resized = [book for book in resized if book.id not in rejected]
+
+            if updated:
+                now = timezone.now()
+                for book in updated:
+                    book.updated_at = now
+                if resized:
+                    Book.objects.bulk_update(resized, [*_IMPORT_UPDATE_FIELDS, "available_copies"])
+                resized_ids = {book.id for book in resized}
+                kept = [book for book in updated if book.id not in resized_ids]
+                if kept:
+                    Book.objects.bulk_update(kept, _IMPORT_UPDATE_FIELDS)
+
+            if deactivate:
+                BookCopy.objects.filter(id__in=deactivate).update(is_active=False)
+            if new_copies:
+                BookCopy.objects.bulk_create(new_copies)
+            self._sync_search_tokens(created, updated)
+        bump_catalog_version()
+
+    def _recount_available(self, resized: list[Book]) -> set[int]:
+        """
+        锁住调整馆藏数的图书后重新统计在借数（借还须先更新 Book 行，加锁后计数不会再变），
+        按新的 total_copies 算出 available_copies。返回预取之后又有借出、已不够缩减的图书 id。
+        """
+
+        Borrow = apps.get_model("borrows", "Borrow")
 
-                if dry_run:
-                    if creating:
-                        created += 1
+        ids = [book.id for book in resized]
+        list(Book.objects.select_for_update().filter(pk__in=ids).order_by("pk").values_list("id"))
+        borrowed = dict(
+            Borrow.objects.filter(book_id__in=ids, return_date__isnull=True)
+            .values("book_id")
+            .annotate(n=Count("id"))
+            .values_list("book_id", "n")
+        )
+        rejected: set[int] = set()
+        for book in resized:
+            n = borrowed.get(book.id, 0)
+            if book.total_copies >= n:
+                book.available_copies = book.total_copies - n
+            else:
+                rejected.add(book.id)
+        return rejected
+
+    def _plan_copies(self, created, resized) -> tuple[list, list[int], set[int]]:
+        """
+        算出需要新建的副本和需要停用的副本 id（不写库）；
+        可停用的副本不足以缩减（数据不一致）的图书 id 一并返回，由调用方整行拒绝。
+        """
+
+        Borrow = apps.get_model("borrows", "Borrow")
+
+        new_copies = [
+            BookCopy(book_id=book.id, copy_no=copy_no, is_active=True)
+            for book in created
+            for copy_no in range(1, book.total_copies + 1)
+        ]
+        deactivate: list[int] = []
+        short: set[int] = set()
+
+        resized = {book.id: book for book in resized}
+        if resized:
+            stats = (
+                BookCopy.objects.filter(book_id__in=resized)
+                .values("book_id")
+                .annotate(max_no=Max("copy_no"), active=Count("id", filter=Q(is_active=True)))
+            )
+            grow: dict[int, list] = {}
+            shrink: dict[int, int] = {}
+            for stat in stats:
+                book = resized[stat["book_id"]]
+                if book.total_copies > stat["active"]:
+                    start = (stat["max_no"] or 0) + 1
+                    grow[book.id] = [
+                        BookCopy(book_id=book.id, copy_no=copy_no, is_active=True)
+                        for copy_no in range(start, start + book.total_copies - stat["active"])
+                    ]
+                elif book.total_copies < stat["active"]:
+                    shrink[book.id] = stat["active"] - book.total_copies
+            seen = {stat["book_id"] for stat in stats}
+            for book in resized.values():
+                if book.id not in seen and book.total_copies > 0:
+                    grow[book.id] = [
+                        BookCopy(book_id=book.id, copy_no=copy_no, is_active=True)
+                        for copy_no in range(1, book.total_copies + 1)
+                    ]
+            for copies in grow.values():
+                new_copies.extend(copies)
+
+            if shrink:
+                open_copy_ids = Borrow.objects.filter(
+                    book_id__in=shrink, return_date__isnull=True
+                ).values("copy_id")
+                candidates = (
+                    BookCopy.objects.filter(book_id__in=shrink, is_active=True)
+                    .exclude(id__in=open_copy_ids)
+                    .order_by("book_id", "-copy_no")
+                    .values_list("book_id", "id")
+                )
+                picked: dict[int, list[int]] = {}
+                for book_id, copy_id in candidates:
+                    ids = picked.setdefault(book_id, [])
+                    if len(ids) < shrink[book_id]:
+                        ids.append(copy_id)
+
+                for book_id, need in shrink.items():
+                    ids = picked.get(book_id, [])
+                    if len(ids) < need:
+                        short.add(book_id)
                     else:
-                        updated += 1
-                    continue
+                        deactivate.extend(ids)
+
+        return new_copies, deactivate, short
+
+    def _reject_resize(self, book: Book, errors, counts) -> None:
+        """已不够缩减的行记为失败；该图书不写入任何字段。"""
+
+        counts["updated"] -= 1
+        counts["skipped"] += 1
+        errors.append(
+            ImportErrorItem(
+                row=self.last_row[book.isbn], isbn=book.isbn, message="total_copies: total_copies 不能小于已借出数量"
+            )
+        )
+
+    def _sync_search_tokens(self, created, updated) -> None:
+        BookSearchToken = apps.get_model("books", "BookSearchToken")
+
+        retokenize = [book for book in updated if book._search_text() != self.original[book.id][1]]
+        if retokenize:
+            BookSearchToken.objects.filter(book_id__in=[book.id for book in retokenize]).delete()
+
+        tokens = [
+            BookSearchToken(book_id=book.id, token=token)
+            for book in [*created, *retokenize]
+            for token in book_search_tokens(title=book.title, author=book.author, publisher=book.publisher)
+        ]
+        if tokens:
+            BookSearchToken.objects.bulk_create(tokens, batch_size=2000, ignore_conflicts=True)
 
-                book.save()
 
-                if creating:
-                    created += 1
+@dataclass(slots=True)
+class ImportProgress:
+    rows_processed: int
+    row: int  # 最后一个已处理（已提交）行的行号
+    offset: int  # 该行之后的字节偏移，可直接 seek 续传
+    counts: dict
+    errors: list
+
+
+class _TrackedLines:
+    """逐行读取文本流并累计已消费的 UTF-8 字节数（csv 模块不会预读下一行）。"""
+
+    def __init__(self, stream, offset: int = 0):
+        self.stream = stream
+        self.offset = offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        line = self.stream.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line.encode("utf-8"))
+        return line
+
+
+@dataclass(frozen=True, slots=True)
+class ImportFormat:
+    kind: str  # "csv" | "jsonl"
+    gzip: bool = False
+
+    @property
+    def name(self) -> str:
+        return self.kind + (".gz" if self.gzip else "")
+
+
+IMPORT_FORMATS = {
+    "csv": ImportFormat("csv"),
+    "csv.gz": ImportFormat("csv", gzip=True),
+    "jsonl": ImportFormat("jsonl"),
+    "jsonl.gz": ImportFormat("jsonl", gzip=True),
+}
+
+
+def detect_import_format(filename: str, *, default: str = "csv") -> ImportFormat:
+    """按扩展名识别导入格式：.csv / .csv.gz / .jsonl(.ndjson) / .jsonl.gz。"""
+
+    name = (filename or "").lower()
+    if name.endswith(".gz"):
+        base = name[:-3]
+        return IMPORT_FORMATS["jsonl.gz" if base.endswith((".jsonl", ".ndjson")) else "csv.gz"]
+    if name.endswith((".jsonl", ".ndjson")):
+        return IMPORT_FORMATS["jsonl"]
+    if name.endswith(".csv"):
+        return IMPORT_FORMATS["csv"]
+    return IMPORT_FORMATS[default]
+
+
+def open_import_binary(binary, fmt: ImportFormat):
+    """gzip 格式返回边读边解压的 GzipFile（支持 seek，续传时向前解压到断点），否则原样返回。"""
+
+    if fmt.gzip:
+        return gzip.GzipFile(fileobj=binary, mode="rb")
+    return binary
+
+
+# JSONL 中无法解析的行以此键携带错误信息，交给应用阶段按行报错
+_ROW_ERROR_KEY = "__row_error__"
+
+
+def _jsonl_rows(lines):
+    """每行一个 JSON 对象，键与 CSV 列名相同；空行产出 None 以保持行号与文件一致。"""
+
+    for line in lines:
+        text = line.strip()
+        if not text:
+            yield None
+            continue
+        try:
+            value = json.loads(text)
+        except ValueError:
+            yield {_ROW_ERROR_KEY: "JSON 格式错误"}
+            continue
+        if not isinstance(value, dict):
+            yield {_ROW_ERROR_KEY: "每行须为 JSON 对象"}
+            continue
+        yield value
+
+
+def read_import_bom(binary) -> int:
+    binary.seek(0)
+    return len(codecs.BOM_UTF8) if binary.read(len(codecs.BOM_UTF8)) == codecs.BOM_UTF8 else 0
+
+
+def read_csv_header(binary) -> tuple[list[str], int]:
+    """从二进制文件开头读取表头，返回 (列名, BOM 字节数)；用于续传时跳过已完成的部分。"""
+
+    binary.seek(0)
+    first = binary.readline()
+    bom = len(codecs.BOM_UTF8) if first.startswith(codecs.BOM_UTF8) else 0
+    text = first[bom:].decode("utf-8")
+    fieldnames = next(csv.reader([text]), [])
+    return fieldnames, bom
+
+
+def import_books_from_csv(
+    uploaded,
+    *,
+    dry_run: bool = False,
+    atomic: bool = False,
+    chunk_atomic: bool = False,
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+    progress=None,
+    fieldnames: list[str] | None = None,
+    start_row: int | None = None,
+    start_offset: int = 0,
+    workers: int = 1,
+    snapshot: bool = False,
+    input_format: str = "csv",
+) -> dict:
+    """
+    规则：
+    - 主键 isbn：存在则更新，不存在则创建
+    - 空字段：保持原值
+    - __CLEAR__：仅对允许清空的字段生效（publish_date/category/location/publisher/description）
+
+    input_format="jsonl" 时每行一个 JSON 对象（键同 CSV 列名），行号即文件行号；
+    gzip 文件由调用方用 open_import_binary 解压后再包装成文本流传入。
+
+    每 batch_size 行为一批：批内预取后在内存中逐行处理，再批量写入，
+    查询数与批数而不是行数成正比。每批在独立事务中提交：
+    - atomic：任一行失败则全部回滚
+    - chunk_atomic：任一行失败只回滚所在批次，其余批次照常提交
+
+    progress(ImportProgress) 在每批提交时（与该批写入同一事务）调用，可用来记录断点。
+    atomic 时整份文件在一个外层事务中，断点在提交前对其它连接不可见、出错时随之回滚，
+    因此不调用 progress；这类导入也无法续传，失败后从头重新执行即可。
+    续传时传入 fieldnames（表头）、start_row 和 start_offset，uploaded 需已定位到 start_offset。
+
+    workers > 1 时，逐行清洗与字段校验在进程池中按批并行执行，写库阶段仍按原顺序逐批进行。
+
+    snapshot=True（仅限试运行）先扫描一遍输入，读入其中涉及的 CatalogSnapshot，整份文件在内存中比对；
+    uploaded 须可 seek。
+    试运行的结果额外包含 field_changes：各字段将被更新的行数。
+    """
+
+    if atomic and chunk_atomic:
+        raise ValueError("atomic 与 chunk_atomic 不能同时使用")
+    if snapshot and not dry_run:
+        raise ValueError("snapshot 仅用于试运行")
+    if input_format not in ("csv", "jsonl"):
+        raise ValueError(f"不支持的导入格式：{input_format}")
+
+    errors: list[ImportErrorItem] = []
+    counts = {"created": 0, "updated": 0, "skipped": 0}
+    field_changes: Counter = Counter()
+    rows_processed = 0
+
+    def report(last_row: int, offset: int) -> None:
+        if progress is not None and not atomic:
+            progress(ImportProgress(rows_processed, last_row, offset, counts, errors))
+
+    def process() -> None:
+        nonlocal rows_processed
+
+        def numbered_rows(lines):
+            if input_format == "jsonl":
+                # 与 csv.DictReader 一致：空行不计入处理行数
+                return (
+                    (idx, row) for idx, row in enumerate(_jsonl_rows(lines), start=start_row or 1) if row is not None
+                )
+            reader = csv.DictReader(lines, fieldnames=fieldnames)
+            if not reader.fieldnames:
+                return None
+            return enumerate(reader, start=start_row or 2)
+
+        catalog = None
+        if snapshot:
+            # 先扫描一遍输入收集 isbn 等，再回到起点逐批比对
+            position = uploaded.tell()
+            scanned = numbered_rows(_TrackedLines(uploaded, start_offset))
+            if scanned is not None:
+                catalog = CatalogSnapshot.for_rows(row for _idx, row in scanned)
+            uploaded.seek(position)
+
+        lines = _TrackedLines(uploaded, start_offset)
+        numbered = numbered_rows(lines)
+        if numbered is None:
+            errors.append(ImportErrorItem(row=1, isbn=None, message="CSV 表头缺失"))
+            return
+
+        def chunks():
+            while True:
+                rows = list(islice(numbered, max(1, batch_size)))
+                if not rows:
+                    return
+                # 预处理可能领先于写库，断点偏移须在读完本批时记下
+                yield rows, lines.offset
+
+        for rows, offset, records in _prepared_chunks(chunks(), workers):
+            before = (dict(counts), len(errors))
+            chunk = _ImportChunk(rows, records, dry_run=dry_run, catalog=catalog)
+            # 试运行不写库，无需每批开事务
+            with nullcontext() if dry_run else transaction.atomic():
+                chunk.process(errors, counts)
+                field_changes.update(chunk.field_changes)
+                rolled_back = chunk_atomic and not dry_run and len(errors) > before[1]
+                if rolled_back:
+                    transaction.set_rollback(True)
                 else:
-                    updated += 1
-            except ValidationError as exc:
-                skipped += 1
+                    chunk.flush(errors, counts)
+                    rows_processed += len(rows)
+                    report(rows[-1][0], offset)
+
+            if rolled_back:
+                # 本批已通过校验的行也未写入，计为跳过
+                counts["skipped"] += (counts["created"] - before[0]["created"]) + (
+                    counts["updated"] - before[0]["updated"]
+                )
+                counts["created"], counts["updated"] = before[0]["created"], before[0]["updated"]
                 errors.append(
-                    ImportErrorItem(row=idx, isbn=isbn, message=_format_validation_error(exc))
+                    ImportErrorItem(
+                        row=rows[0][0],
+                        isbn=None,
+                        message=f"第 {rows[0][0]}-{rows[-1][0]} 行所在批次存在错误，已整批回滚",
+                    )
                 )
+                rows_processed += len(rows)
+                report(rows[-1][0], offset)
 
     if atomic:
         with transaction.atomic():
@@ -324,21 +1086,28 @@ def import_books_from_csv(
     else:
         process()
 
-    return {
+    errors.sort(key=lambda e: e.row)
+    result = {
         "ok": True,
         "has_errors": bool(errors),
         "dry_run": dry_run,
         "atomic": atomic,
+        "chunk_atomic": chunk_atomic,
         "applied": (not dry_run) and (not (atomic and errors)),
-        "created": created,
-        "updated": updated,
-        "skipped": skipped,
+        "rows_processed": rows_processed,
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "skipped": counts["skipped"],
         "errors": [e.to_dict() for e in errors],
     }
+    if dry_run:
+        result["field_changes"] = dict(sorted(field_changes.items()))
+    return result
 
 
 def wrap_uploaded_file(file_obj) -> io.TextIOBase:
     """
     将上传的二进制文件包装为文本流（utf-8-sig），以兼容 Excel 导出的 UTF-8 BOM。
+    逐块解码，不会把整个文件读入内存。
     """
     return io.TextIOWrapper(file_obj, encoding="utf-8-sig", newline="")
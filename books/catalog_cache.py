@@ -0,0 +1,150 @@
+"""
+目录接口响应缓存（基于 Django cache 框架）。
+
+缓存键 = 接口名 + 目录版本号 + ETag 状态 + 角色 + 规范化后的查询参数。Book/Category/Borrow
+写入时递增版本号，旧键自然失效；ETag 状态由数据库聚合得出，即使某处写入漏了递增，
+缓存的响应体也不会挂在新的 ETag 下。未命中时用 cache.add 做单飞锁，同一键只有
+一个请求回源，其余请求短暂等待结果。
+
+版本号与单飞锁必须在所有工作进程间共享：只有配置了共享缓存后端（REDIS_URL）时
+才启用（CATALOG_CACHE_ENABLED），进程内的 LocMemCache 下直接回源。
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+from .permissions import is_admin
+
+
+CATALOG_VERSION_KEY = "catalog:version"
+LOCK_TIMEOUT_SECONDS = 10
+LOCK_WAIT_SECONDS = 2.0
+LOCK_POLL_SECONDS = 0.05
+
+
+def _timeout() -> int:
+    return int(getattr(settings, "CATALOG_CACHE_TIMEOUT", 300))
+
+
+def get_catalog_version() -> int:
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, 1, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY, 1)
+    return int(version)
+
+
+def _incr_version() -> None:
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # 键不存在（首次写入或被淘汰）：从一个不会与旧键重复的值开始
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+
+
+def bump_catalog_version() -> None:
+    """
+    立即递增一次；若处于事务中，提交后再递增一次，
+    以淘汰事务提交前被其它请求按新版本号缓存的旧数据。
+    """
+
+    _incr_version()
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        transaction.on_commit(_incr_version)
+
+
+def catalog_cache_enabled() -> bool:
+    return bool(getattr(settings, "CATALOG_CACHE_ENABLED", False))
+
+
+def _response_key(request, name: str, state) -> str:
+    params = sorted((key, sorted(request.GET.getlist(key))) for key in request.GET.keys())
+    raw = repr((request.scheme, request.get_host(), params, state))
+    digest = hashlib.md5(raw.encode("utf-8"), usedforsecurity=False).hexdigest()
+    role = "admin" if is_admin(request.user) else "public"
+    return f"catalog:{name}:{get_catalog_version()}:{role}:{digest}"
+
+
+def _from_cache(entry) -> HttpResponse:
+    content, content_type = entry
+    return HttpResponse(content, content_type=content_type)
+
+
+def _caching_stream(chunks, key: str, lock_key: str, content_type: str):
+    """边转发流式响应边缓存；超过 CATALOG_CACHE_MAX_BYTES 则放弃缓存。"""
+
+    max_bytes = int(getattr(settings, "CATALOG_CACHE_MAX_BYTES", 5 * 1024 * 1024))
+    buffer: list[bytes] | None = []
+    size = 0
+    try:
+        for chunk in chunks:
+            if buffer is not None:
+                size += len(chunk)
+                if size > max_bytes:
+                    buffer = None
+                else:
+                    buffer.append(chunk)
+            yield chunk
+        if buffer is not None:
+            cache.set(key, (b"".join(buffer), content_type), timeout=_timeout())
+    finally:
+        cache.delete(lock_key)
+
+
+def catalog_cached(name: str, etag_func=None):
+    """
+    etag_func 与外层 catalog_conditional 使用同一个（同一请求内有缓存，不会重复查询），
+    缓存条目按 ETag 状态区分。
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            if request.method != "GET" or not catalog_cache_enabled():
+                return view(request, *args, **kwargs)
+
+            state = etag_func(request, *args, **kwargs) if etag_func is not None else None
+            key = _response_key(request, name, state)
+            entry = cache.get(key)
+            if entry is not None:
+                return _from_cache(entry)
+
+            lock_key = f"{key}:lock"
+            if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT_SECONDS):
+                release_lock = True
+                try:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code == 200:
+                        if response.streaming:
+                            # 锁在流结束时释放
+                            response.streaming_content = _caching_stream(
+                                response.streaming_content, key, lock_key, response["Content-Type"]
+                            )
+                            release_lock = False
+                        else:
+                            cache.set(key, (response.content, response["Content-Type"]), timeout=_timeout())
+                    return response
+                finally:
+                    if release_lock:
+                        cache.delete(lock_key)
+
+            deadline = time.monotonic() + LOCK_WAIT_SECONDS
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_SECONDS)
+                entry = cache.get(key)
+                if entry is not None:
+                    return _from_cache(entry)
+                if cache.get(lock_key) is None:
+                    break
+            return view(request, *args, **kwargs)
+
+        return inner
+
+    return decorator
@@ -0,0 +1,209 @@
+"""
+列式导出（供 pandas 等分析工具直接加载，省去解析 CSV 与时间字符串）。
+
+安装 pyarrow 时写 Parquet 或 Arrow IPC 文件；否则退回 NumPy，在输出目录下每列写一个
+.npy 文件，可用 np.load(..., mmap_mode="r") 内存映射加载（.npz 是 zip 归档，无法映射）。
+
+列类型：int（int64）、bool、date、timestamp（UTC 微秒）、text（字符串）、
+category（字典编码字符串）。NumPy 模式下字符串列一律字典编码为
+<列名>.codes.npy（int32，-1 表示空）+ <列名>.categories.npy；可空整数以 -1 表示空，
+日期/时间的空值为 NaT。列清单写在 schema.json 中。
+
+两者都是可选依赖，都未安装时无法使用列式导出。
+"""
+
+import json
+import os
+from array import array
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+    import pyarrow.parquet as pq
+except Exception:  # pragma: no cover
+    pa = None
+
+try:
+    import numpy as np
+except Exception:  # pragma: no cover
+    np = None
+
+
+COLUMNAR_FORMATS = ("parquet", "arrow", "npy")
+COLUMNAR_BATCH_ROWS = 65536
+
+# NumPy 的 NaT 即 int64 最小值
+_NAT = -(2**63)
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class ColumnarUnavailable(Exception):
+    pass
+
+
+def resolve_columnar_format(requested: str) -> str:
+    """parquet/arrow 需要 pyarrow，未安装时退回 npy；npy 需要 numpy（或 pyarrow 也不可用时报错）。"""
+
+    if requested in ("parquet", "arrow") and pa is not None:
+        return requested
+    if np is not None:
+        return "npy"
+    raise ColumnarUnavailable("列式导出需要安装 pyarrow 或 numpy")
+
+
+class _Dictionary:
+    """只追加的字典：各批次共用同一套编码，Arrow 写入时只需追加增量。"""
+
+    def __init__(self):
+        self.index: dict[str, int] = {}
+        self.values: list[str] = []
+
+    def code(self, value) -> int:
+        if value is None:
+            return -1
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def _utc_naive(value):
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# ---- Arrow / Parquet ----
+
+
+def _arrow_schema(schema):
+    types = {
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "text": pa.string(),
+        "category": pa.dictionary(pa.int32(), pa.string()),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in schema])
+
+
+def _arrow_batch(schema, arrow_schema, columns, dictionaries):
+    arrays = []
+    for (name, kind), field in zip(schema, arrow_schema):
+        values = columns[name]
+        if kind == "category":
+            codes = pa.array([None if code < 0 else code for code in values], type=pa.int32())
+            arrays.append(pa.DictionaryArray.from_arrays(codes, pa.array(dictionaries[name].values, pa.string())))
+        else:
+            arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema)
+
+
+def _write_arrow(records, schema, path: str, fmt: str) -> int:
+    arrow_schema = _arrow_schema(schema)
+    dictionaries = {name: _Dictionary() for name, kind in schema if kind == "category"}
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(path, arrow_schema)
+    else:
+        # 字典只追加，各批次以增量形式写出，文件格式仍可内存映射读取
+        options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+        writer = pa.ipc.new_file(path, arrow_schema, options=options)
+
+    count = 0
+    with writer:
+        columns = {name: [] for name, _kind in schema}
+        for record in records:
+            for name, kind in schema:
+                value = record[name]
+                if kind == "category":
+                    value = dictionaries[name].code(value)
+                elif kind == "timestamp":
+                    value = _utc_naive(value)
+                columns[name].append(value)
+            count += 1
+            if len(columns[schema[0][0]]) >= COLUMNAR_BATCH_ROWS:
+                writer.write_batch(_arrow_batch(schema, arrow_schema, columns, dictionaries))
+                columns = {name: [] for name, _kind in schema}
+        if count == 0 or columns[schema[0][0]]:
+            writer.write_batch(_arrow_batch(schema, arrow_schema, columns, dictionaries))
+    return count
+
+
+# ---- NumPy ----
+
+
+def _write_npy(records, schema, path: str) -> int:
+    os.makedirs(path, exist_ok=True)
+    dictionaries: dict[str, _Dictionary] = {}
+    # 按列紧凑地累积（array 模块），不保留每行的 Python 对象
+    columns = {}
+    for name, kind in schema:
+        if kind in ("text", "category"):
+            dictionaries[name] = _Dictionary()
+            columns[name] = array("i")
+        elif kind == "bool":
+            columns[name] = array("b")
+        else:
+            # int / date（距 1970-01-01 的天数）/ timestamp（微秒）
+            columns[name] = array("q")
+
+    count = 0
+    for record in records:
+        for name, kind in schema:
+            value = record[name]
+            if name in dictionaries:
+                columns[name].append(dictionaries[name].code(value))
+            elif kind == "int":
+                columns[name].append(-1 if value is None else value)
+            elif kind == "bool":
+                columns[name].append(1 if value else 0)
+            elif value is None:
+                columns[name].append(_NAT)
+            elif kind == "date":
+                columns[name].append(value.toordinal() - _EPOCH_ORDINAL)
+            else:
+                columns[name].append((_utc_naive(value) - _EPOCH) // timedelta(microseconds=1))
+        count += 1
+
+    manifest = {"rows": count, "columns": []}
+    for name, kind in schema:
+        values = columns[name]
+        if name in dictionaries:
+            np.save(os.path.join(path, f"{name}.codes.npy"), np.frombuffer(values, dtype=np.int32))
+            categories = dictionaries[name].values
+            np.save(os.path.join(path, f"{name}.categories.npy"), np.array(categories, dtype=np.str_))
+            files = [f"{name}.codes.npy", f"{name}.categories.npy"]
+        else:
+            if kind == "bool":
+                data = np.frombuffer(values, dtype=np.int8).astype(np.bool_)
+            else:
+                data = np.frombuffer(values, dtype=np.int64)
+                if kind == "date":
+                    data = data.view("datetime64[D]")
+                elif kind == "timestamp":
+                    data = data.view("datetime64[us]")
+            np.save(os.path.join(path, f"{name}.npy"), data)
+            files = [f"{name}.npy"]
+        manifest["columns"].append({"name": name, "type": kind, "files": files})
+
+    with open(os.path.join(path, "schema.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return count
+
+
+def write_columnar(records, schema, path: str, fmt: str) -> int:
+    """
+    records 为逐行的 dict（如 borrow_records），schema 为 [(列名, 类型)]；返回行数。
+    fmt 为 resolve_columnar_format 的结果；npy 时 path 为输出目录。
+    """
+
+    if fmt in ("parquet", "arrow"):
+        return _write_arrow(records, schema, path, fmt)
+    return _write_npy(records, schema, path)
@@ -0,0 +1,127 @@
+"""
+目录接口的条件请求（ETag / Last-Modified）。
+
+版本由几条走索引的聚合查询得出，在主查询之前计算；未变化时由
+django.views.decorators.http.condition 直接返回 304。
+"""
+
+import hashlib
+from functools import wraps
+
+from django.apps import apps
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .models import Book, Category
+from .permissions import is_admin
+
+
+def _latest(*values):
+    values = [v for v in values if v is not None]
+    return max(values) if values else None
+
+
+def _memoized(request, key, compute):
+    """同一请求内 etag_func 与 last_modified_func 共用一次计算结果。"""
+
+    cache = request.__dict__.setdefault("_catalog_versions", {})
+    if key not in cache:
+        cache[key] = compute()
+    return cache[key]
+
+
+def _make_etag(request, *parts) -> str:
+    role = "admin" if is_admin(request.user) else "public"
+    raw = "|".join([role, *[str(p) for p in parts]])
+    return '"' + hashlib.md5(raw.encode("utf-8"), usedforsecurity=False).hexdigest() + '"'
+
+
+def _books_state(request):
+    Borrow = apps.get_model("borrows", "Borrow")
+
+    books = Book.objects.aggregate(latest=Max("updated_at"), total=Count("id"))
+    categories = Category.objects.aggregate(latest=Max("updated_at"), total=Count("id"))
+    # 借还已同时更新 Book.updated_at；借阅记录的更新时间仍作兜底（直接对 Borrow 的批量写入）
+    borrows = Borrow.objects.aggregate(latest=Max("updated_at"))
+    etag = _make_etag(
+        request,
+        books["latest"],
+        books["total"],
+        categories["latest"],
+        categories["total"],
+        borrows["latest"],
+    )
+    return etag, _latest(books["latest"], categories["latest"], borrows["latest"])
+
+
+def _categories_state(request):
+    categories = Category.objects.aggregate(latest=Max("updated_at"), total=Count("id"))
+    return _make_etag(request, categories["latest"], categories["total"]), categories["latest"]
+
+
+def _book_state(request, book_id):
+    Borrow = apps.get_model("borrows", "Borrow")
+
+    row = Book.objects.filter(pk=book_id).values_list("updated_at", "category__updated_at").first()
+    if row is None:
+        return None, None
+    borrows = Borrow.objects.filter(book_id=book_id).aggregate(latest=Max("updated_at"))
+    return _make_etag(request, book_id, *row, borrows["latest"]), _latest(*row, borrows["latest"])
+
+
+def books_collection_etag(request):
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return _memoized(request, "books", lambda: _books_state(request))[0]
+
+
+def books_collection_last_modified(request):
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return _memoized(request, "books", lambda: _books_state(request))[1]
+
+
+def categories_collection_etag(request):
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return _memoized(request, "categories", lambda: _categories_state(request))[0]
+
+
+def categories_collection_last_modified(request):
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return _memoized(request, "categories", lambda: _categories_state(request))[1]
+
+
+def book_item_etag(request, book_id: int):
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return _memoized(request, ("book", book_id), lambda: _book_state(request, book_id))[0]
+
+
+def book_item_last_modified(request, book_id: int):
+    if request.method not in ("GET", "HEAD"):
+        return None
+    return _memoized(request, ("book", book_id), lambda: _book_state(request, book_id))[1]
+
+
+def catalog_conditional(etag_func, last_modified_func):
+    """
+    condition() 之外再声明响应按登录态区分（Vary: Cookie），并要求客户端每次重新验证。
+    """
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD"):
+                patch_vary_headers(response, ["Cookie"])
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return inner
+
+    return decorator
@@ -0,0 +1,168 @@
+"""
+封面存储：原图按内容哈希存放（相同图片只存一份，CoverBlob 记录引用计数，
+无引用的文件由 gc_covers 命令延迟清理）；上传时按固定宽度生成重新压缩的
+WebP（不支持时退回 JPEG）缩略图，列表页按需取小图。
+
+依赖 Pillow（可选），未安装时只提供原图。
+"""
+
+import hashlib
+import io
+import mimetypes
+import posixpath
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+
+try:
+    from PIL import Image, ImageOps, features
+except Exception:  # pragma: no cover
+    Image = None
+
+
+COVER_VARIANT_WIDTHS = (96, 240, 480)
+COVER_VARIANT_DIR = "covers/variants"
+COVER_HASH_DIR = "covers/sha256"
+COVER_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp", ".avif"}
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def _variant_format() -> tuple[str, str]:
+    if features.check("webp"):
+        return "WEBP", "webp"
+    return "JPEG", "jpg"
+
+
+def _encode(image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "WEBP":
+        image.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+    else:
+        if image.mode != "RGB":
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A") if "A" in image.getbands() else None)
+            image = background
+        image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def build_cover_variants(storage, name: str, *, directory: str | None = None) -> dict[str, str]:
+    """
+    为已存储的封面生成各宽度的缩略图，返回 {宽度: 存储路径}。
+    缩略图名由原图名决定（<目录>/<原图名>_<宽度>.<扩展名>），已存在则直接复用。
+    Pillow 不可用或图片无法解析时返回空字典。
+    """
+
+    if Image is None or not name:
+        return {}
+
+    try:
+        with storage.open(name, "rb") as f:
+            with Image.open(f) as source:
+                source = ImageOps.exif_transpose(source)
+                source.load()
+    except Exception:
+        return {}
+
+    if source.mode in ("RGBA", "LA") or (source.mode == "P" and "transparency" in source.info):
+        source = source.convert("RGBA")
+    elif source.mode != "RGB":
+        source = source.convert("RGB")
+
+    fmt, ext = _variant_format()
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+    if directory is None:
+        directory = COVER_VARIANT_DIR
+
+    variants: dict[str, str] = {}
+    for width in COVER_VARIANT_WIDTHS:
+        variant_name = f"{directory}/{stem}_{width}.{ext}"
+        if not storage.exists(variant_name):
+            if source.width > width:
+                height = max(1, round(source.height * width / source.width))
+                image = source.resize((width, height), Image.LANCZOS)
+            else:
+                image = source
+            variant_name = storage.save(variant_name, ContentFile(_encode(image, fmt)))
+        variants[str(width)] = variant_name
+    return variants
+
+
+def _cover_extension(uploaded) -> str:
+    ext = posixpath.splitext(getattr(uploaded, "name", "") or "")[1].lower()
+    if ext in COVER_EXTENSIONS:
+        return ext
+    content_type = (getattr(uploaded, "content_type", None) or "").lower()
+    return mimetypes.guess_extension(content_type) or ".img"
+
+
+def store_cover(uploaded, storage=None):
+    """
+    按内容哈希存储封面，返回 CoverBlob（引用计数已 +1）。
+
+    相同内容只存一份，重复上传只需计算一次哈希；缩略图只在首次存储时生成。
+    路径 covers/sha256/<前两位>/<哈希> 内容不可变，可配合长期缓存。
+    """
+
+    CoverBlob = apps.get_model("books", "CoverBlob")
+    if storage is None:
+        storage = CoverBlob.storage()
+
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in uploaded.chunks():
+        hasher.update(chunk)
+        size += len(chunk)
+    digest = hasher.hexdigest()
+
+    # acquire 失败说明该记录刚被 gc_covers 清理，重新存储即可
+    for _attempt in range(3):
+        blob = CoverBlob.objects.filter(sha256=digest).first()
+        if blob is None:
+            directory = f"{COVER_HASH_DIR}/{digest[:2]}"
+            name = f"{directory}/{digest}{_cover_extension(uploaded)}"
+            written = not storage.exists(name)
+            if written:
+                uploaded.seek(0)
+                name = storage.save(name, uploaded)
+            variants = build_cover_variants(storage, name, directory=directory) or None
+            try:
+                blob, _ = CoverBlob.objects.get_or_create(
+                    sha256=digest,
+                    defaults={"name": name, "variants": variants, "size": size},
+                )
+            except Exception:
+                # 没有记录的文件 gc_covers 找不到，这里写入的要当场删掉
+                if written:
+                    delete_cover_variants(storage, variants)
+                    storage.delete(name)
+                raise
+        if CoverBlob.acquire(blob.pk):
+            return blob
+    raise RuntimeError("封面存储失败")
+
+
+def delete_cover_variants(storage, variants) -> None:
+    for name in (variants or {}).values():
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+
+
+def cover_urls(storage, cover_name, variants, request=None) -> dict | None:
+    if not cover_name:
+        return None
+
+    def absolute(name):
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    try:
+        urls = {"original": absolute(cover_name)}
+        for width, name in (variants or {}).items():
+            urls[width] = absolute(name)
+    except Exception:
+        return None
+    return urls
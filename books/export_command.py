@@ -0,0 +1,109 @@
+"""
+export_books / export_borrows 共用的命令实现：水位线窗口、分片并行与列式格式的分发
+都在这里，子类只声明模型和各格式的序列化函数。
+"""
+
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .columnar import COLUMNAR_FORMATS, ColumnarUnavailable, resolve_columnar_format, write_columnar
+from .export_shards import concat_parts, export_in_shards
+from .export_window import export_window, parse_since, read_state, window_filters, write_state
+
+
+class ExportCommand(BaseCommand):
+    # 子类设置：导出的模型、CSV 列与行生成函数（须为模块级函数，分片子进程按导入路径取得）、
+    # 整表写 CSV 的函数、列式导出的记录生成函数与列类型
+    model = None
+    csv_columns = ()
+    csv_rows = None
+    write_csv = None
+    records = None
+    columnar_schema = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default="-",
+            help="输出文件路径，默认 '-' 表示输出到 stdout",
+        )
+        parser.add_argument("--since", help="只导出 updated_at 晚于该时间（ISO 格式）的记录")
+        parser.add_argument(
+            "--state-file", help="水位线文件：未指定 --since 时从中读取起点，导出成功后写入新的水位线"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1, help="按 id 区间分片并行导出的进程数，各分片写入 <output>.partNNN"
+        )
+        parser.add_argument("--concat", action="store_true", help="配合 --workers：导出后拼接为单个 CSV 并删除分片")
+        parser.add_argument(
+            "--format",
+            choices=("csv", *COLUMNAR_FORMATS),
+            default="csv",
+            help="parquet/arrow 需要 pyarrow，未安装时退回 npy（--output 为目录，每列一个 .npy 文件）",
+        )
+
+    def handle(self, *args, **options):
+        output = options["output"]
+        state_file = options["state_file"]
+        name = self.model.__name__
+        try:
+            since = parse_since(options["since"]) if options["since"] else read_state(state_file)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        qs, watermark = export_window(self.model._default_manager.all(), since)
+
+        if options["format"] != "csv":
+            if output == "-" or options["workers"] > 1:
+                raise CommandError("列式导出需要 --output 路径，且不支持 --workers")
+            try:
+                fmt = resolve_columnar_format(options["format"])
+            except ColumnarUnavailable as exc:
+                raise CommandError(str(exc))
+            if fmt != options["format"]:
+                self.stderr.write(f"未安装 pyarrow，改为导出 NumPy 列文件到目录 {output}")
+            total = write_columnar(self.records(qs), self.columnar_schema, output, fmt)
+            self._save_watermark(state_file, watermark)
+            self.stdout.write(f"已导出 {total} 条 {name} 到 {output}（{fmt}，水位线 {watermark.isoformat()}）")
+            return
+
+        if options["workers"] > 1:
+            if output == "-":
+                raise CommandError("--workers 需要配合 --output 文件路径使用")
+            total, parts = export_in_shards(
+                self.model,
+                self.csv_rows,
+                self.csv_columns,
+                output=output,
+                filters=window_filters(since, watermark),
+                workers=options["workers"],
+            )
+            if options["concat"]:
+                concat_parts(parts, output)
+                for part in parts:
+                    os.remove(part)
+                target = output
+            else:
+                target = f"{len(parts)} 个分片 {output}.partNNN"
+            self._save_watermark(state_file, watermark)
+            self.stdout.write(f"已导出 {total} 条 {name} 到 {target}（水位线 {watermark.isoformat()}）")
+            return
+
+        if output == "-":
+            sys.stdout.write("\ufeff")
+            self.write_csv(qs, sys.stdout)
+            self._save_watermark(state_file, watermark)
+            return
+
+        with open(output, "w", encoding="utf-8-sig", newline="") as f:
+            self.write_csv(qs, f)
+
+        self._save_watermark(state_file, watermark)
+        self.stdout.write(f"已导出 {qs.count()} 条 {name} 到 {output}（水位线 {watermark.isoformat()}）")
+
+    def _save_watermark(self, state_file, watermark) -> None:
+        if state_file:
+            write_state(state_file, watermark)
+        else:
+            self.stderr.write(f"水位线：{watermark.isoformat()}")
@@ -0,0 +1,282 @@
+"""
+后台导入任务：上传的文件（CSV / JSONL，可 gzip 压缩）先落盘并登记为 BookImportJob，由
+`python manage.py import_books --worker` 逐个认领执行，前端轮询进度。
+
+每批提交时在同一事务里记录断点（行号 + 字节偏移），进程中断后可用
+`import_books --resume <job_id>` 直接 seek 到断点继续。atomic 任务整份在一个事务里执行，
+没有断点，进度在结束时一次写入；续传时从头重新执行。
+
+执行期间后台线程定期刷新 heartbeat_at。worker 被杀掉后，心跳超过 IMPORT_JOB_LEASE_SECONDS
+的 running 任务会被其它 worker 重新认领并从断点续传。
+"""
+
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .admin_csv import (
+    DEFAULT_IMPORT_BATCH_SIZE,
+    IMPORT_FORMATS,
+    detect_import_format,
+    import_books_from_csv,
+    open_import_binary,
+    read_csv_header,
+    read_import_bom,
+    wrap_uploaded_file,
+)
+from .models import BookImportJob
+
+
+def create_import_job(
+    uploaded=None,
+    *,
+    source_path: str = "",
+    dry_run: bool = False,
+    atomic: bool = False,
+    chunk_atomic: bool = False,
+    snapshot: bool = False,
+    input_format: str | None = None,
+    user=None,
+) -> BookImportJob:
+    """input_format 为空时按文件名识别（.csv / .csv.gz / .jsonl / .jsonl.gz）。"""
+
+    name = getattr(uploaded, "name", "") if uploaded is not None else source_path
+    fmt = IMPORT_FORMATS[input_format] if input_format else detect_import_format(name)
+    job = BookImportJob(
+        source_path=source_path,
+        input_format=fmt.name,
+        dry_run=dry_run,
+        atomic=atomic,
+        chunk_atomic=chunk_atomic,
+        snapshot=snapshot and dry_run,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    if uploaded is not None:
+        job.original_name = (getattr(uploaded, "name", "") or "")[:255]
+        job.file.save(f"books-{timezone.now():%H%M%S}.{fmt.name}", uploaded, save=False)
+    else:
+        job.original_name = source_path[-255:]
+    job.save()
+    return job
+
+
+def claim_job(job_id: int, *, resume: bool = False) -> bool:
+    """
+    把任务标记为 running；多个 worker 同时认领时只有一个成功。
+    resume=True 时也可认领中断（running）或失败的任务。
+    """
+
+    statuses = [BookImportJob.Status.PENDING]
+    if resume:
+        statuses += [BookImportJob.Status.RUNNING, BookImportJob.Status.FAILED]
+
+    now = timezone.now()
+    claimed = BookImportJob.objects.filter(pk=job_id, status__in=statuses).update(
+        status=BookImportJob.Status.RUNNING,
+        message="",
+        started_at=now,
+        heartbeat_at=now,
+        finished_at=None,
+        updated_at=now,
+    )
+    return claimed == 1
+
+
+def claim_next_job() -> BookImportJob | None:
+    pending = BookImportJob.objects.filter(status=BookImportJob.Status.PENDING).order_by("id")
+    for job_id in pending.values_list("id", flat=True)[:10]:
+        if claim_job(job_id):
+            return BookImportJob.objects.get(pk=job_id)
+    return None
+
+
+def _lease_seconds() -> int:
+    return int(getattr(settings, "IMPORT_JOB_LEASE_SECONDS", 300))
+
+
+def _stale_running() -> Q:
+    cutoff = timezone.now() - timedelta(seconds=_lease_seconds())
+    return Q(status=BookImportJob.Status.RUNNING) & (
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+
+
+def claim_stale_job() -> BookImportJob | None:
+    """
+    认领心跳已超过租约的 running 任务（原 worker 已退出）；条件更新保证只有一个 worker 成功。
+    调用方应以 resume=True 执行，从断点继续。
+    """
+
+    for job_id in BookImportJob.objects.filter(_stale_running()).order_by("id").values_list("id", flat=True)[:10]:
+        now = timezone.now()
+        claimed = BookImportJob.objects.filter(_stale_running(), pk=job_id).update(
+            message="", started_at=now, heartbeat_at=now, updated_at=now
+        )
+        if claimed:
+            return BookImportJob.objects.get(pk=job_id)
+    return None
+
+
+class _Heartbeat:
+    """
+    后台线程每隔租约的三分之一刷新一次 heartbeat_at。atomic 任务不调用 progress，
+    也靠它续约；写入失败（如 SQLite 上外层写事务尚未提交）时等下一轮再试。
+    """
+
+    def __init__(self, job_id: int):
+        self.job_id = job_id
+        self.interval = _lease_seconds() / 3
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"import-job-{job_id}-heartbeat", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    BookImportJob.objects.filter(pk=self.job_id, status=BookImportJob.Status.RUNNING).update(
+                        heartbeat_at=timezone.now()
+                    )
+                except DatabaseError:
+                    pass
+        finally:
+            # 线程自己的数据库连接
+            connections.close_all()
+
+
+def _open_source(job: BookImportJob):
+    if job.source_path:
+        return open(job.source_path, "rb")
+    return job.file.open("rb")
+
+
+def run_import_job(
+    job: BookImportJob,
+    *,
+    resume: bool = False,
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+    workers: int = 1,
+) -> BookImportJob:
+    """执行已认领（running）的任务，结束后写回结果。resume=True 时从断点继续并累加此前的计数。"""
+
+    # atomic 任务失败时整份回滚，此前不会留下断点；仍按从头执行处理，以免沿用旧计数
+    resume = resume and job.checkpoint_row > 0 and not job.atomic
+    if resume:
+        base = {
+            "rows": job.rows_processed,
+            "created": job.created_count,
+            "updated": job.updated_count,
+            "skipped": job.skipped_count,
+            "errors": list(job.errors or []),
+        }
+    else:
+        base = {"rows": 0, "created": 0, "updated": 0, "skipped": 0, "errors": []}
+
+    def progress(state):
+        BookImportJob.objects.filter(pk=job.id).update(
+            rows_processed=base["rows"] + state.rows_processed,
+            created_count=base["created"] + state.counts["created"],
+            updated_count=base["updated"] + state.counts["updated"],
+            skipped_count=base["skipped"] + state.counts["skipped"],
+            errors=base["errors"] + [e.to_dict() for e in state.errors],
+            checkpoint_row=state.row,
+            checkpoint_offset=state.offset,
+            heartbeat_at=timezone.now(),
+            updated_at=timezone.now(),
+        )
+
+    with _Heartbeat(job.id):
+        try:
+            fmt = IMPORT_FORMATS[job.input_format]
+            with _open_source(job) as raw, open_import_binary(raw, fmt) as bf:
+                if fmt.kind == "csv":
+                    fieldnames, bom = read_csv_header(bf)
+                else:
+                    fieldnames, bom = None, read_import_bom(bf)
+                if resume:
+                    bf.seek(job.checkpoint_offset)
+                    position = {
+                        "fieldnames": fieldnames,
+                        "start_row": job.checkpoint_row + 1,
+                        "start_offset": job.checkpoint_offset,
+                    }
+                else:
+                    bf.seek(0)
+                    position = {"start_offset": bom}
+                with wrap_uploaded_file(bf) as f:
+                    result = import_books_from_csv(
+                        f,
+                        dry_run=job.dry_run,
+                        atomic=job.atomic,
+                        chunk_atomic=job.chunk_atomic,
+                        batch_size=batch_size,
+                        workers=workers,
+                        snapshot=job.snapshot,
+                        input_format=fmt.kind,
+                        progress=progress,
+                        **position,
+                    )
+        except Exception as exc:
+            BookImportJob.objects.filter(pk=job.id).update(
+                status=BookImportJob.Status.FAILED,
+                message=f"导入失败：{exc}",
+                finished_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+        else:
+            BookImportJob.objects.filter(pk=job.id).update(
+                status=BookImportJob.Status.SUCCEEDED,
+                rows_processed=base["rows"] + result["rows_processed"],
+                created_count=base["created"] + result["created"],
+                updated_count=base["updated"] + result["updated"],
+                skipped_count=base["skipped"] + result["skipped"],
+                errors=base["errors"] + result["errors"],
+                applied=result["applied"],
+                field_changes=result.get("field_changes"),
+                finished_at=timezone.now(),
+                updated_at=timezone.now(),
+            )
+            if job.file:
+                # 成功后不再需要上传的文件
+                job.file.delete(save=False)
+                BookImportJob.objects.filter(pk=job.id).update(file=None)
+
+    job.refresh_from_db()
+    return job
+
+
+def serialize_import_job(job: BookImportJob) -> dict:
+    return {
+        "id": job.id,
+        "status": job.status,
+        "finished": job.is_finished,
+        "file_name": job.original_name,
+        "input_format": job.input_format,
+        "dry_run": job.dry_run,
+        "atomic": job.atomic,
+        "chunk_atomic": job.chunk_atomic,
+        "applied": job.applied,
+        "rows_processed": job.rows_processed,
+        "created": job.created_count,
+        "updated": job.updated_count,
+        "skipped": job.skipped_count,
+        "has_errors": bool(job.errors),
+        "errors": job.errors,
+        "field_changes": job.field_changes,
+        "checkpoint_row": job.checkpoint_row,
+        "message": job.message,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,44 @@
+import posixpath
+
+from django.core.management.base import BaseCommand
+
+from books.covers import COVER_HASH_DIR, build_cover_variants, delete_cover_variants
+from books.models import Book, CoverBlob
+
+
+class Command(BaseCommand):
+    help = "Generate resized cover variants for books that have a cover."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="已有缩略图的图书也重新生成")
+
+    def handle(self, *args, **options):
+        force = bool(options["force"])
+
+        qs = Book.objects.exclude(cover="").exclude(cover__isnull=True)
+        if not force:
+            qs = qs.filter(cover_variants__isnull=True)
+
+        built = 0
+        failed = 0
+        done: dict[str, dict] = {}
+        for book in qs.only("id", "cover", "cover_variants").iterator(chunk_size=200):
+            name = book.cover.name
+            variants = done.get(name)
+            if variants is None:
+                storage = book.cover.storage
+                if force:
+                    delete_cover_variants(storage, book.cover_variants)
+                # 按哈希存储的封面，缩略图与原图放在同一目录，供所有引用共用
+                directory = posixpath.dirname(name) if name.startswith(COVER_HASH_DIR + "/") else None
+                variants = build_cover_variants(storage, name, directory=directory)
+                if variants:
+                    CoverBlob.objects.filter(name=name).update(variants=variants)
+                done[name] = variants
+            if not variants:
+                failed += 1
+                continue
+            Book.objects.filter(pk=book.pk).update(cover_variants=variants)
+            built += 1
+
+        self.stdout.write(f"已生成 {built} 本图书的封面缩略图，失败 {failed} 本")
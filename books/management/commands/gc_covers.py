@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from books.covers import delete_cover_variants
+from books.models import Book, CoverBlob
+
+
+class Command(BaseCommand):
+    help = "Delete cover files that have had no references for longer than the grace period."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=float, default=24, help="引用归零后保留的小时数（默认 24）")
+        parser.add_argument("--reconcile", action="store_true", help="先按图书数据重新计算引用数")
+        parser.add_argument("--dry-run", action="store_true", help="只统计，不删除")
+
+    def handle(self, *args, **options):
+        if options["reconcile"]:
+            fixed = self._reconcile()
+            self.stdout.write(f"已校正 {fixed} 条封面引用数")
+
+        cutoff = timezone.now() - timedelta(hours=float(options["grace_hours"]))
+        candidates = CoverBlob.objects.filter(ref_count=0, released_at__lte=cutoff).values_list("pk", flat=True)
+
+        storage = CoverBlob.storage()
+        removed = 0
+        for pk in list(candidates.iterator(chunk_size=500)):
+            with transaction.atomic():
+                blob = CoverBlob.objects.select_for_update().filter(pk=pk, ref_count=0).first()
+                if blob is None:
+                    continue
+                # 计数可能因绕过 API 的写入而偏差，删除前以图书数据为准再确认一次
+                refs = Book.objects.filter(cover=blob.name).count()
+                if refs:
+                    CoverBlob.objects.filter(pk=pk).update(ref_count=refs, released_at=None)
+                    continue
+                if options["dry_run"]:
+                    removed += 1
+                    continue
+                delete_cover_variants(storage, blob.variants)
+                try:
+                    storage.delete(blob.name)
+                except Exception:
+                    pass
+                blob.delete()
+                removed += 1
+
+        verb = "可清理" if options["dry_run"] else "已清理"
+        self.stdout.write(f"{verb} {removed} 个无引用的封面文件")
+
+    def _reconcile(self) -> int:
+        counts = dict(
+            Book.objects.exclude(cover="")
+            .exclude(cover__isnull=True)
+            .values("cover")
+            .annotate(n=Count("id"))
+            .values_list("cover", "n")
+        )
+        now = timezone.now()
+        fixed = 0
+        for blob in CoverBlob.objects.iterator(chunk_size=500):
+            refs = counts.pop(blob.name, 0)
+            if refs == blob.ref_count:
+                continue
+            released_at = None if refs else (blob.released_at or now)
+            CoverBlob.objects.filter(pk=blob.pk).update(ref_count=refs, released_at=released_at)
+            fixed += 1
+
+        # 改造前上传、尚无记录的封面
+        for name, refs in counts.items():
+            variants = Book.objects.filter(cover=name).values_list("cover_variants", flat=True).first()
+            CoverBlob.objects.get_or_create(name=name, defaults={"variants": variants, "ref_count": refs})
+            fixed += 1
+        return fixed
@@ -1,26 +1,115 @@
 import json
+import os
+import time
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
-from books.admin_csv import import_books_from_csv, wrap_uploaded_file
+from books.admin_csv import DEFAULT_IMPORT_BATCH_SIZE, IMPORT_FORMATS
+from books.import_jobs import (
+    claim_job,
+    claim_next_job,
+    claim_stale_job,
+    create_import_job,
+    run_import_job,
+    serialize_import_job,
+)
+from books.models import BookImportJob
 
 
 class Command(BaseCommand):
-    help = "Import books from CSV (upsert by isbn)."
+    help = "Import books from CSV/JSONL (upsert by isbn), or run queued import jobs as a worker."
 
     def add_arguments(self, parser):
-        parser.add_argument("--file", required=True, help="CSV 文件路径（UTF-8/UTF-8-BOM）")
+        parser.add_argument("--file", help="CSV / JSONL 文件路径（UTF-8/UTF-8-BOM，可为 .gz）")
+        parser.add_argument(
+            "--format", choices=sorted(IMPORT_FORMATS), help="文件格式（默认按扩展名识别，无法识别时按 csv）"
+        )
         parser.add_argument("--dry-run", action="store_true", help="只校验不写入")
-        parser.add_argument("--atomic", action="store_true", help="任一行失败则整批回滚")
+        parser.add_argument(
+            "--snapshot", action="store_true", help="配合 --dry-run：一次读入目录快照，在内存中比对整份文件"
+        )
+        parser.add_argument("--atomic", action="store_true", help="任一行失败则全部回滚")
+        parser.add_argument(
+            "--chunk-atomic", action="store_true", help="任一行失败只回滚所在批次（与 --atomic 二选一）"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=DEFAULT_IMPORT_BATCH_SIZE, help="每批处理的行数"
+        )
+        parser.add_argument(
+            "--workers", type=int, default=1, help="并行预校验的进程数（默认 1，即在当前进程内执行）"
+        )
+        parser.add_argument("--job", type=int, help="执行指定的排队任务")
+        parser.add_argument(
+            "--resume",
+            type=int,
+            metavar="JOB",
+            help=(
+                "从断点继续中断或失败的任务（确认原进程已退出；worker 会自动接管心跳超时的任务）；"
+                "--atomic 任务没有断点，从头重新执行"
+            ),
+        )
+        parser.add_argument("--worker", action="store_true", help="作为后台 worker 持续处理排队任务")
+        parser.add_argument("--once", action="store_true", help="配合 --worker：处理完当前排队任务后退出")
+        parser.add_argument("--poll-interval", type=float, default=2.0, help="worker 空闲时的轮询间隔（秒）")
 
     def handle(self, *args, **options):
-        path = options["file"]
-        dry_run = bool(options["dry_run"])
-        atomic = bool(options["atomic"])
+        run_options = {"batch_size": options["batch_size"], "workers": max(1, options["workers"])}
+        if options["worker"]:
+            self._run_worker(
+                once=bool(options["once"]), interval=float(options["poll_interval"]), **run_options
+            )
+            return
+        if options["job"]:
+            self._run_job(options["job"], **run_options)
+            return
+        if options["resume"]:
+            self._run_job(options["resume"], resume=True, **run_options)
+            return
+        if not options["file"]:
+            raise CommandError("需要 --file、--job、--resume 或 --worker 之一")
+        if options["atomic"] and options["chunk_atomic"]:
+            raise CommandError("--atomic 与 --chunk-atomic 不能同时使用")
 
-        with open(path, "rb") as bf:
-            with wrap_uploaded_file(bf) as f:
-                result = import_books_from_csv(f, dry_run=dry_run, atomic=atomic)
+        path = os.path.abspath(options["file"])
+        if not os.path.isfile(path):
+            raise CommandError(f"文件不存在：{path}")
 
-        self.stdout.write(json.dumps(result, ensure_ascii=False))
+        job = create_import_job(
+            source_path=path,
+            dry_run=bool(options["dry_run"]),
+            atomic=bool(options["atomic"]),
+            chunk_atomic=bool(options["chunk_atomic"]),
+            snapshot=bool(options["snapshot"]),
+            input_format=options["format"],
+        )
+        # 中断后可用 --resume <job_id> 继续
+        self.stderr.write(f"导入任务 #{job.id}")
+        self._run_job(job.id, **run_options)
 
+    def _run_job(self, job_id: int, *, resume: bool = False, **run_options) -> None:
+        if not claim_job(job_id, resume=resume):
+            raise CommandError(f"任务 {job_id} 不存在或状态不允许执行")
+        if resume and BookImportJob.objects.filter(pk=job_id, atomic=True).exists():
+            self.stderr.write(f"任务 #{job_id} 为 atomic 导入，没有断点，从头重新执行")
+        job = run_import_job(BookImportJob.objects.get(pk=job_id), resume=resume, **run_options)
+        self.stdout.write(json.dumps({"ok": True, **serialize_import_job(job)}, ensure_ascii=False))
+
+    def _run_worker(self, *, once: bool, interval: float, **run_options) -> None:
+        while True:
+            job, resume = claim_next_job(), False
+            if job is None:
+                # 心跳超时的 running 任务：原 worker 已退出，从断点接着执行
+                job = claim_stale_job()
+                resume = job is not None
+            if job is None:
+                if once:
+                    return
+                time.sleep(interval)
+                continue
+            if resume:
+                self.stderr.write(f"导入任务 #{job.id} 心跳超时，从断点继续")
+            job = run_import_job(job, resume=resume, **run_options)
+            self.stdout.write(
+                f"导入任务 #{job.id} {job.status}：已处理 {job.rows_processed} 行，"
+                f"新增 {job.created_count}，更新 {job.updated_count}，跳过 {job.skipped_count}"
+            )
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from books.models import Book
+from books.search import SQLITE_FTS_TABLE, get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild book search indexes (CJK/pinyin tokens and SQLite FTS5)."
+
+    def handle(self, *args, **options):
+        count = 0
+        for book in Book.objects.only("id", "title", "author", "publisher").iterator(chunk_size=1000):
+            book._sync_search_tokens()
+            count += 1
+
+        backend = get_search_backend()
+        if backend.name == "sqlite_fts5":
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('rebuild')")
+
+        self.stdout.write(f"已重建 {count} 本图书的检索索引（backend={backend.name}）")
@@ -0,0 +1,101 @@
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_book_fts USING fts5(
+        title, author, isbn, publisher,
+        content='books_book', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_book_fts_ai AFTER INSERT ON books_book BEGIN
+        INSERT INTO books_book_fts(rowid, title, author, isbn, publisher)
+        VALUES (new.id, new.title, new.author, new.isbn, new.publisher);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_book_fts_ad AFTER DELETE ON books_book BEGIN
+        INSERT INTO books_book_fts(books_book_fts, rowid, title, author, isbn, publisher)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.publisher);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_book_fts_au
+    AFTER UPDATE OF title, author, isbn, publisher ON books_book BEGIN
+        INSERT INTO books_book_fts(books_book_fts, rowid, title, author, isbn, publisher)
+        VALUES ('delete', old.id, old.title, old.author, old.isbn, old.publisher);
+        INSERT INTO books_book_fts(rowid, title, author, isbn, publisher)
+        VALUES (new.id, new.title, new.author, new.isbn, new.publisher);
+    END
+    """,
+    "INSERT INTO books_book_fts(books_book_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS books_book_fts_au",
+    "DROP TRIGGER IF EXISTS books_book_fts_ad",
+    "DROP TRIGGER IF EXISTS books_book_fts_ai",
+    "DROP TABLE IF EXISTS books_book_fts",
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX IF NOT EXISTS books_book_search_gin ON books_book USING GIN (
+        to_tsvector('simple', coalesce(books_book.title, '') || ' ' || coalesce(books_book.author, '')
+            || ' ' || coalesce(books_book.isbn, '') || ' ' || coalesce(books_book.publisher, ''))
+    )
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS books_book_search_gin",
+]
+
+
+def _sqlite_has_fts5_trigram(connection) -> bool:
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x, tokenize='trigram')")
+        except Exception:
+            return False
+        cursor.execute("DROP TABLE temp._fts5_probe")
+    return True
+
+
+def create_search_index(apps, schema_editor) -> None:
+    connection = schema_editor.connection
+    if connection.vendor == "sqlite":
+        if not _sqlite_has_fts5_trigram(connection):
+            return
+        statements = SQLITE_FORWARD
+    elif connection.vendor == "postgresql":
+        statements = POSTGRES_FORWARD
+    else:
+        return
+
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor) -> None:
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        statements = SQLITE_BACKWARD
+    elif vendor == "postgresql":
+        statements = POSTGRES_BACKWARD
+    else:
+        return
+
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0003_book_updated_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, reverse_code=drop_search_index),
+    ]
@@ -0,0 +1,109 @@
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+try:
+    from pypinyin import lazy_pinyin
+except Exception:  # pragma: no cover
+    lazy_pinyin = None
+
+
+# 迁移时的分词规则（books.search_tokens 的冻结副本）：之后修改分词不影响本迁移
+_CJK_RUN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def _pinyin_tokens(chars):
+    if lazy_pinyin is None or not chars:
+        return set()
+
+    syllables = [s for s in lazy_pinyin(chars) if s.isalpha()]
+    initials = "".join(s[0] for s in syllables)
+
+    tokens = set()
+    for start in range(len(syllables)):
+        for end in range(start + 2, min(start + 8, len(initials)) + 1):
+            tokens.add("i:" + initials[start:end])
+
+        spelled = "".join(syllables[start : start + 4])
+        for end in range(2, len(spelled) + 1):
+            tokens.add("p:" + spelled[:end])
+    return tokens
+
+
+def book_search_tokens(*, title="", author="", publisher=""):
+    values = {"title": title, "author": author, "publisher": publisher}
+    tokens = set()
+    for field in ("title", "author", "publisher"):
+        text = unicodedata.normalize("NFKC", str(values[field] or "")).lower()
+        runs = _CJK_RUN_RE.findall(text)
+        for run in runs:
+            tokens.update("c:" + gram for gram in run)
+            tokens.update("c:" + run[i : i + 2] for i in range(len(run) - 1))
+        if field in ("title", "author"):
+            tokens |= _pinyin_tokens("".join(runs))
+    return {t for t in tokens if len(t) <= 64}
+
+
+def build_search_tokens(apps, schema_editor) -> None:
+    Book = apps.get_model("books", "Book")
+    BookSearchToken = apps.get_model("books", "BookSearchToken")
+    db_alias = schema_editor.connection.alias
+
+    batch = []
+    for book in (
+        Book.objects.using(db_alias).only("id", "title", "author", "publisher").iterator(chunk_size=1000)
+    ):
+        tokens = book_search_tokens(title=book.title, author=book.author, publisher=book.publisher)
+        batch.extend(BookSearchToken(book_id=book.id, token=token) for token in tokens)
+        if len(batch) >= 5000:
+            BookSearchToken.objects.using(db_alias).bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        BookSearchToken.objects.using(db_alias).bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0004_book_search_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookSearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=64, verbose_name="检索词")),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="books.book",
+                        verbose_name="图书",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "检索词",
+                "verbose_name_plural": "检索词",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="booksearchtoken",
+            constraint=models.UniqueConstraint(
+                fields=("token", "book"),
+                name="booksearchtoken_unique_token_book",
+            ),
+        ),
+        migrations.RunPython(build_search_tokens, reverse_code=migrations.RunPython.noop),
+    ]
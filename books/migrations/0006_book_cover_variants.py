@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0005_booksearchtoken"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="cover_variants",
+            field=models.JSONField(blank=True, null=True, verbose_name="封面缩略图"),
+        ),
+    ]
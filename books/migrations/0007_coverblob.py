@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0006_book_cover_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CoverBlob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255, unique=True, verbose_name="存储路径")),
+                (
+                    "sha256",
+                    models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name="SHA-256"),
+                ),
+                ("variants", models.JSONField(blank=True, null=True, verbose_name="缩略图")),
+                ("size", models.PositiveBigIntegerField(default=0, verbose_name="文件大小")),
+                ("ref_count", models.PositiveIntegerField(default=0, verbose_name="引用数")),
+                (
+                    "released_at",
+                    models.DateTimeField(blank=True, db_index=True, null=True, verbose_name="引用归零时间"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="创建时间")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新时间")),
+            ],
+            options={
+                "verbose_name": "封面文件",
+                "verbose_name_plural": "封面文件",
+            },
+        ),
+    ]
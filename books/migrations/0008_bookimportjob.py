@@ -0,0 +1,63 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0007_coverblob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookImportJob",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "file",
+                    models.FileField(blank=True, null=True, upload_to="imports/%Y%m%d/", verbose_name="CSV 文件"),
+                ),
+                ("original_name", models.CharField(blank=True, max_length=255, verbose_name="原文件名")),
+                ("dry_run", models.BooleanField(default=False, verbose_name="试运行")),
+                ("atomic", models.BooleanField(default=False, verbose_name="原子导入")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[("pending", "排队中"), ("running", "导入中"), ("succeeded", "已完成"), ("failed", "失败")],
+                        db_index=True,
+                        default="pending",
+                        max_length=20,
+                        verbose_name="状态",
+                    ),
+                ),
+                ("rows_processed", models.PositiveIntegerField(default=0, verbose_name="已处理行数")),
+                ("created_count", models.PositiveIntegerField(default=0, verbose_name="新增")),
+                ("updated_count", models.PositiveIntegerField(default=0, verbose_name="更新")),
+                ("skipped_count", models.PositiveIntegerField(default=0, verbose_name="跳过")),
+                ("errors", models.JSONField(blank=True, default=list, verbose_name="错误")),
+                ("applied", models.BooleanField(default=False, verbose_name="已写入")),
+                ("message", models.TextField(blank=True, verbose_name="失败原因")),
+                ("started_at", models.DateTimeField(blank=True, null=True, verbose_name="开始时间")),
+                ("finished_at", models.DateTimeField(blank=True, null=True, verbose_name="结束时间")),
+                ("created_at", models.DateTimeField(auto_now_add=True, verbose_name="创建时间")),
+                ("updated_at", models.DateTimeField(auto_now=True, verbose_name="更新时间")),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="book_import_jobs",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="提交人",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "图书导入任务",
+                "verbose_name_plural": "图书导入任务",
+                "ordering": ["-id"],
+            },
+        ),
+    ]
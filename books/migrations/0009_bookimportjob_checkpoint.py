@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0008_bookimportjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookimportjob",
+            name="checkpoint_offset",
+            field=models.PositiveBigIntegerField(default=0, verbose_name="断点字节偏移"),
+        ),
+        migrations.AddField(
+            model_name="bookimportjob",
+            name="checkpoint_row",
+            field=models.PositiveIntegerField(default=0, verbose_name="断点行号"),
+        ),
+        migrations.AddField(
+            model_name="bookimportjob",
+            name="chunk_atomic",
+            field=models.BooleanField(default=False, verbose_name="分批原子导入"),
+        ),
+        migrations.AddField(
+            model_name="bookimportjob",
+            name="source_path",
+            field=models.CharField(blank=True, max_length=500, verbose_name="本地文件路径"),
+        ),
+    ]
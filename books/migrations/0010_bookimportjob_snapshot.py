@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0009_bookimportjob_checkpoint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookimportjob",
+            name="field_changes",
+            field=models.JSONField(blank=True, null=True, verbose_name="字段变更统计"),
+        ),
+        migrations.AddField(
+            model_name="bookimportjob",
+            name="snapshot",
+            field=models.BooleanField(default=False, verbose_name="快照比对"),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0010_bookimportjob_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookimportjob",
+            name="input_format",
+            field=models.CharField(default="csv", max_length=20, verbose_name="文件格式"),
+        ),
+    ]
@@ -0,0 +1,56 @@
+import re
+import unicodedata
+
+from django.db import migrations
+
+try:
+    from pypinyin import lazy_pinyin
+except Exception:  # pragma: no cover
+    lazy_pinyin = None
+
+
+# 冻结副本：标题 + 作者连成一串后的首字母词（"三体" + "刘慈欣" → i:stl 等）
+_CJK_RUN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def _initials_tokens(title, author):
+    syllables = []
+    for value in (title, author):
+        text = unicodedata.normalize("NFKC", str(value or "")).lower()
+        chars = "".join(_CJK_RUN_RE.findall(text))
+        if chars:
+            syllables += [s for s in lazy_pinyin(chars) if s.isalpha()]
+    initials = "".join(s[0] for s in syllables)
+    return {
+        "i:" + initials[start:end]
+        for start in range(len(initials))
+        for end in range(start + 2, min(start + 8, len(initials)) + 1)
+    }
+
+
+def add_cross_field_initials(apps, schema_editor) -> None:
+    if lazy_pinyin is None:
+        return
+    Book = apps.get_model("books", "Book")
+    BookSearchToken = apps.get_model("books", "BookSearchToken")
+    db_alias = schema_editor.connection.alias
+
+    batch = []
+    for book in Book.objects.using(db_alias).only("id", "title", "author").iterator(chunk_size=1000):
+        tokens = _initials_tokens(book.title, book.author)
+        batch.extend(BookSearchToken(book_id=book.id, token=token) for token in tokens)
+        if len(batch) >= 5000:
+            BookSearchToken.objects.using(db_alias).bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        BookSearchToken.objects.using(db_alias).bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0011_bookimportjob_input_format"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_cross_field_initials, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+
+# icontains 在 PostgreSQL 上生成 UPPER("col"::text) LIKE UPPER(%s)，索引表达式与之一致
+TRIGRAM_COLUMNS = ("title", "author", "isbn", "publisher")
+
+
+def create_trigram_indexes(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS books_book_{column}_trgm ON books_book "
+            f"USING GIN ((UPPER({column}::text)) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor) -> None:
+    if schema_editor.connection.vendor != "postgresql":
+        return
+
+    for column in TRIGRAM_COLUMNS:
+        schema_editor.execute(f"DROP INDEX IF EXISTS books_book_{column}_trgm")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0012_booksearchtoken_cross_field_initials"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, reverse_code=drop_trigram_indexes),
+    ]
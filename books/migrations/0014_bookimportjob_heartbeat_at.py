@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0013_book_search_trigram"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookimportjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True, verbose_name="心跳时间"),
+        ),
+    ]
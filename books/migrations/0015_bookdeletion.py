@@ -0,0 +1,26 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("books", "0014_bookimportjob_heartbeat_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookDeletion",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("book_id", models.BigIntegerField(verbose_name="图书 ID")),
+                (
+                    "deleted_at",
+                    models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name="删除时间"),
+                ),
+            ],
+            options={
+                "verbose_name": "图书删除记录",
+                "verbose_name_plural": "图书删除记录",
+            },
+        ),
+    ]
@@ -1,9 +1,16 @@
 from django.apps import apps
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.db.models import F, Max, Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .catalog_cache import bump_catalog_version
+from .search_tokens import book_search_tokens
+
 
 class Category(models.Model):
     name = models.CharField(_("分类名称"), max_length=100, unique=True)
@@ -16,6 +23,15 @@ class Category(models.Model):
         verbose_name_plural = _("分类")
         ordering = ["name"]
 
+    def save(self, *args, **kwargs):  # type: ignore[override]
+        super().save(*args, **kwargs)
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):  # type: ignore[override]
+        result = super().delete(*args, **kwargs)
+        bump_catalog_version()
+        return result
+
     def __str__(self) -> str:
         return self.name
 
@@ -40,6 +56,7 @@ class Book(models.Model):
         related_name="books",
     )
     cover = models.FileField(_("封面"), upload_to="covers/", null=True, blank=True)
+    cover_variants = models.JSONField(_("封面缩略图"), null=True, blank=True)
     total_copies = models.PositiveIntegerField(_("总数量"), default=1)
     available_copies = models.PositiveIntegerField(_("可借数量"), default=1)
     location = models.CharField(_("书架位置"), max_length=100, blank=True)
@@ -58,6 +75,9 @@ class Book(models.Model):
                 name="book_available_lte_total",
             ),
         ]
+        indexes = [
+            models.Index(fields=["-updated_at", "-id"], name="book_updated_id_idx"),
+        ]
 
     @property
     def can_borrow(self) -> bool:
@@ -121,18 +141,54 @@ class Book(models.Model):
             self.total_copies = total_active
             self.available_copies = available
 
+    def _search_text(self) -> tuple[str, str, str]:
+        return (self.title, self.author, self.publisher)
+
+    def _sync_search_tokens(self) -> None:
+        BookSearchToken = apps.get_model("books", "BookSearchToken")
+
+        desired = book_search_tokens(title=self.title, author=self.author, publisher=self.publisher)
+        with transaction.atomic():
+            existing = set(
+                BookSearchToken.objects.filter(book_id=self.id).values_list("token", flat=True)
+            )
+            stale = existing - desired
+            if stale:
+                BookSearchToken.objects.filter(book_id=self.id, token__in=stale).delete()
+            missing = desired - existing
+            if missing:
+                BookSearchToken.objects.bulk_create(
+                    [BookSearchToken(book_id=self.id, token=token) for token in missing],
+                    ignore_conflicts=True,
+                )
+
     def save(self, *args, **kwargs):  # type: ignore[override]
         creating = self.pk is None
-        previous_total = None
+        previous = None
         if not creating:
-            previous_total = (
-                type(self).objects.filter(pk=self.pk).values_list("total_copies", flat=True).first()
+            previous = (
+                type(self)
+                .objects.filter(pk=self.pk)
+                .values_list("total_copies", "title", "author", "publisher")
+                .first()
             )
 
         super().save(*args, **kwargs)
 
-        if creating or (previous_total is not None and previous_total != self.total_copies):
+        if creating or (previous is not None and previous[0] != self.total_copies):
             self._sync_copies_and_inventory()
+        if creating or previous is None or tuple(previous[1:]) != self._search_text():
+            self._sync_search_tokens()
+        bump_catalog_version()
+
+    def delete(self, *args, **kwargs):  # type: ignore[override]
+        cover_name = self.cover.name if self.cover else None
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            if cover_name:
+                CoverBlob.release(cover_name, variants=self.cover_variants)
+        bump_catalog_version()
+        return result
 
     def __str__(self) -> str:
         return f"{self.title} ({self.isbn})"
@@ -170,3 +226,160 @@ class BookCopy(models.Model):
 
     def __str__(self) -> str:
         return f"{self.book_id}#{self.code}"
+
+
+class BookSearchToken(models.Model):
+    book = models.ForeignKey(
+        Book,
+        verbose_name=_("图书"),
+        on_delete=models.CASCADE,
+        related_name="search_tokens",
+    )
+    token = models.CharField(_("检索词"), max_length=64)
+
+    class Meta:
+        verbose_name = _("检索词")
+        verbose_name_plural = _("检索词")
+        constraints = [
+            models.UniqueConstraint(
+                fields=["token", "book"],
+                name="booksearchtoken_unique_token_book",
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.token} -> {self.book_id}"
+
+
+class CoverBlob(models.Model):
+    """
+    封面文件（按内容哈希命名）及其引用计数。引用归零后不立即删除文件，
+    由 gc_covers 命令在宽限期后清理。sha256 为空表示改造前上传的旧文件。
+    """
+
+    name = models.CharField(_("存储路径"), max_length=255, unique=True)
+    sha256 = models.CharField(_("SHA-256"), max_length=64, unique=True, null=True, blank=True)
+    variants = models.JSONField(_("缩略图"), null=True, blank=True)
+    size = models.PositiveBigIntegerField(_("文件大小"), default=0)
+    ref_count = models.PositiveIntegerField(_("引用数"), default=0)
+    released_at = models.DateTimeField(_("引用归零时间"), null=True, blank=True, db_index=True)
+    created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("更新时间"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("封面文件")
+        verbose_name_plural = _("封面文件")
+
+    @staticmethod
+    def storage():
+        return Book._meta.get_field("cover").storage
+
+    @classmethod
+    def acquire(cls, blob_id: int) -> bool:
+        updated = cls.objects.filter(pk=blob_id).update(
+            ref_count=F("ref_count") + 1, released_at=None, updated_at=timezone.now()
+        )
+        return updated > 0
+
+    @classmethod
+    def release(cls, name: str, *, variants=None) -> None:
+        """
+        引用数减一，归零时记录时间。没有记录的旧文件补建一条引用数为 0 的记录，
+        交给 gc_covers 统一清理。
+        """
+
+        if not name:
+            return
+        now = timezone.now()
+        with transaction.atomic():
+            blob, created = cls.objects.get_or_create(
+                name=name,
+                defaults={"variants": variants or None, "released_at": now},
+            )
+            if created:
+                return
+            cls.objects.filter(pk=blob.pk, ref_count__gt=0).update(
+                ref_count=F("ref_count") - 1, updated_at=now
+            )
+            cls.objects.filter(pk=blob.pk, ref_count=0, released_at__isnull=True).update(
+                released_at=now
+            )
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class BookImportJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", _("排队中")
+        RUNNING = "running", _("导入中")
+        SUCCEEDED = "succeeded", _("已完成")
+        FAILED = "failed", _("失败")
+
+    file = models.FileField(_("CSV 文件"), upload_to="imports/%Y%m%d/", null=True, blank=True)
+    source_path = models.CharField(_("本地文件路径"), max_length=500, blank=True)
+    original_name = models.CharField(_("原文件名"), max_length=255, blank=True)
+    input_format = models.CharField(_("文件格式"), max_length=20, default="csv")
+    dry_run = models.BooleanField(_("试运行"), default=False)
+    atomic = models.BooleanField(_("原子导入"), default=False)
+    chunk_atomic = models.BooleanField(_("分批原子导入"), default=False)
+    snapshot = models.BooleanField(_("快照比对"), default=False)
+    status = models.CharField(
+        _("状态"), max_length=20, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name=_("提交人"),
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="book_import_jobs",
+    )
+    rows_processed = models.PositiveIntegerField(_("已处理行数"), default=0)
+    created_count = models.PositiveIntegerField(_("新增"), default=0)
+    updated_count = models.PositiveIntegerField(_("更新"), default=0)
+    skipped_count = models.PositiveIntegerField(_("跳过"), default=0)
+    errors = models.JSONField(_("错误"), default=list, blank=True)
+    applied = models.BooleanField(_("已写入"), default=False)
+    field_changes = models.JSONField(_("字段变更统计"), null=True, blank=True)
+    checkpoint_row = models.PositiveIntegerField(_("断点行号"), default=0)
+    checkpoint_offset = models.PositiveBigIntegerField(_("断点字节偏移"), default=0)
+    message = models.TextField(_("失败原因"), blank=True)
+    started_at = models.DateTimeField(_("开始时间"), null=True, blank=True)
+    # 执行中的 worker 定期刷新；超过租约仍未刷新的 running 任务视为 worker 已退出，可被重新认领
+    heartbeat_at = models.DateTimeField(_("心跳时间"), null=True, blank=True)
+    finished_at = models.DateTimeField(_("结束时间"), null=True, blank=True)
+    created_at = models.DateTimeField(_("创建时间"), auto_now_add=True)
+    updated_at = models.DateTimeField(_("更新时间"), auto_now=True)
+
+    class Meta:
+        verbose_name = _("图书导入任务")
+        verbose_name_plural = _("图书导入任务")
+        ordering = ["-id"]
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.Status.SUCCEEDED, self.Status.FAILED)
+
+    def __str__(self) -> str:
+        return f"import#{self.id} ({self.status})"
+
+
+class BookDeletion(models.Model):
+    """已删除图书的墓碑记录，供各进程的搜索联想索引增量清理（删除不会留下 updated_at）。"""
+
+    book_id = models.BigIntegerField(_("图书 ID"))
+    deleted_at = models.DateTimeField(_("删除时间"), default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = _("图书删除记录")
+        verbose_name_plural = _("图书删除记录")
+
+    def __str__(self) -> str:
+        return f"{self.book_id} @ {self.deleted_at:%Y-%m-%d %H:%M:%S}"
+
+
+@receiver(post_delete, sender=Book)
+def _record_book_deletion(sender, instance, **kwargs) -> None:
+    # QuerySet.delete / 后台批量删除也会逐条发出 post_delete
+    BookDeletion.objects.create(book_id=instance.pk)
@@ -0,0 +1,149 @@
+import base64
+import json
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import connections, models
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+DEFAULT_PAGE_LIMIT = 20
+MAX_PAGE_LIMIT = 100
+
+
+class CursorError(ValueError):
+    pass
+
+
+def wants_keyset_page(params) -> bool:
+    return "limit" in params or "cursor" in params
+
+
+def parse_limit(value, *, default: int = DEFAULT_PAGE_LIMIT, maximum: int = MAX_PAGE_LIMIT) -> int:
+    raw = str(value or "").strip()
+    if raw == "":
+        return default
+    try:
+        limit = int(raw)
+    except ValueError as exc:
+        raise CursorError("limit 必须是整数") from exc
+    if limit <= 0:
+        raise CursorError("limit 必须大于 0")
+    return min(limit, maximum)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _tagged(value, tag: str, parse):
+    if not isinstance(value, dict) or set(value) != {tag} or not isinstance(value[tag], str):
+        return None
+    try:
+        return parse(value[tag])
+    except ValueError:
+        return None
+
+
+def _decode_value(value, field):
+    """按排序列的模型字段校验游标里的值，类型不符一律视为无效游标（而不是进到查询里报 500）。"""
+
+    if isinstance(field, models.DateTimeField):
+        parsed = _tagged(value, "dt", parse_datetime)
+        if parsed is None or (settings.USE_TZ and timezone.is_naive(parsed)):
+            raise CursorError("cursor 无效")
+        return parsed
+    if isinstance(field, models.DateField):
+        parsed = _tagged(value, "d", parse_date)
+        if parsed is None:
+            raise CursorError("cursor 无效")
+        return parsed
+    if isinstance(field, models.IntegerField):
+        if isinstance(value, bool) or not isinstance(value, int) or not -(2**63) <= value < 2**63:
+            raise CursorError("cursor 无效")
+        return value
+    if not isinstance(value, str):
+        raise CursorError("cursor 无效")
+    return value
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, *, model_fields: list) -> list:
+    token = (token or "").strip()
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+    except (ValueError, UnicodeError) as exc:
+        raise CursorError("cursor 无效") from exc
+    if not isinstance(values, list) or len(values) != len(model_fields):
+        raise CursorError("cursor 无效")
+    return [_decode_value(v, field) for v, field in zip(values, model_fields)]
+
+
+def _after_filter(fields: list[str], values: list) -> Q:
+    """
+    生成 (f1, f2, ...) 在降序排序下严格位于 values 之后的条件：
+    f1 < v1 OR (f1 = v1 AND f2 < v2) OR ...
+    """
+
+    condition = Q()
+    for i, field in enumerate(fields):
+        clause = Q(**{f"{field}__lt": values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            clause &= Q(**{prev_field: prev_value})
+        condition |= clause
+    return condition
+
+
+def keyset_page(qs, *, fields: list[str], limit: int, cursor: str | None = None):
+    """
+    按 fields 降序做游标分页（fields 最后一列须唯一，例如 id）。
+    qs 可以是模型 queryset，也可以是包含 fields 各列的 values() queryset。
+    多取一行用于判断是否还有下一页，不做 COUNT/OFFSET，耗时与表规模无关。
+
+    返回 (rows, next_cursor)。
+    """
+
+    if cursor:
+        model_fields = [qs.model._meta.get_field(f) for f in fields]
+        qs = qs.filter(_after_filter(fields, decode_cursor(cursor, model_fields=model_fields)))
+
+    rows = list(qs.order_by(*[f"-{f}" for f in fields])[: limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if isinstance(last, dict):
+            next_cursor = encode_cursor([last[f] for f in fields])
+        else:
+            next_cursor = encode_cursor([getattr(last, f) for f in fields])
+    return rows, next_cursor
+
+
+def estimate_count(qs) -> int:
+    """
+    估算结果总数：PostgreSQL 上无过滤条件时读取 pg_class.reltuples（O(1)），
+    其余情况退回 COUNT(*)。
+    """
+
+    connection = connections[qs.db]
+    if connection.vendor == "postgresql" and not qs.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [qs.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] is not None and row[0] >= 0:
+            return int(row[0])
+    return qs.count()
@@ -0,0 +1,4 @@
+def is_admin(user) -> bool:
+    if not user.is_authenticated:
+        return False
+    return getattr(user, "role", None) == "admin" or user.is_staff or user.is_superuser
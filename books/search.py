@@ -0,0 +1,196 @@
+from django.apps import apps
+from django.db import connections
+from django.db.models import BooleanField, Count, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .search_tokens import query_cjk_tokens, query_non_cjk_words, query_pinyin_tokens
+
+
+SEARCH_FIELDS = ("title", "author", "isbn", "publisher")
+
+SQLITE_FTS_TABLE = "books_book_fts"
+# trigram 分词器要求查询串至少 3 个字符
+SQLITE_FTS_MIN_QUERY_LENGTH = 3
+
+POSTGRES_SEARCH_DOCUMENT = (
+    "to_tsvector('simple', coalesce(books_book.title, '') || ' ' || coalesce(books_book.author, '')"
+    " || ' ' || coalesce(books_book.isbn, '') || ' ' || coalesce(books_book.publisher, ''))"
+)
+
+
+def _icontains_condition(kw: str) -> Q:
+    condition = Q()
+    for field in SEARCH_FIELDS:
+        condition |= Q(**{f"{field}__icontains": kw})
+    return condition
+
+
+def _token_book_ids(tokens: set[str], *, match_all: bool):
+    BookSearchToken = apps.get_model("books", "BookSearchToken")
+    qs = BookSearchToken.objects.filter(token__in=tokens)
+    if match_all and len(tokens) > 1:
+        return (
+            qs.values("book_id")
+            .annotate(matched=Count("token", distinct=True))
+            .filter(matched=len(tokens))
+            .values("book_id")
+        )
+    return qs.values("book_id")
+
+
+class BookSearchBackend:
+    """
+    关键字检索后端：search() 返回过滤后的 queryset，并附带 search_rank 注解
+    （越小越相关），rank=True 时按相关度排序。
+
+    含汉字的查询走 BookSearchToken 倒排表（bigram，全部命中）；纯字母查询在
+    全文条件之外，再合并拼音首字母/全拼前缀的命中。
+    """
+
+    name = "basic"
+
+    def search(self, qs, kw: str, *, rank: bool = False):
+        kw = (kw or "").strip()
+        if not kw:
+            return qs
+
+        cjk_tokens = query_cjk_tokens(kw)
+        if cjk_tokens:
+            condition = Q(id__in=_token_book_ids(cjk_tokens, match_all=True))
+            for word in query_non_cjk_words(kw):
+                condition &= _icontains_condition(word)
+            search_rank = Value(0.0, output_field=FloatField())
+        else:
+            condition = self._text_condition(kw)
+            pinyin_tokens = query_pinyin_tokens(kw)
+            if pinyin_tokens:
+                condition |= Q(id__in=_token_book_ids(pinyin_tokens, match_all=False))
+            search_rank = self._text_rank(kw)
+
+        qs = qs.filter(condition).annotate(search_rank=search_rank)
+        if rank:
+            qs = qs.order_by("search_rank", "-updated_at", "-id")
+        return qs
+
+    def _text_condition(self, kw: str) -> Q:
+        return _icontains_condition(kw)
+
+    def _text_rank(self, kw: str):
+        return Value(0.0, output_field=FloatField())
+
+
+class SqliteFtsSearchBackend(BookSearchBackend):
+    """
+    SQLite FTS5（trigram 分词）外部内容表，由 books_book 上的触发器保持同步，
+    MATCH 语义等同于各字段上的不区分大小写子串匹配。
+    """
+
+    name = "sqlite_fts5"
+
+    def __init__(self, *, materialized_cte: bool = True):
+        # WITH ... AS MATERIALIZED 需要 SQLite 3.35+
+        self.materialized_cte = materialized_cte
+
+    @staticmethod
+    def _match(kw: str) -> str:
+        return '"' + kw.replace('"', '""') + '"'
+
+    def _text_condition(self, kw: str) -> Q:
+        if len(kw) < SQLITE_FTS_MIN_QUERY_LENGTH:
+            return super()._text_condition(kw)
+        return Q(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s",
+                [self._match(kw)],
+            )
+        )
+
+    def _text_rank(self, kw: str):
+        if len(kw) < SQLITE_FTS_MIN_QUERY_LENGTH or not self.materialized_cte:
+            return super()._text_rank(kw)
+        # 命中集合物化一次（连同 bm25），每行按 rowid 查临时索引；
+        # 直接写成 MATCH ... AND rowid = books_book.id 的相关子查询会对每一行重跑一遍全文检索
+        return Coalesce(
+            RawSQL(
+                f"WITH hits AS MATERIALIZED (SELECT rowid, bm25({SQLITE_FTS_TABLE}) AS score "
+                f"FROM {SQLITE_FTS_TABLE} WHERE {SQLITE_FTS_TABLE} MATCH %s) "
+                "SELECT score FROM hits WHERE hits.rowid = books_book.id",
+                [self._match(kw)],
+                output_field=FloatField(),
+            ),
+            Value(0.0, output_field=FloatField()),
+        )
+
+
+class PostgresFtsSearchBackend(BookSearchBackend):
+    """
+    PostgreSQL tsvector 表达式索引（GIN），每个词按前缀匹配，可跨字段组合多个词。
+
+    tsquery 会丢掉标点，simple 配置也不切分中日韩文字，因此始终并上各字段的
+    icontains 子串条件（由 pg_trgm 的 GIN 索引支撑），保持与其它后端一致的子串语义；
+    无法构成 tsquery 的查询（只有标点等）只走子串条件。
+    """
+
+    name = "postgres_fts"
+
+    @staticmethod
+    def _tsquery(kw: str) -> str:
+        terms = ["".join(ch for ch in part if ch.isalnum()) for part in kw.split()]
+        return " & ".join(f"{t}:*" for t in terms if t)
+
+    def _text_condition(self, kw: str) -> Q:
+        condition = super()._text_condition(kw)
+        tsquery = self._tsquery(kw)
+        if not tsquery:
+            return condition
+        return condition | Q(
+            RawSQL(
+                f"{POSTGRES_SEARCH_DOCUMENT} @@ to_tsquery('simple', %s)",
+                [tsquery],
+                output_field=BooleanField(),
+            )
+        )
+
+    def _text_rank(self, kw: str):
+        tsquery = self._tsquery(kw)
+        if not tsquery:
+            return super()._text_rank(kw)
+        return RawSQL(
+            f"-ts_rank({POSTGRES_SEARCH_DOCUMENT}, to_tsquery('simple', %s))",
+            [tsquery],
+            output_field=FloatField(),
+        )
+
+
+_backend_cache: dict[str, BookSearchBackend] = {}
+
+
+def _sqlite_fts_available(connection) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [SQLITE_FTS_TABLE],
+        )
+        return cursor.fetchone() is not None
+
+
+def get_search_backend(using: str = "default") -> BookSearchBackend:
+    backend = _backend_cache.get(using)
+    if backend is not None:
+        return backend
+
+    connection = connections[using]
+    if connection.vendor == "sqlite" and _sqlite_fts_available(connection):
+        backend = SqliteFtsSearchBackend(materialized_cte=connection.Database.sqlite_version_info >= (3, 35, 0))
+    elif connection.vendor == "postgresql":
+        backend = PostgresFtsSearchBackend()
+    else:
+        backend = BookSearchBackend()
+
+    _backend_cache[using] = backend
+    return backend
+
+
+def search_books(qs, kw: str, *, rank: bool = False):
+    return get_search_backend(qs.db).search(qs, kw, rank=rank)
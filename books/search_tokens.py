@@ -0,0 +1,126 @@
+"""
+图书检索分词：中文按单字 + 二元组（bigram）切分，并生成拼音全拼/首字母前缀，
+写入 BookSearchToken 倒排表，用于 kw 检索（例如 "st" / "santi" → 三体）。
+首字母把标题与作者的音节接成一串，"stl" 可命中刘慈欣的《三体》。
+
+拼音依赖 pypinyin（可选），未安装时只生成中文 n-gram。
+"""
+
+import re
+import unicodedata
+
+try:
+    from pypinyin import lazy_pinyin
+except Exception:  # pragma: no cover
+    lazy_pinyin = None
+
+
+CJK_PREFIX = "c:"
+INITIALS_PREFIX = "i:"
+PINYIN_PREFIX = "p:"
+
+INDEXED_FIELDS = ("title", "author", "publisher")
+PINYIN_FIELDS = ("title", "author")
+
+MAX_INITIALS_LENGTH = 8
+MAX_PINYIN_SYLLABLES = 4
+MIN_PINYIN_QUERY_LENGTH = 2
+TOKEN_MAX_LENGTH = 64
+
+_CJK_RUN_RE = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD_RE = re.compile(r"[0-9a-z]+")
+_PINYIN_QUERY_RE = re.compile(r"^[a-z]+$")
+
+
+def _normalize(text) -> str:
+    return unicodedata.normalize("NFKC", str(text or "")).lower()
+
+
+def _cjk_grams(run: str) -> set[str]:
+    grams = set(run)
+    grams.update(run[i : i + 2] for i in range(len(run) - 1))
+    return grams
+
+
+def _syllables(chars: str) -> list[str]:
+    if lazy_pinyin is None or not chars:
+        return []
+    return [s for s in lazy_pinyin(chars) if s.isalpha()]
+
+
+def _initials_tokens(syllables: list[str]) -> set[str]:
+    """每个音节取首字母，连续 2..MAX_INITIALS_LENGTH 个音节的首字母串各为一个词。"""
+
+    initials = "".join(s[0] for s in syllables)
+    return {
+        INITIALS_PREFIX + initials[start:end]
+        for start in range(len(initials))
+        for end in range(start + MIN_PINYIN_QUERY_LENGTH, min(start + MAX_INITIALS_LENGTH, len(initials)) + 1)
+    }
+
+
+def _spelled_tokens(syllables: list[str]) -> set[str]:
+    tokens: set[str] = set()
+    for start in range(len(syllables)):
+        spelled = "".join(syllables[start : start + MAX_PINYIN_SYLLABLES])
+        for end in range(MIN_PINYIN_QUERY_LENGTH, len(spelled) + 1):
+            tokens.add(PINYIN_PREFIX + spelled[:end])
+    return tokens
+
+
+def pinyin_keys(text) -> list[str]:
+    """整段文字的拼音全拼与首字母（用于联想前缀匹配），无汉字或未安装 pypinyin 时为空。"""
+
+    chars = "".join(_CJK_RUN_RE.findall(_normalize(text)))
+    syllables = _syllables(chars)
+    if not syllables:
+        return []
+    return ["".join(syllables), "".join(s[0] for s in syllables)]
+
+
+def book_search_tokens(*, title="", author="", publisher="") -> set[str]:
+    values = {"title": title, "author": author, "publisher": publisher}
+    tokens: set[str] = set()
+    syllables: list[str] = []
+    for field in INDEXED_FIELDS:
+        text = _normalize(values[field])
+        runs = _CJK_RUN_RE.findall(text)
+        for run in runs:
+            tokens.update(CJK_PREFIX + gram for gram in _cjk_grams(run))
+        if field in PINYIN_FIELDS:
+            # 忽略标点/空格，把同一字段内的汉字视为连续序列（"三体·黑暗森林" → sthasl）
+            field_syllables = _syllables("".join(runs))
+            tokens |= _spelled_tokens(field_syllables)
+            syllables += field_syllables
+    # 首字母按 标题 + 作者 连成一串：既含各字段内的缩写，也含 "stl"（三体 + 刘慈欣）这类跨字段缩写
+    tokens |= _initials_tokens(syllables)
+    return {t for t in tokens if len(t) <= TOKEN_MAX_LENGTH}
+
+
+def query_cjk_tokens(kw: str) -> set[str]:
+    """查询中的汉字部分：单字查单字，多字查全部 bigram（AND）。"""
+
+    tokens: set[str] = set()
+    for run in _CJK_RUN_RE.findall(_normalize(kw)):
+        if len(run) == 1:
+            tokens.add(CJK_PREFIX + run)
+        else:
+            tokens.update(CJK_PREFIX + run[i : i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def query_non_cjk_words(kw: str) -> list[str]:
+    return _WORD_RE.findall(_CJK_RUN_RE.sub(" ", _normalize(kw)))
+
+
+def query_pinyin_tokens(kw: str) -> set[str]:
+    """纯字母查询按拼音首字母/全拼前缀匹配（任一命中即可）。"""
+
+    text = _normalize(kw).replace(" ", "")
+    if len(text) < MIN_PINYIN_QUERY_LENGTH or not _PINYIN_QUERY_RE.match(text):
+        return set()
+
+    tokens = {PINYIN_PREFIX + text}
+    if len(text) <= MAX_INITIALS_LENGTH:
+        tokens.add(INITIALS_PREFIX + text)
+    return {t for t in tokens if len(t) <= TOKEN_MAX_LENGTH}
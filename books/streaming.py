@@ -0,0 +1,115 @@
+"""
+列表接口的 JSON 输出：结果较少时返回普通 JsonResponse；超过阈值时改用
+StreamingHttpResponse 边读边写（配合 QuerySet.iterator），内存占用与结果集
+大小无关，首字节也无需等待最后一行。
+
+流式输出时 count 写在 results 之后（JSON 对象键顺序不影响解析）。
+
+CSV 导出同样流式输出，客户端支持时按 gzip 压缩传输。
+"""
+
+import csv
+import json
+import re
+from itertools import chain, islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+
+
+DEFAULT_STREAM_THRESHOLD = 200
+ITERATOR_CHUNK_SIZE = 500
+ROWS_PER_WRITE = 100
+
+
+def _stream_threshold() -> int:
+    return int(getattr(settings, "JSON_STREAM_THRESHOLD", DEFAULT_STREAM_THRESHOLD))
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def _stream(envelope: dict, rows, *, serialize, rows_key: str, count_key: str):
+    head = _dumps(envelope)[:-1]
+    yield (head + ", " if envelope else "{") + _dumps(rows_key) + ": ["
+
+    count = 0
+    buffer: list[str] = []
+    for row in rows:
+        buffer.append(_dumps(serialize(row)))
+        count += 1
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield ("" if count == len(buffer) else ", ") + ", ".join(buffer)
+            buffer = []
+    if buffer:
+        yield ("" if count == len(buffer) else ", ") + ", ".join(buffer)
+
+    yield "], " + _dumps(count_key) + ": " + _dumps(count) + "}"
+
+
+def json_list_response(envelope: dict, rows, *, serialize=None, rows_key="results", count_key="count"):
+    """
+    rows 为可迭代对象（通常是 qs.iterator(chunk_size=ITERATOR_CHUNK_SIZE)），只遍历一次。
+    先读取阈值 + 1 行：不超过阈值则整体返回 JsonResponse，否则流式输出。
+    """
+
+    if serialize is None:
+        serialize = lambda row: row  # noqa: E731
+
+    rows = iter(rows)
+    threshold = _stream_threshold()
+    head = list(islice(rows, threshold + 1))
+    if len(head) <= threshold:
+        results = [serialize(row) for row in head]
+        payload = {**envelope, count_key: len(results), rows_key: results}
+        return JsonResponse(payload, json_dumps_params={"ensure_ascii": False})
+
+    return StreamingHttpResponse(
+        _stream(envelope, chain(head, rows), serialize=serialize, rows_key=rows_key, count_key=count_key),
+        content_type="application/json",
+    )
+
+
+class _Echo:
+    """csv.writer 的伪缓冲区：write 直接返回格式化好的行，不做任何缓存。"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(columns, rows, *, bom: bool = True):
+    """把 dict 行逐批格式化为 CSV 文本片段；rows 只遍历一次。"""
+
+    writer = csv.DictWriter(_Echo(), fieldnames=columns, lineterminator="\n")
+    yield ("\ufeff" if bom else "") + writer.writeheader()
+
+    buffer: list[str] = []
+    for row in rows:
+        buffer.append(writer.writerow(row))
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+def csv_streaming_response(request, chunks, *, filename: str) -> StreamingHttpResponse:
+    """以附件形式流式返回 CSV；请求头 Accept-Encoding 含 gzip 时边生成边压缩。"""
+
+    content = (chunk.encode("utf-8") for chunk in chunks)
+    gzipped = bool(_accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")))
+    response = StreamingHttpResponse(
+        compress_sequence(content) if gzipped else content, content_type="text/csv; charset=utf-8"
+    )
+    if gzipped:
+        response["Content-Encoding"] = "gzip"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,241 @@
+"""
+搜索框联想：进程内前缀索引。
+
+索引为按 key 排序的扁平数组（等价于压平的 trie），前缀查询用二分定位区间，
+只读取前 N 条候选。全量构建在后台线程中进行（进程启动时或到期重建时），请求不会等待；
+之后按 updated_at 水位增量同步；删除不会留下 updated_at，按 BookDeletion 墓碑记录增量清理
+（含其它进程中的删除）。
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.db import connections
+from django.utils import timezone
+
+from .models import Book, BookDeletion
+from .search_tokens import pinyin_keys
+
+
+DEFAULT_SUGGEST_LIMIT = 8
+MAX_SUGGEST_LIMIT = 20
+SYNC_INTERVAL_SECONDS = 5
+FULL_REBUILD_SECONDS = 10 * 60
+# 墓碑按 deleted_at 往回多读这么久：时间戳在插入时确定，删除事务可能稍后才提交
+DELETION_OVERLAP_SECONDS = 60
+# 墓碑只在增量同步期间有用，全量构建时清掉更早的记录
+DELETION_RETENTION = timedelta(days=1)
+
+KIND_TITLE = "title"
+KIND_AUTHOR = "author"
+KIND_ISBN = "isbn"
+
+
+def _normalize(text) -> str:
+    return " ".join(str(text or "").lower().split())
+
+
+def _entry_keys(book_id: int, title: str, author: str, isbn: str):
+    for kind, text in ((KIND_TITLE, title), (KIND_AUTHOR, author), (KIND_ISBN, isbn)):
+        key = _normalize(text)
+        if key:
+            yield (key, kind, book_id)
+        if kind != KIND_ISBN:
+            for alias in pinyin_keys(text):
+                if alias != key:
+                    yield (alias, kind, book_id)
+
+
+class BookSuggestIndex:
+    def __init__(self):
+        self._keys: list[tuple[str, str, int]] = []
+        self._books: dict[int, tuple[str, str, str, str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def build(self, rows) -> None:
+        books = {}
+        keys = []
+        for book_id, title, author, isbn, status in rows:
+            books[book_id] = (title, author, isbn, status)
+            keys.extend(_entry_keys(book_id, title, author, isbn))
+        keys.sort()
+        with self._lock:
+            self._books = books
+            self._keys = keys
+
+    def _remove_locked(self, book_id: int) -> None:
+        previous = self._books.pop(book_id, None)
+        if previous is None:
+            return
+        title, author, isbn, _ = previous
+        for entry in _entry_keys(book_id, title, author, isbn):
+            pos = bisect_left(self._keys, entry)
+            if pos < len(self._keys) and self._keys[pos] == entry:
+                del self._keys[pos]
+
+    def upsert(self, book_id: int, title: str, author: str, isbn: str, status: str) -> None:
+        with self._lock:
+            self._remove_locked(book_id)
+            self._books[book_id] = (title, author, isbn, status)
+            for entry in _entry_keys(book_id, title, author, isbn):
+                insort(self._keys, entry)
+
+    def remove(self, book_id: int) -> None:
+        with self._lock:
+            self._remove_locked(book_id)
+
+    def lookup(self, prefix: str, *, limit: int = DEFAULT_SUGGEST_LIMIT, statuses=None) -> list[dict]:
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+
+        results: list[dict] = []
+        seen: set[tuple[str, str]] = set()
+        with self._lock:
+            pos = bisect_left(self._keys, (prefix,))
+            while pos < len(self._keys) and len(results) < limit:
+                key, kind, book_id = self._keys[pos]
+                pos += 1
+                if not key.startswith(prefix):
+                    break
+
+                title, author, isbn, status = self._books[book_id]
+                if statuses is not None and status not in statuses:
+                    continue
+                text = {KIND_TITLE: title, KIND_AUTHOR: author, KIND_ISBN: isbn}[kind]
+                if (kind, text) in seen:
+                    continue
+                seen.add((kind, text))
+                results.append({"text": text, "type": kind, "book_id": book_id})
+        return results
+
+
+_index = BookSuggestIndex()
+# 只在持有 _sync_lock 时读写；building 为正在构建的进程号（预加载后 fork 出的子进程不会继承构建线程）
+_state = {"built_at": None, "synced_at": None, "watermark": None, "deleted_since": None, "building": None}
+_sync_lock = threading.Lock()
+
+
+def _book_rows(qs):
+    return qs.values_list("id", "title", "author", "isbn", "status", "updated_at").iterator(
+        chunk_size=2000
+    )
+
+
+def build_suggest_index() -> None:
+    """
+    同步全量构建。先记下时间再读全表，构建期间发生的删除会在下一次同步时按墓碑清理；
+    读表不持有 _sync_lock，期间的单本更新与联想查询照常进行。
+    """
+
+    deleted_since = timezone.now()
+    BookDeletion.objects.filter(deleted_at__lt=deleted_since - DELETION_RETENTION).delete()
+    watermark = None
+    rows = []
+    for book_id, title, author, isbn, status, updated_at in _book_rows(Book.objects.all()):
+        rows.append((book_id, title, author, isbn, status))
+        if watermark is None or updated_at > watermark:
+            watermark = updated_at
+    _index.build(rows)
+    now = time.monotonic()
+    with _sync_lock:
+        _state.update(
+            built_at=now, synced_at=now, watermark=watermark, deleted_since=deleted_since, building=None
+        )
+
+
+def _build_in_background() -> None:
+    try:
+        build_suggest_index()
+    except Exception:
+        # 下一次请求再重试
+        with _sync_lock:
+            _state["building"] = None
+    finally:
+        # 线程自己的数据库连接
+        connections.close_all()
+
+
+def _claim_build_locked() -> bool:
+    pid = os.getpid()
+    if _state["building"] == pid:
+        return False
+    _state["building"] = pid
+    return True
+
+
+def _spawn_build() -> None:
+    threading.Thread(target=_build_in_background, name="book-suggest-build", daemon=True).start()
+
+
+def start_suggest_index() -> None:
+    """在后台线程中全量构建（进程启动时调用）；已有构建在进行时不重复启动。"""
+
+    with _sync_lock:
+        claimed = _claim_build_locked()
+    if claimed:
+        _spawn_build()
+
+
+def _sync_changes_locked(now: float) -> None:
+    deleted_since = timezone.now()
+    qs = Book.objects.all()
+    watermark = _state["watermark"]
+    if watermark is not None:
+        # >= 而非 >：同一时间戳上可能有尚未看到的写入，重复 upsert 无副作用
+        qs = qs.filter(updated_at__gte=watermark)
+    for book_id, title, author, isbn, status, updated_at in _book_rows(qs.order_by("updated_at")):
+        _index.upsert(book_id, title, author, isbn, status)
+        if watermark is None or updated_at > watermark:
+            watermark = updated_at
+
+    since = _state["deleted_since"] - timedelta(seconds=DELETION_OVERLAP_SECONDS)
+    for book_id in BookDeletion.objects.filter(deleted_at__gte=since).values_list("book_id", flat=True):
+        _index.remove(book_id)
+    _state.update(synced_at=now, watermark=watermark, deleted_since=deleted_since)
+
+
+def get_suggest_index() -> BookSuggestIndex:
+    """
+    返回当前索引，不在请求中全量构建：尚未构建或到期重建时交给后台线程，
+    完成前沿用现有索引（首次为空）。另一个请求正在同步时直接返回，不排队等待。
+    """
+
+    if not _sync_lock.acquire(blocking=False):
+        return _index
+    spawn = False
+    try:
+        now = time.monotonic()
+        built_at = _state["built_at"]
+        if built_at is None or now - built_at >= FULL_REBUILD_SECONDS:
+            spawn = _claim_build_locked()
+        elif now - _state["synced_at"] >= SYNC_INTERVAL_SECONDS:
+            _sync_changes_locked(now)
+    finally:
+        _sync_lock.release()
+    if spawn:
+        _spawn_build()
+    return _index
+
+
+def refresh_book(book: Book) -> None:
+    with _sync_lock:
+        built = _state["built_at"] is not None
+    if built:
+        _index.upsert(book.id, book.title, book.author, book.isbn, book.status)
+
+
+def forget_book(book_id: int) -> None:
+    _index.remove(book_id)
+
+
+def reset_suggest_index() -> None:
+    with _sync_lock:
+        _index.build([])
+        _state.update(built_at=None, synced_at=None, watermark=None, deleted_since=None, building=None)
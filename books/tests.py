@@ -3,7 +3,7 @@ import io
 from datetime import timedelta
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
 
 from books.admin_csv import import_books_from_csv
@@ -100,6 +100,61 @@ class BookCsvImportTests(TestCase):
         self.assertEqual(book.total_copies, 6)
         self.assertEqual(book.available_copies, 4)
 
+    def test_import_chunk_keeps_borrows_committed_while_it_runs(self):
+        from books.admin_csv import _ImportChunk, _prepare_records
+
+        User = get_user_model()
+        user = User.objects.create_user(username="chunk_user", password="pass12345")
+        kept = Book.objects.create(title="Kept", author="Author", isbn="ISBN-CHUNK-1", total_copies=3)
+        grown = Book.objects.create(title="Grown", author="Author", isbn="ISBN-CHUNK-2", total_copies=3)
+        rows = [
+            (2, {"isbn": "ISBN-CHUNK-1", "title": "Kept 2"}),
+            (3, {"isbn": "ISBN-CHUNK-2", "total_copies": "4"}),
+        ]
+        chunk = _ImportChunk(rows, _prepare_records([row for _idx, row in rows]), dry_run=False)
+
+        # 预取之后、写库之前各借出一本
+        for book in (kept, grown):
+            Borrow.objects.create(
+                user=user, book=book, copy=book.copies.get(copy_no=1), due_date=timezone.localdate() + timedelta(days=7)
+            )
+        errors, counts = [], {"created": 0, "updated": 0, "skipped": 0}
+        chunk.process(errors, counts)
+        chunk.flush(errors, counts)
+
+        kept.refresh_from_db()
+        grown.refresh_from_db()
+        self.assertEqual((kept.title, kept.available_copies), ("Kept 2", 2))
+        self.assertEqual((grown.total_copies, grown.available_copies), (4, 3))
+
+    def test_rejected_shrink_leaves_every_field_of_the_row_unchanged(self):
+        from books.admin_csv import _ImportChunk, _prepare_records
+        from books.models import BookSearchToken
+
+        User = get_user_model()
+        user = User.objects.create_user(username="shrink_user", password="pass12345")
+        book = Book.objects.create(title="Original", author="Author", isbn="ISBN-SHRINK-1", total_copies=3)
+
+        rows = [(2, {"isbn": "ISBN-SHRINK-1", "title": "Changed", "location": "A-1", "total_copies": "1"})]
+        chunk = _ImportChunk(rows, _prepare_records([row for _idx, row in rows]), dry_run=False)
+        # 预取之后又借出两本，缩减到 1 已不够
+        for copy_no in (1, 2):
+            Borrow.objects.create(
+                user=user, book=book, copy=book.copies.get(copy_no=copy_no), due_date=timezone.localdate() + timedelta(days=7)
+            )
+        before = Book.objects.filter(pk=book.pk).values().get()
+        tokens = set(BookSearchToken.objects.filter(book=book).values_list("token", flat=True))
+        copies = list(book.copies.order_by("copy_no").values_list("copy_no", "is_active"))
+        errors, counts = [], {"created": 0, "updated": 0, "skipped": 0}
+        chunk.process(errors, counts)
+        chunk.flush(errors, counts)
+
+        self.assertEqual((counts["updated"], counts["skipped"]), (0, 1))
+        self.assertEqual([e.row for e in errors], [2])
+        self.assertEqual(Book.objects.filter(pk=book.pk).values().get(), before)
+        self.assertEqual(set(BookSearchToken.objects.filter(book=book).values_list("token", flat=True)), tokens)
+        self.assertEqual(list(book.copies.order_by("copy_no").values_list("copy_no", "is_active")), copies)
+
     def test_import_ignores_available_copies_on_create(self):
         csv_content = (
             "isbn,title,author,publisher,publish_date,description,category_name,total_copies,available_copies,location,status\n"
@@ -140,6 +195,146 @@ class BookCsvImportTests(TestCase):
         self.assertIn("status", msg)
         self.assertNotIn("{", msg)
 
+    def test_batched_import_query_count_does_not_grow_per_row(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        header = "isbn,title,author,publisher,publish_date,description,category_name,total_copies,available_copies,location,status\n"
+        from books.models import Category
+
+        Category.objects.create(name="Fiction")
+        Book.objects.create(title="Seed", author="Author", isbn="ISBN-BULK-SEED", total_copies=1, available_copies=1)
+
+        def run(prefix, n, seed_total):
+            rows = "".join(f"{prefix}-{i},Title {i},Author,,,,Fiction,2,,A-1,\n" for i in range(n))
+            with CaptureQueriesContext(connection) as ctx:
+                result = import_books_from_csv(io.StringIO(header + rows + f"ISBN-BULK-SEED,,,,,,,{seed_total},,,\n"))
+            self.assertFalse(result["has_errors"])
+            self.assertEqual(result["created"], n)
+            return len(ctx.captured_queries)
+
+        small = run("ISBN-BULK-A", 5, 2)
+        large = run("ISBN-BULK-B", 80, 3)
+        # 仅 bulk_create 按数据库参数上限分批会多出几条
+        self.assertLess(large, small + 5)
+        self.assertEqual(Book.objects.get(isbn="ISBN-BULK-B-79").copies.filter(is_active=True).count(), 2)
+
+    def test_batched_import_handles_repeats_and_shrinking(self):
+        book = Book.objects.create(
+            title="Old Title",
+            author="Author",
+            isbn="ISBN-BULK-0001",
+            total_copies=4,
+            available_copies=4,
+            status=Book.Status.ON_SHELF,
+        )
+
+        csv_content = (
+            "isbn,title,author,publisher,publish_date,description,category_name,total_copies,available_copies,location,status\n"
+            "ISBN-BULK-0001,新标题,,,,,,2,,,\n"
+            "ISBN-BULK-0001,,,,bad-date,,,,,,\n"
+            "ISBN-BULK-0002,Fresh,Author,,,,,1,,,\n"
+            "ISBN-BULK-0002,,,,,,,3,,,\n"
+        )
+        result = import_books_from_csv(io.StringIO(csv_content), batch_size=2)
+        self.assertEqual((result["created"], result["updated"], result["skipped"]), (1, 2, 1))
+        self.assertEqual([e["row"] for e in result["errors"]], [3])
+
+        book.refresh_from_db()
+        self.assertEqual((book.title, book.total_copies, book.available_copies), ("新标题", 2, 2))
+        self.assertIsNone(book.publish_date)
+        self.assertEqual(list(book.copies.filter(is_active=True).values_list("copy_no", flat=True)), [1, 2])
+        self.assertTrue(book.search_tokens.filter(token="c:标题").exists())
+
+        fresh = Book.objects.get(isbn="ISBN-BULK-0002")
+        self.assertEqual((fresh.total_copies, fresh.available_copies), (3, 3))
+        self.assertEqual(fresh.copies.filter(is_active=True).count(), 3)
+
+        dry = import_books_from_csv(io.StringIO(csv_content), dry_run=True)
+        self.assertEqual((dry["created"], dry["updated"], dry["skipped"]), (0, 1, 3))
+
+    def test_parallel_validation_matches_serial_result(self):
+        csv_content = (
+            "isbn,title,author,publisher,publish_date,description,category_name,total_copies,available_copies,location,status\n"
+            + "".join(f"ISBN-PAR-{i},Title {i},Author,,2020-01-0{i % 9 + 1},,,{i % 3},,,上架\n" for i in range(20))
+            + "ISBN-PAR-BAD1,,Author,,not-a-date,,,,,,\n"
+            + "ISBN-PAR-BAD2,Title,Author,,,,,x,,,\n"
+            + f"ISBN-PAR-BAD3,{'T' * 201},Author,,,,,,,,bad_status\n"
+        )
+        serial = import_books_from_csv(io.StringIO(csv_content), dry_run=True, batch_size=4)
+        parallel = import_books_from_csv(io.StringIO(csv_content), dry_run=True, batch_size=4, workers=2)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(
+            [e["message"].split(":")[0] for e in serial["errors"]], ["title", "total_copies", "status"]
+        )
+
+        result = import_books_from_csv(io.StringIO(csv_content), batch_size=4, workers=2)
+        self.assertEqual(result["created"], 20)
+        self.assertEqual(Book.objects.get(isbn="ISBN-PAR-4").publish_date.isoformat(), "2020-01-05")
+
+    def test_snapshot_dry_run_matches_and_skips_per_batch_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from books.models import Category
+
+        Category.objects.create(name="Old")
+        for i in range(6):
+            Book.objects.create(
+                title=f"Title {i}",
+                author="Author",
+                isbn=f"ISBN-SNAP-{i}",
+                description="简介" * 50,
+                category=Category.objects.get(name="Old"),
+                total_copies=2,
+                available_copies=2,
+            )
+
+        csv_content = (
+            "isbn,title,author,publisher,publish_date,description,category_name,total_copies,available_copies,location,status\n"
+            "ISBN-SNAP-0,New Title,,,,,,,,,\n"
+            "ISBN-SNAP-1,,,,,新的简介,New Cat,,,,\n"
+            f"ISBN-SNAP-2,,,,,{'简介' * 50},Old,2,,,\n"
+            "ISBN-SNAP-3,,,,,,,5,,,下架\n"
+            "ISBN-SNAP-4,,,,,,__CLEAR__,,,,\n"
+            "ISBN-SNAP-NEW,Fresh,Author,,,,,,,,\n"
+            "ISBN-SNAP-5,,,,bad,,,,,,\n"
+        )
+        per_batch = import_books_from_csv(io.StringIO(csv_content), dry_run=True, batch_size=2)
+        with CaptureQueriesContext(connection) as ctx:
+            snapshot = import_books_from_csv(io.StringIO(csv_content), dry_run=True, snapshot=True, batch_size=2)
+
+        self.assertEqual(snapshot, per_batch)
+        self.assertEqual((snapshot["created"], snapshot["updated"], snapshot["skipped"]), (1, 4, 2))
+        self.assertEqual(
+            snapshot["field_changes"],
+            {"available_copies": 1, "category": 2, "description": 1, "status": 1, "title": 1, "total_copies": 1},
+        )
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+
+    def test_snapshot_loads_only_input_isbns_and_supplied_columns(self):
+        from unittest import mock
+
+        from books import admin_csv
+        from books.admin_csv import CatalogSnapshot
+
+        for i in range(5):
+            Book.objects.create(title=f"Title {i}", author="Author", isbn=f"ISBN-SCOPE-{i}", total_copies=1)
+
+        rows = [
+            {"isbn": "ISBN-SCOPE-1", "title": "New", "description": ""},
+            {"isbn": "ISBN-SCOPE-3", "status": "下架"},
+            {"isbn": "ISBN-SCOPE-NEW", "title": "Fresh"},
+        ]
+        with mock.patch.object(admin_csv, "SNAPSHOT_QUERY_CHUNK_SIZE", 1):
+            catalog = CatalogSnapshot.for_rows(rows)
+
+        self.assertEqual(set(catalog._rows), {"ISBN-SCOPE-1", "ISBN-SCOPE-3"})
+        self.assertIn("title", catalog._columns)
+        self.assertIn("status", catalog._columns)
+        self.assertNotIn("description", catalog._columns)
+        self.assertEqual(catalog.books(["ISBN-SCOPE-1"])["ISBN-SCOPE-1"].title, "Title 1")
+
     def test_can_delete_book_even_with_borrow_history(self):
         User = get_user_model()
         user = User.objects.create_user(username="user1", password="pass12345")
@@ -166,3 +361,1093 @@ class BookCsvImportTests(TestCase):
 
         self.assertFalse(Book.objects.filter(pk=book.id).exists())
         self.assertFalse(Borrow.objects.filter(book_id=book.id).exists())
+
+
+class BookImportJobTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from django.test import override_settings
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        User = get_user_model()
+        admin = User.objects.create_user(username="import_admin", password="pass12345", role="admin")
+        self.client.force_login(admin)
+
+    def test_upload_creates_job_processed_by_worker(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+
+        csv_content = (
+            "isbn,title,author,publisher,publish_date,description,category_name,total_copies,available_copies,location,status\n"
+            "ISBN-JOB-0001,Title,Author,,,,,2,,,\n"
+            "ISBN-JOB-0002,,Author,,,,,,,,\n"
+        )
+        upload = SimpleUploadedFile("books.csv", csv_content.encode("utf-8-sig"), content_type="text/csv")
+        resp = self.client.post("/api/admin/books/import", {"file": upload})
+        self.assertEqual(resp.status_code, 202)
+        job = resp.json()["job"]
+        self.assertEqual(job["status"], "pending")
+        self.assertFalse(Book.objects.filter(isbn="ISBN-JOB-0001").exists())
+
+        call_command("import_books", "--worker", "--once", stdout=io.StringIO())
+
+        resp = self.client.get(f"/api/admin/books/import/{job['id']}")
+        self.assertEqual(resp.status_code, 200)
+        job = resp.json()["job"]
+        self.assertEqual(job["status"], "succeeded")
+        self.assertTrue(job["finished"])
+        self.assertTrue(job["applied"])
+        self.assertEqual((job["rows_processed"], job["created"], job["skipped"]), (2, 1, 1))
+        self.assertEqual([e["row"] for e in job["errors"]], [3])
+        self.assertEqual(Book.objects.get(isbn="ISBN-JOB-0001").total_copies, 2)
+
+    CSV_HEADER = (
+        "isbn,title,author,publisher,publish_date,description,category_name,total_copies,available_copies,location,status\r\n"
+    )
+
+    def _write_csv(self, rows):
+        import os
+        import tempfile
+
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "wb") as f:
+            f.write(("\ufeff" + self.CSV_HEADER + "".join(rows)).encode("utf-8"))
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_cli_import_records_checkpoint_and_resume_seeks_past_it(self):
+        import os
+
+        from django.core.management import call_command
+
+        from books.models import BookImportJob
+
+        rows = [f"ISBN-RESUME-{i},标题 {i},Author,,,,,1,,,\r\n" for i in range(5)]
+        path = self._write_csv(rows)
+        call_command("import_books", "--file", path, "--batch-size", "2", stdout=io.StringIO(), stderr=io.StringIO())
+
+        job = BookImportJob.objects.get(source_path=path)
+        self.assertEqual(job.status, BookImportJob.Status.SUCCEEDED)
+        self.assertEqual((job.checkpoint_row, job.checkpoint_offset), (6, os.path.getsize(path)))
+        self.assertEqual(job.created_count, 5)
+
+        # 模拟进程在提交前两行后中断：断点之前的行不应再处理
+        Book.objects.filter(isbn__startswith="ISBN-RESUME-").delete()
+        committed = len(("\ufeff" + self.CSV_HEADER + rows[0] + rows[1]).encode("utf-8"))
+        BookImportJob.objects.filter(pk=job.id).update(
+            status=BookImportJob.Status.RUNNING,
+            checkpoint_row=3,
+            checkpoint_offset=committed,
+            rows_processed=2,
+            created_count=2,
+            errors=[],
+        )
+        call_command("import_books", "--resume", str(job.id), stdout=io.StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, BookImportJob.Status.SUCCEEDED)
+        self.assertEqual((job.rows_processed, job.created_count), (5, 5))
+        self.assertEqual(
+            sorted(Book.objects.filter(isbn__startswith="ISBN-RESUME-").values_list("isbn", flat=True)),
+            ["ISBN-RESUME-2", "ISBN-RESUME-3", "ISBN-RESUME-4"],
+        )
+
+    def test_atomic_job_writes_no_checkpoint_and_resume_restarts(self):
+        from django.core.management import call_command
+
+        from books.models import BookImportJob
+
+        rows = [f"ISBN-ATOMIC-{i},标题 {i},Author,,,,,1,,,\r\n" for i in range(3)] + [",缺 ISBN,,,,,,1,,,\r\n"]
+        path = self._write_csv(rows)
+        call_command(
+            "import_books", "--file", path, "--atomic", "--batch-size", "2", stdout=io.StringIO(), stderr=io.StringIO()
+        )
+        job = BookImportJob.objects.get(source_path=path)
+        self.assertFalse(job.applied)
+        self.assertEqual((job.checkpoint_row, job.checkpoint_offset), (0, 0))
+        self.assertFalse(Book.objects.filter(isbn__startswith="ISBN-ATOMIC-").exists())
+
+        BookImportJob.objects.filter(pk=job.id).update(status=BookImportJob.Status.FAILED)
+        err = io.StringIO()
+        call_command("import_books", "--resume", str(job.id), stdout=io.StringIO(), stderr=err)
+        self.assertIn("从头重新执行", err.getvalue())
+        job.refresh_from_db()
+        self.assertEqual(job.rows_processed, 4)
+
+    def test_chunk_atomic_rolls_back_only_the_failing_batch(self):
+        csv_content = (
+            "isbn,title,author,publisher,publish_date,description,category_name,total_copies,available_copies,location,status\n"
+            "ISBN-CHUNK-1,T1,A,,,,,,,,\n"
+            "ISBN-CHUNK-2,T2,A,,,,,,,,\n"
+            "ISBN-CHUNK-3,T3,A,,,,,,,,\n"
+            "ISBN-CHUNK-4,T4,A,,,,,,,,bad_status\n"
+            "ISBN-CHUNK-5,T5,A,,,,,,,,\n"
+        )
+        result = import_books_from_csv(io.StringIO(csv_content), chunk_atomic=True, batch_size=2)
+        self.assertTrue(result["applied"])
+        self.assertEqual((result["created"], result["skipped"]), (3, 2))
+        self.assertEqual([e["row"] for e in result["errors"]], [4, 5])
+        self.assertEqual(
+            sorted(Book.objects.filter(isbn__startswith="ISBN-CHUNK-").values_list("isbn", flat=True)),
+            ["ISBN-CHUNK-1", "ISBN-CHUNK-2", "ISBN-CHUNK-5"],
+        )
+
+    def test_gzipped_jsonl_upload_reports_bad_lines_by_line_number(self):
+        import gzip
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+
+        lines = (
+            '{"isbn": "ISBN-JSONL-1", "title": "标题", "author": "A", "total_copies": 2}\n'
+            "\n"
+            "{not json\n"
+            '["ISBN-JSONL-2"]\n'
+            '{"isbn": "ISBN-JSONL-3", "title": "T3", "author": "A", "status": "bad_status"}\n'
+        )
+        upload = SimpleUploadedFile("books.jsonl.gz", gzip.compress(lines.encode("utf-8")))
+        resp = self.client.post("/api/admin/books/import", {"file": upload})
+        self.assertEqual(resp.status_code, 202)
+        self.assertEqual(resp.json()["job"]["input_format"], "jsonl.gz")
+
+        call_command("import_books", "--worker", "--once", stdout=io.StringIO())
+
+        job = self.client.get(f"/api/admin/books/import/{resp.json()['job']['id']}").json()["job"]
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual((job["rows_processed"], job["created"], job["skipped"]), (4, 1, 3))
+        self.assertEqual([e["row"] for e in job["errors"]], [3, 4, 5])
+        self.assertEqual(Book.objects.get(isbn="ISBN-JSONL-1").total_copies, 2)
+
+    def test_unknown_format_is_rejected(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        upload = SimpleUploadedFile("books.xlsx", b"")
+        resp = self.client.post("/api/admin/books/import?format=xlsx", {"file": upload})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_cli_resumes_gzipped_csv_from_checkpoint(self):
+        import gzip
+        import os
+        import tempfile
+
+        from django.core.management import call_command
+
+        from books.models import BookImportJob
+
+        rows = [f"ISBN-GZ-{i},标题 {i},Author,,,,,1,,,\r\n" for i in range(4)]
+        fd, path = tempfile.mkstemp(suffix=".csv.gz")
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip.compress((self.CSV_HEADER + "".join(rows)).encode("utf-8")))
+        self.addCleanup(os.remove, path)
+
+        call_command("import_books", "--file", path, "--batch-size", "2", stdout=io.StringIO(), stderr=io.StringIO())
+        job = BookImportJob.objects.get(source_path=path)
+        self.assertEqual((job.status, job.input_format, job.created_count), ("succeeded", "csv.gz", 4))
+
+        # 断点偏移按解压后的字节计
+        Book.objects.filter(isbn__startswith="ISBN-GZ-").delete()
+        committed = len((self.CSV_HEADER + rows[0] + rows[1]).encode("utf-8"))
+        BookImportJob.objects.filter(pk=job.id).update(
+            status=BookImportJob.Status.FAILED, checkpoint_row=3, checkpoint_offset=committed
+        )
+        call_command("import_books", "--resume", str(job.id), stdout=io.StringIO())
+        self.assertEqual(
+            sorted(Book.objects.filter(isbn__startswith="ISBN-GZ-").values_list("isbn", flat=True)),
+            ["ISBN-GZ-2", "ISBN-GZ-3"],
+        )
+
+    def test_dry_run_upload_runs_synchronously_without_job(self):
+        import gzip
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        from books.models import BookImportJob
+
+        Book.objects.create(title="Old", author="Author", isbn="ISBN-DRY-1", total_copies=1)
+        content = self.CSV_HEADER + "ISBN-DRY-1,New,,,,,,,,,\r\nISBN-DRY-2,Fresh,Author,,,,,,,,\r\n"
+        for name, payload in (
+            ("books.csv", ("\ufeff" + content).encode("utf-8")),
+            ("books.csv.gz", gzip.compress(content.encode("utf-8"))),
+        ):
+            upload = SimpleUploadedFile(name, payload)
+            resp = self.client.post("/api/admin/books/import?dry_run=1&snapshot=1", {"file": upload})
+            self.assertEqual(resp.status_code, 200)
+            result = resp.json()
+            self.assertFalse(result["applied"])
+            self.assertEqual((result["created"], result["updated"]), (1, 1))
+            self.assertEqual(result["field_changes"], {"title": 1})
+
+        self.assertFalse(BookImportJob.objects.exists())
+        self.assertEqual(Book.objects.get(isbn="ISBN-DRY-1").title, "Old")
+        self.assertFalse(Book.objects.filter(isbn="ISBN-DRY-2").exists())
+
+    def test_worker_reclaims_running_job_after_heartbeat_lease(self):
+        from datetime import timedelta
+
+        from django.core.management import call_command
+        from django.utils import timezone
+
+        from books.import_jobs import claim_job, claim_stale_job, create_import_job
+        from books.models import BookImportJob
+
+        rows = [f"ISBN-LEASE-{i},Title {i},Author,,,,,1,,,\r\n" for i in range(4)]
+        path = self._write_csv(rows)
+        job = create_import_job(source_path=path)
+        self.assertTrue(claim_job(job.id))
+        # 原 worker 提交了前两行后被杀掉
+        for i in range(2):
+            Book.objects.create(title=f"Title {i}", author="Author", isbn=f"ISBN-LEASE-{i}", total_copies=1)
+        committed = len(("\ufeff" + self.CSV_HEADER + rows[0] + rows[1]).encode("utf-8"))
+        BookImportJob.objects.filter(pk=job.id).update(
+            rows_processed=2, created_count=2, checkpoint_row=3, checkpoint_offset=committed
+        )
+
+        self.assertIsNone(claim_stale_job())
+        BookImportJob.objects.filter(pk=job.id).update(heartbeat_at=timezone.now() - timedelta(seconds=301))
+
+        err = io.StringIO()
+        call_command("import_books", "--worker", "--once", stdout=io.StringIO(), stderr=err)
+        self.assertIn("心跳超时", err.getvalue())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.rows_processed, job.created_count), ("succeeded", 4, 4))
+        self.assertEqual(Book.objects.filter(isbn__startswith="ISBN-LEASE-").count(), 4)
+        self.assertIsNone(claim_stale_job())
+
+    def test_job_status_requires_admin(self):
+        self.client.logout()
+        resp = self.client.get("/api/admin/books/import/1")
+        self.assertEqual(resp.status_code, 401)
+
+
+class BookKeysetPaginationTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Book.objects.create(
+                title=f"Page Book {i}",
+                author="Author",
+                isbn=f"ISBN-PAGE-{i:04d}",
+                total_copies=1,
+                available_copies=1,
+                status=Book.Status.ON_SHELF,
+            )
+
+    def test_cursor_pages_cover_all_books_once(self):
+        seen = []
+        cursor = None
+        for _ in range(5):
+            url = "/api/books?limit=2&with_total=1"
+            if cursor:
+                url += f"&cursor={cursor}"
+            data = self.client.get(url).json()
+            self.assertTrue(data.get("ok"))
+            self.assertEqual(data.get("total"), 5)
+            seen.extend(row["isbn"] for row in data["results"])
+            cursor = data.get("next_cursor")
+            if not cursor:
+                break
+
+        expected = list(
+            Book.objects.order_by("-updated_at", "-id").values_list("isbn", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_is_rejected(self):
+        resp = self.client.get("/api/books?cursor=not-a-cursor")
+        self.assertEqual(resp.status_code, 400)
+        self.assertFalse(resp.json().get("ok"))
+
+    def test_well_formed_cursor_with_wrong_types_is_rejected(self):
+        from books.pagination import encode_cursor
+
+        shapes = [
+            [{"dt": "2024-01-01T00:00:00+00:00"}, "abc"],
+            ["x", 1],
+            [{"d": "2024-01-01"}, 1],
+            [{"dt": "2024-01-01T00:00:00"}, 1],
+            [None, None],
+        ]
+        for values in shapes:
+            resp = self.client.get("/api/books", {"limit": 2, "cursor": encode_cursor(values)})
+            self.assertEqual(resp.status_code, 400, values)
+
+
+class BookSearchIndexTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Distributed Systems",
+            author="Tanenbaum",
+            isbn="ISBN-FTS-0001",
+            publisher="Pearson",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.ON_SHELF,
+        )
+        Book.objects.create(
+            title="Operating Systems",
+            author="Someone",
+            isbn="ISBN-FTS-0002",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.ON_SHELF,
+        )
+
+    def _search(self, kw):
+        data = self.client.get("/api/books", {"kw": kw}).json()
+        return [row["isbn"] for row in data["results"]]
+
+    def test_keyword_search_matches_substrings_case_insensitively(self):
+        self.assertEqual(self._search("tribut"), ["ISBN-FTS-0001"])
+        self.assertEqual(set(self._search("SYSTEMS")), {"ISBN-FTS-0001", "ISBN-FTS-0002"})
+        self.assertEqual(self._search("pearson"), ["ISBN-FTS-0001"])
+        self.assertEqual(self._search("fts-0002"), ["ISBN-FTS-0002"])
+
+    def test_index_follows_book_updates_and_deletes(self):
+        self.book.title = "Compilers"
+        self.book.save()
+        self.assertEqual(self._search("Distributed"), [])
+        self.assertEqual(self._search("compil"), ["ISBN-FTS-0001"])
+
+        Book.objects.filter(pk=self.book.pk).update(author="Aho")
+        self.assertEqual(self._search("tanenbaum"), [])
+
+        self.book.delete()
+        self.assertEqual(self._search("compil"), [])
+
+    def test_short_keyword_falls_back_to_substring_filter(self):
+        self.assertEqual(self._search("Ta"), ["ISBN-FTS-0001"])
+
+    def test_rank_orders_hits_without_per_row_fulltext_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from books.search import search_books
+
+        Book.objects.create(title="Systems Systems Systems", author="A", isbn="ISBN-FTS-0003", total_copies=1)
+        with CaptureQueriesContext(connection) as ctx:
+            isbns = list(search_books(Book.objects.all(), "systems", rank=True).values_list("isbn", flat=True))
+        self.assertEqual(isbns[0], "ISBN-FTS-0003")
+        self.assertEqual(len(isbns), 3)
+        if connection.vendor == "sqlite" and "books_book_fts" in ctx.captured_queries[0]["sql"]:
+            self.assertNotIn("rowid = books_book.id", ctx.captured_queries[0]["sql"].replace("hits.rowid", ""))
+
+    def test_postgres_backend_keeps_substring_matches(self):
+        from books.search import PostgresFtsSearchBackend
+
+        condition = PostgresFtsSearchBackend()._text_condition("c++")
+        self.assertIn(("title__icontains", "c++"), condition.children)
+        condition = PostgresFtsSearchBackend()._text_condition("ribut sys")
+        self.assertIn("title__icontains", str(condition))
+
+    def test_admin_changelist_search_orders_by_rank(self):
+        User = get_user_model()
+        admin = User.objects.create_superuser(username="search_admin", password="pass12345")
+        self.client.force_login(admin)
+        resp = self.client.get("/admin/books/book/", {"q": "systems"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["cl"].result_count, 2)
+        self.assertEqual(resp.context["cl"].queryset.query.order_by[0], "search_rank")
+        resp = self.client.get("/admin/books/book/", {"q": "systems", "o": "1"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn("search_rank", resp.context["cl"].queryset.query.order_by)
+
+
+class BookCjkSearchTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="三体",
+            author="刘慈欣",
+            isbn="ISBN-CJK-0001",
+            publisher="重庆出版社",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.ON_SHELF,
+        )
+        Book.objects.create(
+            title="体育概论",
+            author="佚名",
+            isbn="ISBN-CJK-0002",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.ON_SHELF,
+        )
+
+    def _search(self, kw):
+        data = self.client.get("/api/books", {"kw": kw}).json()
+        return [row["isbn"] for row in data["results"]]
+
+    def test_chinese_keywords_use_bigram_tokens(self):
+        self.assertEqual(self._search("三体"), ["ISBN-CJK-0001"])
+        self.assertEqual(set(self._search("体")), {"ISBN-CJK-0001", "ISBN-CJK-0002"})
+        self.assertEqual(self._search("慈欣"), ["ISBN-CJK-0001"])
+        self.assertEqual(self._search("出版社"), ["ISBN-CJK-0001"])
+        self.assertEqual(self._search("三国"), [])
+
+    def test_pinyin_initials_and_full_spelling(self):
+        from books import search_tokens
+
+        if search_tokens.lazy_pinyin is None:
+            self.skipTest("pypinyin 未安装")
+        self.assertEqual(self._search("st"), ["ISBN-CJK-0001"])
+        self.assertEqual(self._search("santi"), ["ISBN-CJK-0001"])
+        self.assertEqual(self._search("lcx"), ["ISBN-CJK-0001"])
+        # 标题 + 作者的首字母连成一串
+        self.assertEqual(self._search("stl"), ["ISBN-CJK-0001"])
+        self.assertEqual(self._search("stlcx"), ["ISBN-CJK-0001"])
+
+    def test_cross_field_initials_migration_matches_tokenizer(self):
+        import importlib
+
+        from books import search_tokens
+
+        if search_tokens.lazy_pinyin is None:
+            self.skipTest("pypinyin 未安装")
+        migration = importlib.import_module("books.migrations.0012_booksearchtoken_cross_field_initials")
+        tokens = search_tokens.book_search_tokens(title="三体·黑暗森林", author="刘慈欣")
+        initials = {t for t in tokens if t.startswith(search_tokens.INITIALS_PREFIX)}
+        self.assertEqual(migration._initials_tokens("三体·黑暗森林", "刘慈欣"), initials)
+
+    def test_tokens_follow_title_changes(self):
+        self.book.title = "球状闪电"
+        self.book.save()
+        self.assertEqual(self._search("三体"), [])
+        self.assertEqual(self._search("闪电"), ["ISBN-CJK-0001"])
+
+
+class BookSuggestTests(TestCase):
+    def setUp(self):
+        from books.suggest import build_suggest_index, reset_suggest_index
+
+        reset_suggest_index()
+        self.addCleanup(reset_suggest_index)
+        self.book = Book.objects.create(
+            title="Python Cookbook",
+            author="David Beazley",
+            isbn="9781449340377",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.ON_SHELF,
+        )
+        Book.objects.create(
+            title="Python Hidden",
+            author="Someone",
+            isbn="ISBN-SUGGEST-0002",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.OFF_SHELF,
+        )
+        build_suggest_index()
+
+    def _suggest(self, q):
+        data = self.client.get("/api/books/suggest", {"q": q}).json()
+        self.assertTrue(data.get("ok"))
+        return [(row["type"], row["text"]) for row in data["results"]]
+
+    def test_prefix_matches_title_author_and_isbn(self):
+        self.assertEqual(self._suggest("pyth"), [("title", "Python Cookbook")])
+        self.assertEqual(self._suggest("david"), [("author", "David Beazley")])
+        self.assertEqual(self._suggest("978144"), [("isbn", "9781449340377")])
+        self.assertEqual(self._suggest(""), [])
+
+    def test_index_is_updated_incrementally(self):
+        from books.suggest import forget_book, get_suggest_index, refresh_book
+
+        self.assertEqual(self._suggest("fluent"), [])
+        self.book.title = "Fluent Python"
+        self.book.save()
+        refresh_book(self.book)
+        self.assertEqual(self._suggest("fluent"), [("title", "Fluent Python")])
+        self.assertEqual(self._suggest("python c"), [])
+
+        forget_book(self.book.id)
+        self.assertEqual(self._suggest("fluent"), [])
+        self.assertEqual(len(get_suggest_index()), 1)
+
+    def test_unbuilt_index_is_built_in_background_without_blocking(self):
+        from unittest import mock
+
+        from books import suggest
+
+        suggest.reset_suggest_index()
+        with mock.patch.object(suggest.threading, "Thread") as thread:
+            self.assertEqual(self._suggest("pyth"), [])
+            self.assertEqual(self._suggest("pyth"), [])
+        # 构建尚未完成时不重复启动
+        self.assertEqual(thread.call_count, 1)
+        thread.return_value.start.assert_called_once_with()
+
+        suggest.build_suggest_index()
+        self.assertEqual(self._suggest("pyth"), [("title", "Python Cookbook")])
+
+    def test_sync_drops_books_deleted_elsewhere_from_tombstones(self):
+        from unittest import mock
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from books import suggest
+        from books.models import BookDeletion
+
+        self.assertEqual(self._suggest("pyth"), [("title", "Python Cookbook")])
+
+        # 模拟其它进程删除：不经过 forget_book
+        Book.objects.filter(pk=self.book.pk).delete()
+        self.assertTrue(BookDeletion.objects.filter(book_id=self.book.pk).exists())
+        with mock.patch.object(suggest, "SYNC_INTERVAL_SECONDS", 0), CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self._suggest("pyth"), [])
+        # 增量同步只读变更行和墓碑，不扫描全部 id
+        self.assertFalse(any('SELECT "books_book"."id" FROM' in q["sql"] for q in ctx.captured_queries))
+        self.assertEqual(len(suggest.get_suggest_index()), 1)
+
+
+class BookSparseFieldsTests(TestCase):
+    def setUp(self):
+        from books.models import Category
+
+        self.category = Category.objects.create(name="小说")
+        Book.objects.create(
+            title="Sparse Book",
+            author="Author",
+            isbn="ISBN-SPARSE-0001",
+            description="x" * 500,
+            category=self.category,
+            total_copies=2,
+            available_copies=2,
+            status=Book.Status.ON_SHELF,
+        )
+
+    def test_fields_projection_returns_only_requested_keys(self):
+        data = self.client.get("/api/books", {"fields": "title,category,publish_date"}).json()
+        self.assertTrue(data.get("ok"))
+        row = data["results"][0]
+        self.assertEqual(set(row), {"id", "title", "category", "publish_date"})
+        self.assertEqual(row["category"], {"id": self.category.id, "name": "小说"})
+        self.assertIsNone(row["publish_date"])
+
+    def test_list_view_is_compact_and_works_with_cursor(self):
+        data = self.client.get("/api/books", {"view": "list", "limit": 10}).json()
+        row = data["results"][0]
+        self.assertEqual(
+            set(row),
+            {"id", "title", "author", "cover_url", "cover_urls", "available_copies", "status"},
+        )
+        self.assertNotIn("description", row)
+
+    def test_unknown_field_is_rejected(self):
+        resp = self.client.get("/api/books", {"fields": "title,password"})
+        self.assertEqual(resp.status_code, 400)
+
+
+class CatalogConditionalGetTests(TestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Etag Book",
+            author="Author",
+            isbn="ISBN-ETAG-0001",
+            total_copies=2,
+            available_copies=2,
+            status=Book.Status.ON_SHELF,
+        )
+
+    def test_unchanged_collection_returns_304(self):
+        resp = self.client.get("/api/books")
+        self.assertEqual(resp.status_code, 200)
+        etag = resp.headers.get("ETag")
+        self.assertTrue(etag)
+        self.assertTrue(resp.headers.get("Last-Modified"))
+
+        resp = self.client.get("/api/books", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.client.get(f"/api/books/{self.book.id}")
+        item_etag = resp.headers.get("ETag")
+        resp = self.client.get(f"/api/books/{self.book.id}", HTTP_IF_NONE_MATCH=item_etag)
+        self.assertEqual(resp.status_code, 304)
+
+        resp = self.client.get("/api/categories")
+        resp = self.client.get("/api/categories", HTTP_IF_NONE_MATCH=resp.headers.get("ETag"))
+        self.assertEqual(resp.status_code, 304)
+
+    def test_borrow_changes_collection_and_item_etag(self):
+        etag = self.client.get("/api/books").headers.get("ETag")
+        item_etag = self.client.get(f"/api/books/{self.book.id}").headers.get("ETag")
+
+        User = get_user_model()
+        user = User.objects.create_user(username="etag_user", password="pass12345")
+        Borrow.objects.create(
+            user=user,
+            book=self.book,
+            copy=self.book.copies.get(copy_no=1),
+            due_date=timezone.localdate() + timedelta(days=14),
+            status=Borrow.Status.BORROWED,
+        )
+
+        resp = self.client.get("/api/books", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["results"][0]["available_copies"], 1)
+        resp = self.client.get(f"/api/books/{self.book.id}", HTTP_IF_NONE_MATCH=item_etag)
+        self.assertEqual(resp.status_code, 200)
+
+
+@override_settings(CATALOG_CACHE_ENABLED=True)
+class CatalogResponseCacheTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.book = Book.objects.create(
+            title="Cached Book",
+            author="Author",
+            isbn="ISBN-CACHE-0001",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.ON_SHELF,
+        )
+
+    def _results(self):
+        return self.client.get("/api/books").json()["results"]
+
+    def test_cache_hit_skips_the_list_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as cold:
+            self._results()
+        with CaptureQueriesContext(connection) as warm:
+            self._results()
+        self.assertLess(len(warm), len(cold))
+        self.assertFalse(any("books_book\".\"description" in q["sql"] for q in warm.captured_queries))
+
+    def test_writes_invalidate_cached_responses(self):
+        self.assertEqual(self._results()[0]["title"], "Cached Book")
+        self.book.title = "Renamed Book"
+        self.book.save()
+        self.assertEqual(self._results()[0]["title"], "Renamed Book")
+
+        Book.objects.filter(pk=self.book.pk).update(status=Book.Status.OFF_SHELF)
+        from books.catalog_cache import bump_catalog_version
+
+        bump_catalog_version()
+        self.assertEqual(self._results(), [])
+
+    def test_unbumped_bulk_delete_is_not_served_from_cache(self):
+        Book.objects.create(title="Cached Book 2", author="Author", isbn="ISBN-CACHE-0002", total_copies=1)
+        first = self.client.get("/api/books")
+        self.assertEqual(first.json()["count"], 2)
+
+        # QuerySet.delete 不经过 Book.delete，也不递增目录版本
+        Book.objects.filter(isbn="ISBN-CACHE-0002").delete()
+        second = self.client.get("/api/books")
+        self.assertNotEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.json()["count"], 1)
+
+    @override_settings(CATALOG_CACHE_ENABLED=False)
+    def test_cache_is_off_without_a_shared_backend(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as cold:
+            self._results()
+        with CaptureQueriesContext(connection) as warm:
+            self._results()
+        self.assertEqual(len(warm), len(cold))
+
+    def test_admin_and_public_responses_are_cached_separately(self):
+        self.book.status = Book.Status.OFF_SHELF
+        self.book.save()
+        self.assertEqual(self._results(), [])
+
+        User = get_user_model()
+        admin = User.objects.create_user(username="cache_admin", password="pass12345", role="admin")
+        self.client.force_login(admin)
+        self.assertEqual(len(self._results()), 1)
+
+
+class StreamingListResponseTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for i in range(5):
+            Book.objects.create(
+                title=f"Stream Book {i}",
+                author="Author",
+                isbn=f"ISBN-STREAM-{i:04d}",
+                total_copies=1,
+                available_copies=1,
+                status=Book.Status.ON_SHELF,
+            )
+
+    def test_large_results_are_streamed_as_valid_json(self):
+        import json
+
+        with override_settings(JSON_STREAM_THRESHOLD=2, CATALOG_CACHE_ENABLED=True):
+            resp = self.client.get("/api/books")
+            self.assertTrue(resp.streaming)
+            data = json.loads(b"".join(resp.streaming_content))
+        self.assertTrue(data["ok"])
+        self.assertEqual(data["count"], 5)
+        self.assertEqual(len(data["results"]), 5)
+
+        # 流式响应结束后写入缓存，下一次直接命中
+        with override_settings(JSON_STREAM_THRESHOLD=2, CATALOG_CACHE_ENABLED=True):
+            resp = self.client.get("/api/books")
+        self.assertFalse(resp.streaming)
+        self.assertEqual(resp.json()["count"], 5)
+
+    def test_small_results_keep_plain_json_response(self):
+        resp = self.client.get("/api/books")
+        self.assertFalse(resp.streaming)
+        self.assertEqual(resp.json()["count"], 5)
+
+
+class BookIncrementalExportTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Book.objects.create(
+                title=f"Export Book {i}",
+                author="Author",
+                isbn=f"ISBN-EXPORT-{i:04d}",
+                total_copies=1,
+                available_copies=1,
+                status=Book.Status.ON_SHELF,
+            )
+
+    @override_settings(EXPORT_WATERMARK_LAG_SECONDS=0)
+    def test_export_command_with_state_file_only_emits_changed_rows(self):
+        import csv
+        import json
+        import os
+        import shutil
+        import tempfile
+
+        from django.core.management import call_command
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        output = os.path.join(tmpdir, "books.csv")
+        state = os.path.join(tmpdir, "books.watermark")
+
+        def export():
+            call_command("export_books", "--output", output, "--state-file", state, stdout=io.StringIO())
+            with open(output, encoding="utf-8-sig", newline="") as f:
+                return [row["isbn"] for row in csv.DictReader(f)]
+
+        self.assertEqual(len(export()), 5)
+        with open(state, encoding="utf-8") as f:
+            self.assertIn("watermark", json.load(f))
+
+        book = Book.objects.get(isbn="ISBN-EXPORT-0003")
+        book.title = "Changed"
+        book.save()
+        self.assertEqual(export(), ["ISBN-EXPORT-0003"])
+        self.assertEqual(export(), [])
+
+    @override_settings(EXPORT_WATERMARK_LAG_SECONDS=0)
+    def test_export_endpoint_filters_by_since_and_returns_watermark(self):
+        User = get_user_model()
+        admin = User.objects.create_user(username="export_admin", password="pass12345", role="admin")
+        self.client.force_login(admin)
+
+        resp = self.client.get("/api/admin/books/export?since=not-a-time")
+        self.assertEqual(resp.status_code, 400)
+
+        resp = self.client.get("/api/admin/books/export")
+        watermark = resp["X-Export-Watermark"]
+        self.assertEqual(b"".join(resp.streaming_content).decode("utf-8-sig").count("ISBN-EXPORT-"), 5)
+
+        Book.objects.filter(isbn="ISBN-EXPORT-0001").update(updated_at=timezone.now())
+        resp = self.client.get("/api/admin/books/export", {"since": watermark})
+        body = b"".join(resp.streaming_content).decode("utf-8-sig")
+        self.assertEqual(body.count("ISBN-EXPORT-"), 1)
+        self.assertIn("ISBN-EXPORT-0001", body)
+
+    def test_export_window_rereads_the_lag_and_includes_borrows(self):
+        from datetime import timedelta
+
+        from books.export_window import export_window
+
+        watermark = timezone.now()
+        Book.objects.update(updated_at=watermark - timedelta(hours=1))
+        # 上一次导出时尚未提交、时间戳早于水位线的写入
+        Book.objects.filter(isbn="ISBN-EXPORT-0001").update(updated_at=watermark - timedelta(seconds=30))
+        qs, _until = export_window(Book.objects.all(), watermark)
+        self.assertEqual(list(qs.values_list("isbn", flat=True)), ["ISBN-EXPORT-0001"])
+
+        # 借阅只改 available_copies，也要出现在下一次增量中
+        book = Book.objects.get(isbn="ISBN-EXPORT-0002")
+        User = get_user_model()
+        user = User.objects.create_user(username="export_reader", password="pass12345")
+        since = timezone.now()
+        Borrow.objects.create(
+            user=user, book=book, copy=book.copies.get(copy_no=1), due_date=timezone.localdate() + timedelta(days=7)
+        )
+        with override_settings(EXPORT_WATERMARK_LAG_SECONDS=0):
+            qs, _until = export_window(Book.objects.all(), since)
+            rows = list(qs.values_list("isbn", "available_copies"))
+        self.assertEqual(rows, [("ISBN-EXPORT-0002", 0)])
+
+
+class BookShardedExportTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Book.objects.create(
+                title=f"Export Book {i}",
+                author="Author",
+                isbn=f"ISBN-EXPORT-{i:04d}",
+                total_copies=1,
+                available_copies=1,
+                status=Book.Status.ON_SHELF,
+            )
+
+    def test_sharded_export_concatenates_to_same_csv(self):
+        import codecs
+        import os
+        import shutil
+        import tempfile
+
+        from books.admin_csv import BOOK_CSV_COLUMNS, book_csv_rows, export_books_to_csv
+        from books.export_shards import concat_parts, export_in_shards, id_ranges
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        output = os.path.join(tmpdir, "books.csv")
+
+        ranges = id_ranges(Book.objects.all(), 3)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[0][0], Book.objects.order_by("id").first().id)
+
+        total, parts = export_in_shards(
+            Book, book_csv_rows, BOOK_CSV_COLUMNS, output=output, filters={}, workers=1, parts=3
+        )
+        self.assertEqual((total, len(parts)), (5, 3))
+        # 每个分片与串行导出一样带 UTF-8 BOM，可单独交给下游读取
+        for part in parts:
+            with open(part, "rb") as f:
+                self.assertTrue(f.read().startswith(codecs.BOM_UTF8 + b"isbn,"))
+        concat_parts(parts, output)
+
+        expected = io.StringIO()
+        export_books_to_csv(Book.objects.all(), expected)
+        with open(output, "rb") as f:
+            self.assertEqual(f.read(), codecs.BOM_UTF8 + expected.getvalue().encode("utf-8"))
+
+
+class BookColumnarExportTests(TestCase):
+    def setUp(self):
+        for i in range(5):
+            Book.objects.create(
+                title=f"Export Book {i}",
+                author="Author",
+                isbn=f"ISBN-EXPORT-{i:04d}",
+                total_copies=1,
+                available_copies=1,
+                status=Book.Status.ON_SHELF,
+            )
+
+    def test_columnar_export_falls_back_to_npy_and_requires_a_backend(self):
+        import json
+        import os
+        import shutil
+        import tempfile
+        from unittest import mock
+
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+
+        from books import columnar
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        output = os.path.join(tmpdir, "books.parquet")
+
+        with self.assertRaises(CommandError):
+            call_command("export_books", "--format", "npy", stdout=io.StringIO())
+        with mock.patch.object(columnar, "pa", None), mock.patch.object(columnar, "np", None):
+            with self.assertRaises(CommandError):
+                call_command("export_books", "--output", output, "--format", "parquet", stdout=io.StringIO())
+
+        if columnar.np is None:
+            self.skipTest("numpy 未安装")
+        np = columnar.np
+        with mock.patch.object(columnar, "pa", None):
+            call_command(
+                "export_books", "--output", output, "--format", "parquet", stdout=io.StringIO(), stderr=io.StringIO()
+            )
+        with open(os.path.join(output, "schema.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["rows"], 5)
+        codes = np.load(os.path.join(output, "isbn.codes.npy"))
+        categories = np.load(os.path.join(output, "isbn.categories.npy"))
+        self.assertEqual(sorted(categories[codes]), [f"ISBN-EXPORT-{i:04d}" for i in range(5)])
+        self.assertTrue((np.load(os.path.join(output, "total_copies.npy")) == 1).all())
+        self.assertTrue(np.isnat(np.load(os.path.join(output, "publish_date.npy"))).all())
+
+    def test_parquet_export_round_trips_book_columns(self):
+        import os
+        import shutil
+        import tempfile
+
+        from django.core.management import call_command
+
+        from books import columnar
+
+        if columnar.pa is None:
+            self.skipTest("pyarrow 未安装")
+        pq = columnar.pq
+
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        output = os.path.join(tmpdir, "books.parquet")
+        call_command("export_books", "--output", output, "--format", "parquet", stdout=io.StringIO(), stderr=io.StringIO())
+
+        table = pq.read_table(output)
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(sorted(table.column("isbn").to_pylist()), [f"ISBN-EXPORT-{i:04d}" for i in range(5)])
+        self.assertEqual(table.column("available_copies").to_pylist(), [1] * 5)
+
+
+class BookCoverVariantTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+
+        from django.test import override_settings
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        User = get_user_model()
+        admin = User.objects.create_user(username="cover_admin", password="pass12345", role="admin")
+        self.client.force_login(admin)
+        self.book = Book.objects.create(
+            title="Cover Book",
+            author="Author",
+            isbn="ISBN-COVER-0001",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.ON_SHELF,
+        )
+
+    def test_upload_generates_resized_variants(self):
+        from books import covers
+
+        if covers.Image is None:
+            self.skipTest("Pillow 未安装")
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        buffer = io.BytesIO()
+        covers.Image.new("RGB", (1200, 1600), (200, 40, 40)).save(buffer, format="PNG")
+        upload = SimpleUploadedFile("cover.png", buffer.getvalue(), content_type="image/png")
+
+        resp = self.client.post(f"/api/books/{self.book.id}/cover", {"cover": upload})
+        self.assertEqual(resp.status_code, 200)
+        urls = resp.json()["book"]["cover_urls"]
+        self.assertEqual(set(urls), {"original", "96", "240", "480"})
+
+        self.book.refresh_from_db()
+        storage = self.book.cover.storage
+        for width in ("96", "240", "480"):
+            with storage.open(self.book.cover_variants[width]) as f:
+                with covers.Image.open(f) as image:
+                    self.assertEqual(image.width, int(width))
+            self.assertLess(storage.size(self.book.cover_variants[width]), len(buffer.getvalue()))
+
+        from django.core.management import call_command
+
+        from books.models import CoverBlob
+
+        cover_name = self.book.cover.name
+        file_names = [cover_name, *self.book.cover_variants.values()]
+        resp = self.client.delete(f"/api/books/{self.book.id}/cover")
+        self.assertIsNone(resp.json()["book"]["cover_urls"])
+        # 文件延迟到 gc_covers 清理
+        for name in file_names:
+            self.assertTrue(storage.exists(name))
+
+        call_command("gc_covers", "--grace-hours", "0", stdout=io.StringIO())
+        for name in file_names:
+            self.assertFalse(storage.exists(name))
+        self.assertFalse(CoverBlob.objects.filter(name=cover_name).exists())
+
+    def test_duplicate_upload_shares_one_file(self):
+        import posixpath
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+
+        from books.models import CoverBlob
+
+        other = Book.objects.create(
+            title="Other Edition",
+            author="Author",
+            isbn="ISBN-COVER-0002",
+            total_copies=1,
+            available_copies=1,
+            status=Book.Status.ON_SHELF,
+        )
+        content = b"GIF89a" + b"\x00" * 64
+        for book in (self.book, other, other):
+            upload = SimpleUploadedFile("scan.gif", content, content_type="image/gif")
+            resp = self.client.post(f"/api/books/{book.id}/cover", {"cover": upload})
+            self.assertEqual(resp.status_code, 200)
+
+        self.book.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.book.cover.name, other.cover.name)
+        self.assertTrue(self.book.cover.name.startswith("covers/sha256/"))
+        blob = CoverBlob.objects.get(name=self.book.cover.name)
+        self.assertEqual(blob.ref_count, 2)
+
+        storage = self.book.cover.storage
+        _dirs, files = storage.listdir(posixpath.dirname(blob.name))
+        self.assertEqual(files, [posixpath.basename(blob.name)])
+
+        other.delete()
+        call_command("gc_covers", "--grace-hours", "0", stdout=io.StringIO())
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(storage.exists(blob.name))
+
+        self.client.delete(f"/api/books/{self.book.id}/cover")
+        call_command("gc_covers", stdout=io.StringIO())
+        self.assertTrue(storage.exists(blob.name))
+        call_command("gc_covers", "--grace-hours", "0", stdout=io.StringIO())
+        self.assertFalse(storage.exists(blob.name))
+
+    def test_failed_cover_update_leaves_files_for_gc(self):
+        from unittest import mock
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.core.management import call_command
+
+        from books.models import CoverBlob
+
+        upload = SimpleUploadedFile("scan.gif", b"GIF89a" + b"\x01" * 64, content_type="image/gif")
+        with mock.patch.object(Book, "save", side_effect=RuntimeError("boom")):
+            resp = self.client.post(f"/api/books/{self.book.id}/cover", {"cover": upload})
+        self.assertEqual(resp.status_code, 400)
+
+        # 图书未改动，但文件已有引用数为 0 的记录，gc_covers 能找到并清理
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.cover)
+        blob = CoverBlob.objects.get()
+        self.assertEqual(blob.ref_count, 0)
+        self.assertIsNotNone(blob.released_at)
+        storage = CoverBlob.storage()
+        self.assertTrue(storage.exists(blob.name))
+
+        call_command("gc_covers", "--grace-hours", "0", stdout=io.StringIO())
+        self.assertFalse(storage.exists(blob.name))
+        self.assertFalse(CoverBlob.objects.exists())
@@ -1,18 +1,47 @@
 import json
 from datetime import date
 
-from django.db.models import Q
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_date
+from django.db import transaction
 from django.db.models.deletion import ProtectedError
 from django.views.decorators.http import require_http_methods
 
-from .admin_csv import export_books_to_csv, import_books_from_csv, wrap_uploaded_file
-from .models import Book, BookCopy, Category
+from .admin_csv import (
+    BOOK_CSV_COLUMNS,
+    IMPORT_FORMATS,
+    book_csv_rows,
+    detect_import_format,
+    import_books_from_csv,
+    open_import_binary,
+    wrap_uploaded_file,
+)
+from .catalog_cache import catalog_cached
+from .conditional import (
+    book_item_etag,
+    book_item_last_modified,
+    books_collection_etag,
+    books_collection_last_modified,
+    catalog_conditional,
+    categories_collection_etag,
+    categories_collection_last_modified,
+)
+from .covers import cover_urls, store_cover
+from .export_window import WATERMARK_HEADER, export_window, parse_since
+from .import_jobs import create_import_job, serialize_import_job
+from .models import Book, BookCopy, BookImportJob, Category, CoverBlob
+from .pagination import CursorError, estimate_count, keyset_page, parse_limit, wants_keyset_page
+from .permissions import is_admin
+from .search import search_books
+from .streaming import ITERATOR_CHUNK_SIZE, csv_streaming_response, iter_csv, json_list_response
+from .suggest import DEFAULT_SUGGEST_LIMIT, MAX_SUGGEST_LIMIT, forget_book, get_suggest_index, refresh_book
 from borrows.models import Borrow
 
 
+BOOK_CURSOR_FIELDS = ["updated_at", "id"]
+
+
 def _json_response(payload, *, status=200):
     return JsonResponse(payload, status=status, json_dumps_params={"ensure_ascii": False})
 
@@ -29,12 +58,6 @@ def _parse_json(request):
         return None
 
 
-def _is_admin(user) -> bool:
-    if not user.is_authenticated:
-        return False
-    return getattr(user, "role", None) == "admin" or user.is_staff or user.is_superuser
-
-
 def _truthy(value) -> bool:
     return str(value or "").strip().lower() in {"1", "true", "yes", "y", "on"}
 
@@ -53,6 +76,10 @@ def _serialize_book(book: Book, request=None):
     if book.category_id:
         category = {"id": book.category_id, "name": book.category.name}
 
+    urls = None
+    if book.cover:
+        urls = cover_urls(book.cover.storage, book.cover.name, book.cover_variants, request=request)
+
     return {
         "id": book.id,
         "title": book.title,
@@ -63,6 +90,7 @@ def _serialize_book(book: Book, request=None):
         "description": book.description,
         "category": category,
         "cover_url": cover_url,
+        "cover_urls": urls,
         "total_copies": book.total_copies,
         "available_copies": book.available_copies,
         "location": book.location,
@@ -70,6 +98,91 @@ def _serialize_book(book: Book, request=None):
     }
 
 
+# 输出字段 -> values() 需要读取的列
+BOOK_FIELD_COLUMNS = {
+    "id": ("id",),
+    "title": ("title",),
+    "author": ("author",),
+    "isbn": ("isbn",),
+    "publisher": ("publisher",),
+    "publish_date": ("publish_date",),
+    "description": ("description",),
+    "category": ("category_id", "category__name"),
+    "cover_url": ("cover",),
+    "cover_urls": ("cover", "cover_variants"),
+    "total_copies": ("total_copies",),
+    "available_copies": ("available_copies",),
+    "location": ("location",),
+    "status": ("status",),
+}
+
+# ?view=list：列表卡片所需的最小字段集
+BOOK_LIST_FIELDS = ["id", "title", "author", "cover_url", "cover_urls", "available_copies", "status"]
+
+
+def _parse_book_fields(request) -> list[str] | None:
+    raw = (request.GET.get("fields") or "").strip()
+    if raw:
+        fields = []
+        for name in raw.split(","):
+            name = name.strip()
+            if not name:
+                continue
+            if name not in BOOK_FIELD_COLUMNS:
+                raise ValueError(f"fields 不支持：{name}")
+            if name not in fields:
+                fields.append(name)
+    elif (request.GET.get("view") or "").strip() == "list":
+        fields = list(BOOK_LIST_FIELDS)
+    else:
+        return None
+
+    if "id" not in fields:
+        fields.insert(0, "id")
+    return fields
+
+
+def _book_value_columns(fields: list[str], *, extra=()) -> list[str]:
+    columns: list[str] = []
+    for name in fields:
+        for column in BOOK_FIELD_COLUMNS[name]:
+            if column not in columns:
+                columns.append(column)
+    for column in extra:
+        if column not in columns:
+            columns.append(column)
+    return columns
+
+
+def _serialize_book_values(row: dict, fields: list[str], request=None):
+    data = {}
+    for name in fields:
+        if name == "category":
+            category_id = row["category_id"]
+            data[name] = (
+                {"id": category_id, "name": row["category__name"]} if category_id else None
+            )
+        elif name == "cover_url":
+            cover_url = None
+            if row["cover"]:
+                try:
+                    cover_url = Book._meta.get_field("cover").storage.url(row["cover"])
+                    if request is not None:
+                        cover_url = request.build_absolute_uri(cover_url)
+                except Exception:
+                    cover_url = None
+            data[name] = cover_url
+        elif name == "cover_urls":
+            data[name] = cover_urls(
+                Book._meta.get_field("cover").storage, row["cover"], row["cover_variants"], request=request
+            )
+        elif name == "publish_date":
+            data[name] = row["publish_date"].isoformat() if row["publish_date"] else None
+        else:
+            data[name] = row[name]
+    return data
+
+
 def _serialize_category(category: Category):
     return {
         "id": category.id,
@@ -79,6 +192,8 @@ def _serialize_category(category: Category):
 
 
 @require_http_methods(["GET", "POST"])
+@catalog_conditional(categories_collection_etag, categories_collection_last_modified)
+@catalog_cached("categories", categories_collection_etag)
 def categories_collection(request):
     if request.method == "GET":
         qs = Category.objects.all().order_by("name")
@@ -88,7 +203,7 @@ def categories_collection(request):
         results = [_serialize_category(cat) for cat in qs]
         return _json_response({"ok": True, "count": len(results), "results": results})
 
-    if not _is_admin(request.user):
+    if not is_admin(request.user):
         return _json_error("无权限", status=403)
 
     data = _parse_json(request)
@@ -120,7 +235,7 @@ def category_item(request, category_id: int):
     if request.method == "GET":
         return _json_response({"ok": True, "category": _serialize_category(category)})
 
-    if not _is_admin(request.user):
+    if not is_admin(request.user):
         return _json_error("无权限", status=403)
 
     if request.method == "DELETE":
@@ -147,36 +262,83 @@ def category_item(request, category_id: int):
     return _json_response({"ok": True, "category": _serialize_category(category)})
 
 
-@require_http_methods(["GET", "POST"])
-def books_collection(request):
-    if request.method == "GET":
-        qs = Book.objects.select_related("category")
+def _filtered_books_qs(request):
+    qs = Book.objects.select_related("category")
 
-        kw = (request.GET.get("kw") or "").strip()
-        if kw:
-            qs = qs.filter(
-                Q(title__icontains=kw)
-                | Q(author__icontains=kw)
-                | Q(isbn__icontains=kw)
-                | Q(publisher__icontains=kw)
-            )
+    kw = (request.GET.get("kw") or "").strip()
+    if kw:
+        qs = search_books(qs, kw)
 
-        category_id = (request.GET.get("category") or "").strip()
-        if category_id.isdigit():
-            qs = qs.filter(category_id=int(category_id))
+    category_id = (request.GET.get("category") or "").strip()
+    if category_id.isdigit():
+        qs = qs.filter(category_id=int(category_id))
 
-        if not _is_admin(request.user):
-            qs = qs.filter(status=Book.Status.ON_SHELF)
-        else:
-            status = (request.GET.get("status") or "").strip()
-            if status:
-                qs = qs.filter(status=status)
+    if not is_admin(request.user):
+        qs = qs.filter(status=Book.Status.ON_SHELF)
+    else:
+        status = (request.GET.get("status") or "").strip()
+        if status:
+            qs = qs.filter(status=status)
 
-        qs = qs.order_by("-updated_at")
-        results = [_serialize_book(book, request=request) for book in qs]
-        return _json_response({"ok": True, "count": len(results), "results": results})
+    return qs
 
-    if not _is_admin(request.user):
+
+@require_http_methods(["GET", "POST"])
+@catalog_conditional(books_collection_etag, books_collection_last_modified)
+@catalog_cached("books", books_collection_etag)
+def books_collection(request):
+    if request.method == "GET":
+        qs = _filtered_books_qs(request)
+        try:
+            fields = _parse_book_fields(request)
+        except ValueError as exc:
+            return _json_error(str(exc), status=400)
+
+        def serialize(book):
+            if fields is None:
+                return _serialize_book(book, request=request)
+            return _serialize_book_values(book, fields, request=request)
+
+        if wants_keyset_page(request.GET):
+            page_qs = qs
+            if fields is not None:
+                # 投影到所需列，跳过模型实例化；游标列始终读取
+                page_qs = qs.values(*_book_value_columns(fields, extra=BOOK_CURSOR_FIELDS))
+            try:
+                limit = parse_limit(request.GET.get("limit"))
+                rows, next_cursor = keyset_page(
+                    page_qs,
+                    fields=BOOK_CURSOR_FIELDS,
+                    limit=limit,
+                    cursor=request.GET.get("cursor"),
+                )
+            except CursorError as exc:
+                return _json_error(str(exc), status=400)
+
+            payload = {
+                "ok": True,
+                "count": len(rows),
+                "limit": limit,
+                "next_cursor": next_cursor,
+                "has_more": next_cursor is not None,
+                "results": [serialize(book) for book in rows],
+            }
+            if _truthy(request.GET.get("with_total")):
+                payload["total"] = estimate_count(qs)
+            return _json_response(payload)
+
+        if (request.GET.get("kw") or "").strip():
+            # 有关键字时按相关度排序，同分再按更新时间
+            qs = qs.order_by("search_rank", "-updated_at", "-id")
+        else:
+            qs = qs.order_by("-updated_at")
+        if fields is not None:
+            qs = qs.values(*_book_value_columns(fields))
+        return json_list_response(
+            {"ok": True}, qs.iterator(chunk_size=ITERATOR_CHUNK_SIZE), serialize=serialize
+        )
+
+    if not is_admin(request.user):
         return _json_error("无权限", status=403)
 
     data = _parse_json(request)
@@ -230,11 +392,29 @@ def books_collection(request):
         book.save()
     except Exception:
         return _json_error("创建失败：请检查字段/ISBN 是否重复", status=400)
+    refresh_book(book)
 
     return _json_response({"ok": True, "book": _serialize_book(book, request=request)}, status=201)
 
 
+@require_http_methods(["GET"])
+def books_suggest(request):
+    q = (request.GET.get("q") or "").strip()
+    try:
+        limit = int(request.GET.get("limit") or DEFAULT_SUGGEST_LIMIT)
+    except ValueError:
+        return _json_error("limit 必须是整数", status=400)
+    limit = max(1, min(limit, MAX_SUGGEST_LIMIT))
+
+    results = []
+    if q:
+        statuses = None if is_admin(request.user) else {Book.Status.ON_SHELF}
+        results = get_suggest_index().lookup(q, limit=limit, statuses=statuses)
+    return _json_response({"ok": True, "q": q, "results": results})
+
+
 @require_http_methods(["GET", "PATCH", "DELETE"])
+@catalog_conditional(book_item_etag, book_item_last_modified)
 def book_item(request, book_id: int):
     try:
         book = Book.objects.select_related("category").get(pk=book_id)
@@ -242,11 +422,11 @@ def book_item(request, book_id: int):
         return _json_error("图书不存在", status=404)
 
     if request.method == "GET":
-        if not _is_admin(request.user) and book.status != Book.Status.ON_SHELF:
+        if not is_admin(request.user) and book.status != Book.Status.ON_SHELF:
             return _json_error("图书不存在", status=404)
         return _json_response({"ok": True, "book": _serialize_book(book, request=request)})
 
-    if not _is_admin(request.user):
+    if not is_admin(request.user):
         return _json_error("无权限", status=403)
 
     if request.method == "DELETE":
@@ -254,6 +434,7 @@ def book_item(request, book_id: int):
             book.delete()
         except ProtectedError:
             return _json_error("该图书存在关联数据，暂无法删除（建议先下架）", status=400)
+        forget_book(book_id)
         return _json_response({"ok": True})
 
     data = _parse_json(request)
@@ -316,6 +497,7 @@ def book_item(request, book_id: int):
         book.save()
     except Exception:
         return _json_error("更新失败：请检查字段/ISBN 是否重复", status=400)
+    refresh_book(book)
 
     return _json_response({"ok": True, "book": _serialize_book(book, request=request)})
 
@@ -327,7 +509,7 @@ def book_available_copies(request, book_id: int):
     except Book.DoesNotExist:
         return _json_error("图书不存在", status=404)
 
-    if not _is_admin(request.user) and book.status != Book.Status.ON_SHELF:
+    if not is_admin(request.user) and book.status != Book.Status.ON_SHELF:
         return _json_error("图书不存在", status=404)
 
     open_copy_ids = Borrow.objects.filter(
@@ -351,17 +533,18 @@ def book_cover(request, book_id: int):
     except Book.DoesNotExist:
         return _json_error("图书不存在", status=404)
 
-    if not _is_admin(request.user):
+    if not is_admin(request.user):
         return _json_error("无权限", status=403)
 
     if request.method == "DELETE":
         if book.cover:
-            try:
-                book.cover.delete(save=False)
-            except Exception:
-                pass
-            book.cover = None
-            book.save()
+            with transaction.atomic():
+                old_name, old_variants = book.cover.name, book.cover_variants
+                book.cover = None
+                book.cover_variants = None
+                book.save()
+                # 文件由 gc_covers 延迟清理，请求内不做文件删除
+                CoverBlob.release(old_name, variants=old_variants)
         return _json_response({"ok": True, "book": _serialize_book(book, request=request)})
 
     uploaded = request.FILES.get("cover") or request.FILES.get("file")
@@ -376,16 +559,27 @@ def book_cover(request, book_id: int):
     if getattr(uploaded, "size", 0) and uploaded.size > max_size:
         return _json_error("图片大小不能超过 5MB", status=400)
 
-    if book.cover:
-        try:
-            book.cover.delete(save=False)
-        except Exception:
-            pass
+    # 文件与 CoverBlob 记录在事务外先落地；图书更新失败时只需退回这次引用，
+    # 文件由 gc_covers 按记录清理，不会留下没有记录的孤儿文件
+    try:
+        blob = store_cover(uploaded)
+    except Exception:
+        return _json_error("上传失败", status=400)
 
-    book.cover = uploaded
     try:
-        book.save()
+        with transaction.atomic():
+            old_name = book.cover.name if book.cover else None
+            old_variants = book.cover_variants
+            book.cover = blob.name
+            book.cover_variants = blob.variants
+            book.save()
+            if old_name and old_name != blob.name:
+                CoverBlob.release(old_name, variants=old_variants)
+            elif old_name:
+                # 重复上传同一张图：store_cover 多加的一次引用抵消掉
+                CoverBlob.release(old_name)
     except Exception:
+        CoverBlob.release(blob.name, variants=blob.variants)
         return _json_error("上传失败", status=400)
 
     return _json_response({"ok": True, "book": _serialize_book(book, request=request)})
@@ -395,17 +589,19 @@ def book_cover(request, book_id: int):
 def admin_books_export(request):
     if not request.user.is_authenticated:
         return _json_error("未登录", status=401)
-    if not _is_admin(request.user):
+    if not is_admin(request.user):
         return _json_error("无权限", status=403)
 
-    today = timezone.localdate().isoformat()
-    filename = f"books_{today}.csv"
-
-    response = HttpResponse(content_type="text/csv; charset=utf-8")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    response.write("\ufeff")
+    try:
+        since = parse_since(request.GET.get("since"))
+    except ValueError as exc:
+        return _json_error(str(exc), status=400)
+    qs, watermark = export_window(Book.objects.all(), since)
 
-    export_books_to_csv(Book.objects.all(), response)
+    today = timezone.localdate().isoformat()
+    response = csv_streaming_response(request, iter_csv(BOOK_CSV_COLUMNS, book_csv_rows(qs)), filename=f"books_{today}.csv")
+    # 下次增量导出时作为 since 传回
+    response[WATERMARK_HEADER] = watermark.isoformat()
     return response
 
 
@@ -413,7 +609,7 @@ def admin_books_export(request):
 def admin_books_import(request):
     if not request.user.is_authenticated:
         return _json_error("未登录", status=401)
-    if not _is_admin(request.user):
+    if not is_admin(request.user):
         return _json_error("无权限", status=403)
 
     uploaded = request.FILES.get("file")
@@ -422,15 +618,54 @@ def admin_books_import(request):
 
     dry_run = _truthy(request.GET.get("dry_run"))
     atomic = _truthy(request.GET.get("atomic"))
-
-    try:
+    chunk_atomic = _truthy(request.GET.get("chunk_atomic"))
+    if atomic and chunk_atomic:
+        return _json_error("atomic 与 chunk_atomic 不能同时使用", status=400)
+    input_format = (request.GET.get("format") or "").strip().lower() or None
+    if input_format is not None and input_format not in IMPORT_FORMATS:
+        return _json_error(f"format 须为 {' / '.join(IMPORT_FORMATS)}", status=400)
+
+    if dry_run:
+        # 试运行不写库，直接在请求内执行并返回结果
         try:
+            fmt = IMPORT_FORMATS[input_format] if input_format else detect_import_format(uploaded.name)
             uploaded.file.seek(0)
-        except Exception:
-            pass
-        with wrap_uploaded_file(uploaded.file) as f:
-            result = import_books_from_csv(f, dry_run=dry_run, atomic=atomic)
+            with open_import_binary(uploaded.file, fmt) as bf, wrap_uploaded_file(bf) as f:
+                result = import_books_from_csv(
+                    f,
+                    dry_run=True,
+                    atomic=atomic,
+                    chunk_atomic=chunk_atomic,
+                    snapshot=_truthy(request.GET.get("snapshot")),
+                    input_format=fmt.kind,
+                )
+        except Exception as exc:
+            return _json_error(f"导入失败：{exc}", status=400)
+        return _json_response(result)
+
+    try:
+        job = create_import_job(
+            uploaded,
+            atomic=atomic,
+            chunk_atomic=chunk_atomic,
+            input_format=input_format,
+            user=request.user,
+        )
     except Exception as exc:
         return _json_error(f"导入失败：{exc}", status=400)
 
-    return _json_response(result)
+    # 由 import_books --worker 在后台执行，前端轮询 admin/books/import/<job_id>
+    return _json_response({"ok": True, "job": serialize_import_job(job)}, status=202)
+
+
+@require_http_methods(["GET"])
+def admin_books_import_job(request, job_id: int):
+    if not request.user.is_authenticated:
+        return _json_error("未登录", status=401)
+    if not is_admin(request.user):
+        return _json_error("无权限", status=403)
+
+    job = BookImportJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return _json_error("导入任务不存在", status=404)
+    return _json_response({"ok": True, "job": serialize_import_job(job)})
@@ -1,6 +1,8 @@
 from django.contrib import admin
-from django.utils import timezone
 
+from books.catalog_cache import bump_catalog_version
+
+from .batch import MAX_BATCH_ITEMS, RETURNED, return_batch
 from .models import Borrow, OverdueMailLog
 
 
@@ -11,16 +13,19 @@ class BorrowAdmin(admin.ModelAdmin):
     search_fields = ("user__username", "book__title", "book__isbn")
     date_hierarchy = "borrow_date"
 
+    def delete_queryset(self, request, queryset):
+        # 批量删除不经过 Borrow.delete
+        super().delete_queryset(request, queryset)
+        bump_catalog_version()
+
     @admin.action(description="标记为已归还（自动回补库存）")
     def mark_returned(self, request, queryset):
+        # 与接口相同的单批上限：每 MAX_BATCH_ITEMS 条一个事务，避免全选时锁住整张表
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True))
         updated = 0
-        for borrow in queryset:
-            if borrow.status == Borrow.Status.RETURNED:
-                continue
-            borrow.status = Borrow.Status.RETURNED
-            borrow.return_date = timezone.now()
-            borrow.save()
-            updated += 1
+        for start in range(0, len(ids), MAX_BATCH_ITEMS):
+            results = return_batch(ids[start : start + MAX_BATCH_ITEMS])
+            updated += sum(1 for result in results if result.outcome == RETURNED)
         self.message_user(request, f"已标记 {updated} 条记录为归还")
 
     actions = ("mark_returned",)
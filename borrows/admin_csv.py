@@ -1,6 +1,7 @@
 import csv
 
-from django.utils import timezone
+from books.admin_csv import csv_cell
+from books.streaming import ITERATOR_CHUNK_SIZE
 
 from .models import Borrow
 
@@ -23,36 +24,56 @@ BORROW_CSV_COLUMNS = [
 ]
 
 
-def _effective_status(borrow: Borrow) -> str:
-    if borrow.status != Borrow.Status.RETURNED and borrow.is_overdue:
-        return Borrow.Status.OVERDUE
-    return borrow.status
+def borrow_records(qs):
+    """逐行产出带原始类型的 dict（日期为 date/datetime，缺失为 None）；按 id 分块读取，内存占用与表大小无关。"""
+
+    for borrow in qs.select_related("user", "book", "copy").order_by("id").iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        user = borrow.user
+        book = borrow.book
+        copy_no = getattr(getattr(borrow, "copy", None), "copy_no", None)
+        yield {
+            "id": borrow.id,
+            "user_id": borrow.user_id,
+            "username": user.get_username(),
+            "mail": getattr(user, "mail", "") or "",
+            "book_id": borrow.book_id,
+            "copy_no": copy_no,
+            "copy_code": str(copy_no).zfill(3) if copy_no is not None else None,
+            "title": book.title,
+            "isbn": book.isbn,
+            "borrow_date": borrow.borrow_date,
+            "due_date": borrow.due_date,
+            "return_date": borrow.return_date,
+            "status": borrow.status,
+            "is_overdue": borrow.status == Borrow.Status.OVERDUE,
+        }
+
+
+def borrow_csv_rows(qs):
+    for record in borrow_records(qs):
+        yield {key: csv_cell(value) for key, value in record.items()}
+
+
+# 列式导出的列类型，见 books.columnar
+BORROW_COLUMNAR_SCHEMA = [
+    ("id", "int"),
+    ("user_id", "int"),
+    ("username", "category"),
+    ("mail", "category"),
+    ("book_id", "int"),
+    ("copy_no", "int"),
+    ("copy_code", "category"),
+    ("title", "category"),
+    ("isbn", "category"),
+    ("borrow_date", "timestamp"),
+    ("due_date", "date"),
+    ("return_date", "timestamp"),
+    ("status", "category"),
+    ("is_overdue", "bool"),
+]
 
 
 def export_borrows_to_csv(qs, out) -> None:
     writer = csv.DictWriter(out, fieldnames=BORROW_CSV_COLUMNS, lineterminator="\n")
     writer.writeheader()
-
-    today = timezone.localdate()
-    for borrow in qs.select_related("user", "book", "copy").order_by("id"):
-        user = borrow.user
-        book = borrow.book
-        copy_no = getattr(getattr(borrow, "copy", None), "copy_no", None)
-        writer.writerow(
-            {
-                "id": borrow.id,
-                "user_id": borrow.user_id,
-                "username": user.get_username(),
-                "mail": getattr(user, "mail", "") or "",
-                "book_id": borrow.book_id,
-                "copy_no": copy_no if copy_no is not None else "",
-                "copy_code": str(copy_no).zfill(3) if copy_no is not None else "",
-                "title": book.title,
-                "isbn": book.isbn,
-                "borrow_date": borrow.borrow_date.isoformat() if borrow.borrow_date else "",
-                "due_date": borrow.due_date.isoformat() if borrow.due_date else "",
-                "return_date": borrow.return_date.isoformat() if borrow.return_date else "",
-                "status": _effective_status(borrow),
-                "is_overdue": 1 if (borrow.return_date is None and borrow.due_date and borrow.due_date < today) else 0,
-            }
-        )
+    writer.writerows(borrow_csv_rows(qs))
@@ -0,0 +1,227 @@
+"""
+批量借阅与批量归还：用少量集合查询代替逐条 Borrow.save。
+
+借阅：锁定相关图书与副本 → 一次查出在借副本 → 逐项校验 → bulk_create →
+按图书聚合后一条 UPDATE 扣减 available_copies。
+归还：锁定借阅记录 → 一条 UPDATE 标记归还 → 按图书聚合后一条 UPDATE 回补库存。
+结果均按请求顺序逐项返回。
+"""
+
+from dataclasses import dataclass, field
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from books.catalog_cache import bump_catalog_version
+from books.models import Book, BookCopy
+
+from .models import Borrow
+
+
+MAX_BATCH_ITEMS = 200
+
+
+class BatchConflict(Exception):
+    """并发写入导致唯一约束冲突，整批已回滚，可重试。"""
+
+
+@dataclass(slots=True)
+class BatchItemResult:
+    index: int
+    ok: bool
+    message: str = ""
+    book_id: int | None = None
+    copy_no: int | None = None
+    borrow: Borrow | None = field(default=None, repr=False)
+
+
+def _parse_positive_int(value):
+    try:
+        parsed = int(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if parsed > 0 else None
+
+
+def adjust_available_copies(deltas: dict[int, int]) -> int:
+    """
+    按图书聚合的库存增减，一条 UPDATE 完成：
+    available_copies = available_copies + CASE id WHEN .. THEN .. END。
+    """
+
+    deltas = {book_id: delta for book_id, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    change = Case(
+        *[When(pk=book_id, then=Value(delta)) for book_id, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return Book.objects.filter(pk__in=list(deltas)).update(
+        available_copies=F("available_copies") + change, updated_at=timezone.now()
+    )
+
+
+def borrow_batch(user, items, *, due_date, atomic: bool = False) -> list[BatchItemResult]:
+    """
+    items 为 [{"book_id": .., "copy_no": ..}]。默认部分成功：通过校验的项照常借出；
+    atomic=True 时任一项失败则全部不借。并发冲突时抛 BatchConflict。
+    """
+
+    results: list[BatchItemResult] = []
+    wanted: dict[tuple[int, int], BatchItemResult] = {}
+    for index, item in enumerate(items):
+        result = BatchItemResult(index=index, ok=False)
+        results.append(result)
+        if not isinstance(item, dict):
+            result.message = "每项须为对象"
+            continue
+        result.book_id = _parse_positive_int(item.get("book_id"))
+        result.copy_no = _parse_positive_int(item.get("copy_no"))
+        if result.book_id is None:
+            result.message = "book_id 必须是正整数"
+        elif result.copy_no is None:
+            result.message = "copy_no 必须是正整数"
+        elif (result.book_id, result.copy_no) in wanted:
+            result.message = "同一副本重复出现"
+        else:
+            wanted[(result.book_id, result.copy_no)] = result
+
+    if not wanted:
+        return results
+
+    book_ids = {book_id for book_id, _ in wanted}
+    try:
+        with transaction.atomic():
+            books = Book.objects.select_for_update().in_bulk(book_ids)
+            copies = {
+                (copy.book_id, copy.copy_no): copy
+                for copy in BookCopy.objects.select_for_update().filter(
+                    book_id__in=book_ids, copy_no__in={copy_no for _, copy_no in wanted}, is_active=True
+                )
+            }
+            open_copy_ids = set(
+                Borrow.objects.filter(
+                    copy_id__in=[copy.id for copy in copies.values()], return_date__isnull=True
+                ).values_list("copy_id", flat=True)
+            )
+
+            taken: dict[int, int] = {}
+            accepted: list[BatchItemResult] = []
+            for (book_id, copy_no), result in wanted.items():
+                book = books.get(book_id)
+                copy = copies.get((book_id, copy_no))
+                if book is None:
+                    result.message = "图书不存在"
+                elif book.status != Book.Status.ON_SHELF:
+                    result.message = "该图书不可借"
+                elif copy is None:
+                    result.message = "副本不存在或不可借"
+                elif copy.id in open_copy_ids:
+                    result.message = "该副本已被借出"
+                elif book.available_copies - taken.get(book_id, 0) <= 0:
+                    result.message = "库存不足"
+                else:
+                    taken[book_id] = taken.get(book_id, 0) + 1
+                    result.borrow = Borrow(
+                        user=user,
+                        book=book,
+                        copy=copy,
+                        due_date=due_date,
+                        status=Borrow.Status.BORROWED,
+                    )
+                    accepted.append(result)
+
+            if not accepted or (atomic and len(accepted) < len(results)):
+                for result in accepted:
+                    result.borrow = None
+                    result.message = "同批次存在失败项，已全部取消"
+                return results
+
+            created = Borrow.objects.bulk_create([result.borrow for result in accepted])
+            for result, borrow in zip(accepted, created):
+                result.borrow = borrow
+                result.ok = True
+            adjust_available_copies({book_id: -n for book_id, n in taken.items()})
+            bump_catalog_version()
+    except IntegrityError as exc:
+        raise BatchConflict("部分副本刚被借出，请重试") from exc
+
+    return results
+
+
+# 批量归还的逐项结果
+RETURNED = "returned"
+ALREADY_RETURNED = "already_returned"
+NOT_FOUND = "not_found"
+FORBIDDEN = "forbidden"
+INVALID = "invalid"
+
+
+@dataclass(slots=True)
+class ReturnItemResult:
+    index: int
+    borrow_id: int | None
+    outcome: str
+    message: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.outcome in (RETURNED, ALREADY_RETURNED)
+
+
+def return_batch(borrow_ids, *, user=None) -> list[ReturnItemResult]:
+    """
+    批量归还。user 为 None 时不做归属检查（管理员）；否则只能归还本人的记录。
+    已归还的记录保持不变，按幂等处理（ok 为真，outcome 为 already_returned）。
+    """
+
+    results: list[ReturnItemResult] = []
+    wanted: dict[int, ReturnItemResult] = {}
+    for index, raw in enumerate(borrow_ids):
+        borrow_id = _parse_positive_int(raw)
+        result = ReturnItemResult(index=index, borrow_id=borrow_id, outcome=INVALID)
+        results.append(result)
+        if borrow_id is None:
+            result.message = "id 必须是正整数"
+        elif borrow_id in wanted:
+            result.message = "同一记录重复出现"
+        else:
+            wanted[borrow_id] = result
+
+    if not wanted:
+        return results
+
+    now = timezone.now()
+    with transaction.atomic():
+        rows = (
+            Borrow.objects.select_for_update()
+            .filter(pk__in=list(wanted))
+            .order_by()
+            .values_list("id", "user_id", "book_id", "return_date")
+        )
+        open_ids: list[int] = []
+        returned_per_book: dict[int, int] = {}
+        for borrow_id, owner_id, book_id, return_date in rows:
+            result = wanted[borrow_id]
+            if user is not None and owner_id != user.id:
+                result.outcome, result.message = FORBIDDEN, "无权限"
+            elif return_date is not None:
+                result.outcome, result.message = ALREADY_RETURNED, "已归还"
+            else:
+                result.outcome = RETURNED
+                open_ids.append(borrow_id)
+                returned_per_book[book_id] = returned_per_book.get(book_id, 0) + 1
+        for result in wanted.values():
+            if result.outcome == INVALID:
+                result.outcome, result.message = NOT_FOUND, "借阅记录不存在"
+
+        if open_ids:
+            Borrow.objects.filter(pk__in=open_ids, return_date__isnull=True).update(
+                status=Borrow.Status.RETURNED, return_date=now, updated_at=now
+            )
+            adjust_available_copies(returned_per_book)
+            bump_catalog_version()
+
+    return results
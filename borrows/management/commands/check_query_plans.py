@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from borrows.query_plans import canonical_queries, check_query, partial_index_names
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot circulation/catalog queries and fail if any of them needs a full table scan."
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ("sqlite", "postgresql"):
+            raise CommandError(f"暂不支持 {connection.vendor} 的执行计划检查")
+
+        partial = partial_index_names()
+        failed = []
+        for name, qs in canonical_queries():
+            plan, scans = check_query(qs, partial=partial)
+            if scans:
+                failed.append(name)
+                self.stdout.write(f"全表扫描 {name}：{', '.join(scans)}")
+            else:
+                self.stdout.write(f"OK {name}")
+            if scans or options["verbosity"] >= 2:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if failed:
+            raise CommandError(f"{len(failed)} 条查询存在全表扫描")
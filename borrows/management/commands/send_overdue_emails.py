@@ -6,7 +6,7 @@ from django.utils import timezone
 from django.utils.dateparse import parse_date
 
 from borrows.models import OverdueMailLog
-from borrows.overdue import build_overdue_email, overdue_borrows_qs
+from borrows.overdue import build_overdue_email, overdue_borrows_qs, sweep_overdue
 
 
 class Command(BaseCommand):
@@ -34,7 +34,10 @@ class Command(BaseCommand):
 
         grouped = {}
         users = {}
-        for borrow in overdue_borrows_qs(today):
+        if not dry_run:
+            # 按当天刷新存储的逾期状态后再读取；试运行不写库，沿用上一次清扫的结果
+            sweep_overdue(today)
+        for borrow in overdue_borrows_qs():
             grouped.setdefault(borrow.user_id, []).append(borrow)
             users[borrow.user_id] = borrow.user
 
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from borrows.overdue import sweep_overdue
+
+
+class Command(BaseCommand):
+    help = "Mark open, past-due borrows as overdue (and restore renewed ones) in one set-based update."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="指定日期 YYYY-MM-DD（默认 today）")
+
+    def handle(self, *args, **options):
+        if options.get("date"):
+            today = parse_date(str(options["date"]))
+            if today is None:
+                raise CommandError("date 格式应为 YYYY-MM-DD")
+        else:
+            today = timezone.localdate()
+
+        marked, restored = sweep_overdue(today)
+        self.stdout.write(f"date={today.isoformat()} marked_overdue={marked} restored={restored}")
@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrows", "0004_alter_borrow_copy_cascade"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(fields=["updated_at"], name="borrow_updated_at_idx"),
+        ),
+    ]
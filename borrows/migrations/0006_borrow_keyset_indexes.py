@@ -0,0 +1,22 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrows", "0005_borrow_updated_at_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(fields=["-borrow_date", "-id"], name="borrow_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(fields=["user", "-borrow_date", "-id"], name="borrow_user_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(fields=["book", "-borrow_date", "-id"], name="borrow_book_date_idx"),
+        ),
+    ]
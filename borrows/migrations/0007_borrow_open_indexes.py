@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrows", "0006_borrow_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(
+                condition=models.Q(("return_date__isnull", True)), fields=["book"], name="borrow_open_book_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(
+                condition=models.Q(("return_date__isnull", True)),
+                fields=["user", "due_date"],
+                name="borrow_open_user_due_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(
+                condition=models.Q(("return_date__isnull", True)), fields=["due_date"], name="borrow_open_due_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("borrows", "0007_borrow_open_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(
+                condition=models.Q(("status", "overdue")),
+                fields=["user", "due_date"],
+                name="borrow_overdue_user_due_idx",
+            ),
+        ),
+    ]
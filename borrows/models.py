@@ -6,6 +6,8 @@ from django.db.models import F, Q
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from books.catalog_cache import bump_catalog_version
+
 
 class Borrow(models.Model):
     class Status(models.TextChoices):
@@ -55,13 +57,29 @@ class Borrow(models.Model):
                 name="borrow_returned_requires_return_date",
             ),
         ]
+        indexes = [
+            models.Index(fields=["updated_at"], name="borrow_updated_at_idx"),
+            # GET /api/borrows 的游标分页：(-borrow_date, -id)，可按用户或图书过滤
+            models.Index(fields=["-borrow_date", "-id"], name="borrow_date_id_idx"),
+            models.Index(fields=["user", "-borrow_date", "-id"], name="borrow_user_date_idx"),
+            models.Index(fields=["book", "-borrow_date", "-id"], name="borrow_book_date_idx"),
+            # 未归还记录（return_date IS NULL）只占全表一小部分，部分索引更小、更新更少
+            models.Index(fields=["book"], condition=Q(return_date__isnull=True), name="borrow_open_book_idx"),
+            models.Index(
+                fields=["user", "due_date"], condition=Q(return_date__isnull=True), name="borrow_open_user_due_idx"
+            ),
+            models.Index(fields=["due_date"], condition=Q(return_date__isnull=True), name="borrow_open_due_idx"),
+            # 存储的逾期状态（见 borrows.overdue.sweep_overdue）
+            models.Index(
+                fields=["user", "due_date"], condition=Q(status="overdue"), name="borrow_overdue_user_due_idx"
+            ),
+        ]
 
 
     @property
     def is_overdue(self) -> bool:
-        if self.status == self.Status.RETURNED:
-            return False
-        return timezone.localdate() > self.due_date
+        # 以存储状态为准：由 save() 与每日的 sweep_overdue 维护
+        return self.status == self.Status.OVERDUE
 
     def clean(self) -> None:
         if self.status == self.Status.RETURNED and not self.return_date:
@@ -87,6 +105,8 @@ class Borrow(models.Model):
         Book = apps.get_model("books", "Book")
         BookCopy = apps.get_model("books", "BookCopy")
 
+        # 借还改变 available_copies 时同时更新 Book.updated_at（与 borrows.batch 一致），
+        # 目录的 -updated_at 排序与增量导出都能看到库存变化
         with transaction.atomic():
             previous = None
             if self.pk:
@@ -121,7 +141,7 @@ class Borrow(models.Model):
                         status=Book.Status.ON_SHELF,
                         available_copies__gt=0,
                     )
-                    .update(available_copies=F("available_copies") - 1)
+                    .update(available_copies=F("available_copies") - 1, updated_at=timezone.now())
                 )
                 if updated == 0:
                     raise ValidationError(_("该图书不可借或库存不足"))
@@ -130,7 +150,7 @@ class Borrow(models.Model):
                 if not self.return_date:
                     self.return_date = timezone.now()
                 Book.objects.filter(pk=self.book_id).update(
-                    available_copies=F("available_copies") + 1
+                    available_copies=F("available_copies") + 1, updated_at=timezone.now()
                 )
 
             if not is_creating and was_returned and (not will_be_returned):
@@ -148,12 +168,23 @@ class Borrow(models.Model):
                         status=Book.Status.ON_SHELF,
                         available_copies__gt=0,
                     )
-                    .update(available_copies=F("available_copies") - 1)
+                    .update(available_copies=F("available_copies") - 1, updated_at=timezone.now())
                 )
                 if updated == 0:
                     raise ValidationError(_("该图书不可借或库存不足"))
 
+            # 与 sweep_overdue 一致：未归还记录的状态随应还日期变化
+            if self.status in (self.Status.BORROWED, self.Status.OVERDUE) and self.due_date:
+                overdue = self.due_date < timezone.localdate()
+                self.status = self.Status.OVERDUE if overdue else self.Status.BORROWED
+
             super().save(*args, **kwargs)
+            bump_catalog_version()
+
+    def delete(self, *args, **kwargs):  # type: ignore[override]
+        result = super().delete(*args, **kwargs)
+        bump_catalog_version()
+        return result
 
     def __str__(self) -> str:
         return f"{self.user_id} - {self.book_id} ({self.status})"
@@ -1,11 +1,44 @@
+from django.db import transaction
+from django.utils import timezone
+
+from books.catalog_cache import bump_catalog_version
+
 from .models import Borrow
 
 
-def overdue_borrows_qs(today):
+def sweep_overdue(today=None) -> tuple[int, int]:
+    """
+    按日期批量刷新存储的状态：未归还且已过应还日期的 borrowed 记为 overdue，
+    应还日期已被延后的 overdue 改回 borrowed。各一条 UPDATE，返回 (记为逾期数, 恢复数)。
+    """
+
+    if today is None:
+        today = timezone.localdate()
+    now = timezone.now()
+    with transaction.atomic():
+        marked = Borrow.objects.filter(
+            return_date__isnull=True, due_date__lt=today, status=Borrow.Status.BORROWED
+        ).update(status=Borrow.Status.OVERDUE, updated_at=now)
+        restored = Borrow.objects.filter(
+            return_date__isnull=True, due_date__gte=today, status=Borrow.Status.OVERDUE
+        ).update(status=Borrow.Status.BORROWED, updated_at=now)
+        if marked or restored:
+            bump_catalog_version()
+    return marked, restored
+
+
+def overdue_count() -> int:
+    """当前逾期的借阅数（依赖存储状态，走 borrow_overdue_user_due_idx）。"""
+
+    return Borrow.objects.filter(status=Borrow.Status.OVERDUE).count()
+
+
+def overdue_borrows_qs():
+    """存储状态为 overdue 的借阅（由定时执行的 sweep_overdue 维护），走 borrow_overdue_user_due_idx。"""
+
     return (
         Borrow.objects.select_related("book", "user")
-        .filter(return_date__isnull=True, due_date__lt=today)
-        .exclude(status=Borrow.Status.RETURNED)
+        .filter(status=Borrow.Status.OVERDUE)
         .order_by("user_id", "due_date", "id")
     )
 
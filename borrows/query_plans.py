@@ -0,0 +1,118 @@
+"""
+流通相关的热点查询及其执行计划检查（manage.py check_query_plans）。
+
+canonical_queries() 列出 borrows.views、borrows.overdue、books.views 中的典型查询；
+参数取占位值，执行计划与具体值无关。任一查询对表做全表扫描即视为缺少索引。
+
+PostgreSQL 上检查时关闭 enable_seqscan：小表上规划器总会选顺序扫描，关闭后
+只有在没有可用索引时才会出现 Seq Scan。
+"""
+
+import json
+import re
+
+from django.apps import apps
+from django.db import connections, transaction
+from django.utils import timezone
+
+from books.models import Book, BookCopy
+
+from .models import Borrow
+from .overdue import overdue_borrows_qs
+
+
+PAGE_PROBE = 21
+
+
+def canonical_queries() -> list[tuple[str, object]]:
+    listing = Borrow.objects.select_related("book", "copy", "user").order_by("-borrow_date", "-id")
+    open_copy_ids = Borrow.objects.filter(book_id=0, return_date__isnull=True).values_list("copy_id", flat=True)
+    return [
+        ("borrows.views 借阅列表（游标分页）", listing[:PAGE_PROBE]),
+        ("borrows.views 用户的借阅（按时间）", listing.filter(user_id=0)[:PAGE_PROBE]),
+        ("borrows.views 图书的借阅（按时间）", listing.filter(book_id=0)[:PAGE_PROBE]),
+        ("borrows.views 副本是否在借", Borrow.objects.filter(copy_id=0, return_date__isnull=True)),
+        ("borrows.views 用户未归还", Borrow.objects.filter(user_id=0, return_date__isnull=True)),
+        ("borrows.overdue 逾期列表", overdue_borrows_qs()),
+        ("borrows.overdue 逾期数量", Borrow.objects.filter(status=Borrow.Status.OVERDUE).order_by()),
+        ("books.views 图书在借数量", Borrow.objects.filter(book_id=0, return_date__isnull=True)),
+        (
+            "books.views 可借副本",
+            BookCopy.objects.filter(book_id=0, is_active=True).exclude(id__in=open_copy_ids).order_by("copy_no"),
+        ),
+        (
+            "books.views 图书列表（游标分页）",
+            Book.objects.select_related("category").order_by("-updated_at", "-id")[:PAGE_PROBE],
+        ),
+        ("books.views 按 ISBN 查找", Book.objects.filter(isbn="")),
+    ]
+
+
+_SQLITE_SCAN = re.compile(r"\bSCAN (\S+)(?: USING (?:COVERING )?INDEX (\S+))?")
+
+
+def partial_index_names() -> set[str]:
+    names = set()
+    for model in apps.get_models():
+        for index in [*model._meta.indexes, *model._meta.constraints]:
+            if getattr(index, "condition", None) is not None:
+                names.add(index.name)
+    return names
+
+
+def _is_bounded_index_scan(index: str | None, *, limited: bool, partial: set[str]) -> bool:
+    # 按索引顺序扫描：带 LIMIT 时读到够数即停；部分索引只含未归还等少量行
+    return index is not None and (limited or index in partial)
+
+
+def _postgres_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from _postgres_nodes(child)
+
+
+def full_scans(vendor: str, plan: str, *, limited: bool = False, partial: set[str] = frozenset()) -> list[str]:
+    """
+    返回执行计划中被全表扫描的表名。limited 表示查询带 LIMIT。
+    SQLite 的 SCAN（无 USING INDEX）、PostgreSQL 的 Seq Scan 均视为全表扫描；
+    无索引条件的整索引扫描只在带 LIMIT 或使用部分索引时放行。
+    """
+
+    tables = []
+    if vendor == "sqlite":
+        for line in plan.splitlines():
+            match = _SQLITE_SCAN.search(line)
+            if match is None or match.group(1) in ("CONSTANT", "SUBQUERY"):
+                continue
+            if not _is_bounded_index_scan(match.group(2), limited=limited, partial=partial):
+                tables.append(match.group(1))
+        return tables
+
+    for root in json.loads(plan):
+        for node in _postgres_nodes(root["Plan"]):
+            node_type = node.get("Node Type")
+            if node_type == "Seq Scan":
+                tables.append(node.get("Relation Name"))
+            elif node_type in ("Index Scan", "Index Only Scan") and "Index Cond" not in node:
+                if not _is_bounded_index_scan(node.get("Index Name"), limited=limited, partial=partial):
+                    tables.append(node.get("Relation Name"))
+    return tables
+
+
+def explain(qs) -> str:
+    connection = connections[qs.db]
+    if connection.vendor == "postgresql":
+        with transaction.atomic(using=qs.db):
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return qs.explain(format="json")
+    return qs.explain()
+
+
+def check_query(qs, *, partial: set[str]) -> tuple[str, list[str]]:
+    """返回 (执行计划, 全表扫描的表)。"""
+
+    connection = connections[qs.db]
+    plan = explain(qs)
+    limited = qs.query.high_mark is not None
+    return plan, full_scans(connection.vendor, plan, limited=limited, partial=partial)
@@ -5,6 +5,8 @@ from . import views
 
 urlpatterns = [
     path("borrows", views.borrows_collection, name="borrows_collection"),
+    path("borrows/batch", views.borrows_batch, name="borrows_batch"),
+    path("borrows/return-batch", views.borrows_return_batch, name="borrows_return_batch"),
     path("borrows/<int:borrow_id>/return", views.return_borrow, name="return_borrow"),
     path("borrows/<int:borrow_id>/renew", views.renew_borrow, name="renew_borrow"),
     path("admin/borrows/export", views.admin_borrows_export, name="admin_borrows_export"),
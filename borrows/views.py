@@ -1,20 +1,34 @@
 import json
-from datetime import timedelta
+from datetime import datetime, time, timedelta
+from itertools import groupby
 
 from django.conf import settings
 from django.core.mail import send_mail
 from django.db import IntegrityError
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse
 from django.utils import timezone
 from django.utils.dateparse import parse_date
 from django.views.decorators.http import require_http_methods
 
+from books.covers import cover_urls
+from books.export_window import WATERMARK_HEADER, export_window, parse_since
 from books.models import Book
 from books.models import BookCopy
+from books.pagination import CursorError, keyset_page, parse_limit, wants_keyset_page
+from books.streaming import ITERATOR_CHUNK_SIZE, csv_streaming_response, iter_csv, json_list_response
 
-from .admin_csv import export_borrows_to_csv
+from .admin_csv import BORROW_CSV_COLUMNS, borrow_csv_rows
+from .batch import MAX_BATCH_ITEMS, RETURNED, BatchConflict, borrow_batch, return_batch
 from .models import Borrow, OverdueMailLog
-from .overdue import build_overdue_email, overdue_borrows_qs, serialize_overdue_item
+from .overdue import (
+    build_overdue_email,
+    overdue_borrows_qs,
+    overdue_count,
+    serialize_overdue_item,
+)
+
+
+BORROW_CURSOR_FIELDS = ["borrow_date", "id"]
 
 
 def _json_response(payload, *, status=200):
@@ -33,6 +47,47 @@ def _parse_json(request):
         return None
 
 
+def _parse_day(params, key: str):
+    raw = (params.get(key) or "").strip()
+    if not raw:
+        return None
+    value = parse_date(raw)
+    if value is None:
+        raise ValueError(f"{key} 格式应为 YYYY-MM-DD")
+    return value
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _filter_borrows(qs, params):
+    """
+    借阅日期范围（borrowed_from/borrowed_to，含当天）、due_before（不含）、book_id/isbn。
+    日期换算成列上的范围比较，不对列套函数，以便走 (book/user, -borrow_date, -id) 索引。
+    """
+
+    borrowed_from = _parse_day(params, "borrowed_from")
+    if borrowed_from:
+        qs = qs.filter(borrow_date__gte=_day_start(borrowed_from))
+    borrowed_to = _parse_day(params, "borrowed_to")
+    if borrowed_to:
+        qs = qs.filter(borrow_date__lt=_day_start(borrowed_to + timedelta(days=1)))
+    due_before = _parse_day(params, "due_before")
+    if due_before:
+        qs = qs.filter(due_date__lt=due_before)
+
+    book_id = (params.get("book_id") or "").strip()
+    if book_id:
+        if not book_id.isdigit():
+            raise ValueError("book_id 必须是整数")
+        qs = qs.filter(book_id=int(book_id))
+    isbn = (params.get("isbn") or "").strip()
+    if isbn:
+        qs = qs.filter(book_id__in=Book.objects.filter(isbn=isbn).values("id"))
+    return qs
+
+
 def _is_admin(user) -> bool:
     if not user.is_authenticated:
         return False
@@ -43,12 +98,6 @@ def _truthy(value) -> bool:
     return str(value or "").strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
-def _effective_status(borrow: Borrow) -> str:
-    if borrow.status != Borrow.Status.RETURNED and borrow.is_overdue:
-        return Borrow.Status.OVERDUE
-    return borrow.status
-
-
 def _serialize_borrow(borrow: Borrow, request=None):
     cover_url = None
     if getattr(borrow.book, "cover", None):
@@ -59,6 +108,12 @@ def _serialize_borrow(borrow: Borrow, request=None):
         except Exception:
             cover_url = None
 
+    urls = None
+    if getattr(borrow.book, "cover", None):
+        urls = cover_urls(
+            borrow.book.cover.storage, borrow.book.cover.name, borrow.book.cover_variants, request=request
+        )
+
     return {
         "id": borrow.id,
         "user": {"id": borrow.user_id, "username": borrow.user.get_username()},
@@ -67,6 +122,7 @@ def _serialize_borrow(borrow: Borrow, request=None):
             "title": borrow.book.title,
             "isbn": borrow.book.isbn,
             "cover_url": cover_url,
+            "cover_urls": urls,
         },
         "copy": {
             "id": borrow.copy_id,
@@ -80,8 +136,8 @@ def _serialize_borrow(borrow: Borrow, request=None):
         "borrow_date": borrow.borrow_date.isoformat() if borrow.borrow_date else None,
         "due_date": borrow.due_date.isoformat() if borrow.due_date else None,
         "return_date": borrow.return_date.isoformat() if borrow.return_date else None,
-        "status": _effective_status(borrow),
-        "is_overdue": borrow.is_overdue,
+        "status": borrow.status,
+        "is_overdue": borrow.status == Borrow.Status.OVERDUE,
     }
 
 
@@ -91,7 +147,7 @@ def borrows_collection(request):
         return _json_error("未登录", status=401)
 
     if request.method == "GET":
-        qs = Borrow.objects.select_related("book", "copy", "user").order_by("-borrow_date")
+        qs = Borrow.objects.select_related("book", "copy", "user").order_by("-borrow_date", "-id")
 
         if not _is_admin(request.user):
             qs = qs.filter(user_id=request.user.id)
@@ -102,16 +158,37 @@ def borrows_collection(request):
 
         status = (request.GET.get("status") or "").strip()
         if status:
-            if status == Borrow.Status.OVERDUE:
-                today = timezone.localdate()
-                qs = qs.filter(return_date__isnull=True, due_date__lt=today).exclude(
-                    status=Borrow.Status.RETURNED
+            qs = qs.filter(status=status)
+
+        try:
+            qs = _filter_borrows(qs, request.GET)
+        except ValueError as exc:
+            return _json_error(str(exc), status=400)
+
+        if wants_keyset_page(request.GET):
+            try:
+                limit = parse_limit(request.GET.get("limit"))
+                rows, next_cursor = keyset_page(
+                    qs, fields=BORROW_CURSOR_FIELDS, limit=limit, cursor=request.GET.get("cursor")
                 )
-            else:
-                qs = qs.filter(status=status)
+            except CursorError as exc:
+                return _json_error(str(exc), status=400)
+            return _json_response(
+                {
+                    "ok": True,
+                    "count": len(rows),
+                    "limit": limit,
+                    "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None,
+                    "results": [_serialize_borrow(b, request=request) for b in rows],
+                }
+            )
 
-        results = [_serialize_borrow(b, request=request) for b in qs]
-        return _json_response({"ok": True, "count": len(results), "results": results})
+        return json_list_response(
+            {"ok": True},
+            qs.iterator(chunk_size=ITERATOR_CHUNK_SIZE),
+            serialize=lambda b: _serialize_borrow(b, request=request),
+        )
 
     data = _parse_json(request)
     if data is None:
@@ -172,6 +249,86 @@ def borrows_collection(request):
     return _json_response({"ok": True, "borrow": _serialize_borrow(borrow, request=request)}, status=201)
 
 
+def _serialize_batch_item(result, request=None):
+    item = {"index": result.index, "book_id": result.book_id, "copy_no": result.copy_no, "ok": result.ok}
+    if result.ok:
+        item["borrow"] = _serialize_borrow(result.borrow, request=request)
+    else:
+        item["message"] = result.message
+    return item
+
+
+@require_http_methods(["POST"])
+def borrows_batch(request):
+    if not request.user.is_authenticated:
+        return _json_error("未登录", status=401)
+
+    data = _parse_json(request)
+    if not isinstance(data, dict):
+        return _json_error("JSON 格式错误", status=400)
+
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return _json_error("items 须为非空数组", status=400)
+    if len(items) > MAX_BATCH_ITEMS:
+        return _json_error(f"单次最多借阅 {MAX_BATCH_ITEMS} 本", status=400)
+
+    if data.get("due_date"):
+        due_date = parse_date(str(data.get("due_date")))
+        if due_date is None:
+            return _json_error("due_date 格式应为 YYYY-MM-DD", status=400)
+    else:
+        due_date = timezone.localdate() + timedelta(days=14)
+    if due_date < timezone.localdate():
+        return _json_error("due_date 不能早于今天", status=400)
+
+    try:
+        results = borrow_batch(request.user, items, due_date=due_date, atomic=_truthy(data.get("atomic")))
+    except BatchConflict as exc:
+        return _json_error(str(exc), status=409)
+
+    created = sum(1 for result in results if result.ok)
+    return _json_response(
+        {
+            "ok": True,
+            "created": created,
+            "failed": len(results) - created,
+            "results": [_serialize_batch_item(result, request=request) for result in results],
+        },
+        status=201 if created else 200,
+    )
+
+
+@require_http_methods(["POST"])
+def borrows_return_batch(request):
+    if not request.user.is_authenticated:
+        return _json_error("未登录", status=401)
+
+    data = _parse_json(request)
+    if not isinstance(data, dict):
+        return _json_error("JSON 格式错误", status=400)
+
+    ids = data.get("ids")
+    if not isinstance(ids, list) or not ids:
+        return _json_error("ids 须为非空数组", status=400)
+    if len(ids) > MAX_BATCH_ITEMS:
+        return _json_error(f"单次最多归还 {MAX_BATCH_ITEMS} 条", status=400)
+
+    results = return_batch(ids, user=None if _is_admin(request.user) else request.user)
+    returned = sum(1 for result in results if result.outcome == RETURNED)
+    return _json_response(
+        {
+            "ok": True,
+            "returned": returned,
+            "failed": sum(1 for result in results if not result.ok),
+            "results": [
+                {"index": r.index, "id": r.borrow_id, "ok": r.ok, "outcome": r.outcome, "message": r.message}
+                for r in results
+            ],
+        }
+    )
+
+
 @require_http_methods(["POST"])
 def return_borrow(request, borrow_id: int):
     if not request.user.is_authenticated:
@@ -227,9 +384,8 @@ def renew_borrow(request, borrow_id: int):
     if due_date < timezone.localdate():
         return _json_error("due_date 不能早于今天", status=400)
 
+    # save() 按新的应还日期重新判定 borrowed/overdue
     borrow.due_date = due_date
-    if borrow.status == Borrow.Status.OVERDUE and not borrow.is_overdue:
-        borrow.status = Borrow.Status.BORROWED
 
     try:
         borrow.full_clean()
@@ -249,14 +405,16 @@ def admin_borrows_export(request):
     if not _is_admin(request.user):
         return _json_error("无权限", status=403)
 
-    today = timezone.localdate().isoformat()
-    filename = f"borrows_{today}.csv"
-
-    response = HttpResponse(content_type="text/csv; charset=utf-8")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    response.write("\ufeff")
+    try:
+        since = parse_since(request.GET.get("since"))
+    except ValueError as exc:
+        return _json_error(str(exc), status=400)
+    qs, watermark = export_window(Borrow.objects.all(), since)
 
-    export_borrows_to_csv(Borrow.objects.all(), response)
+    today = timezone.localdate().isoformat()
+    response = csv_streaming_response(request, iter_csv(BORROW_CSV_COLUMNS, borrow_csv_rows(qs)), filename=f"borrows_{today}.csv")
+    # 下次增量导出时作为 since 传回
+    response[WATERMARK_HEADER] = watermark.isoformat()
     return response
 
 
@@ -272,32 +430,23 @@ def admin_overdue_preview(request):
         OverdueMailLog.objects.filter(sent_date=today).values_list("user_id", flat=True)
     )
 
-    groups: dict[int, dict] = {}
-    for borrow in overdue_borrows_qs(today):
-        user = borrow.user
-        group = groups.get(user.id)
-        if group is None:
-            group = {
+    def user_groups():
+        # overdue_borrows_qs 按 user_id 排序，逐个用户分组输出，无需先汇总全部记录
+        rows = overdue_borrows_qs().iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        for _, borrows in groupby(rows, key=lambda b: b.user_id):
+            items = list(borrows)
+            user = items[0].user
+            yield {
                 "user": {"id": user.id, "username": user.get_username(), "mail": getattr(user, "mail", None)},
                 "already_sent": user.id in sent_user_ids,
-                "items": [],
-            }
-            groups[user.id] = group
-        group["items"].append(serialize_overdue_item(borrow, today=today))
-
-    results = []
-    for group in groups.values():
-        results.append(
-            {
-                "user": group["user"],
-                "already_sent": group["already_sent"],
-                "borrow_count": len(group["items"]),
-                "items": group["items"],
+                "borrow_count": len(items),
+                "items": [serialize_overdue_item(borrow, today=today) for borrow in items],
             }
-        )
 
-    return _json_response(
-        {"ok": True, "date": today.isoformat(), "user_count": len(results), "results": results}
+    return json_list_response(
+        {"ok": True, "date": today.isoformat(), "borrow_count": overdue_count()},
+        user_groups(),
+        count_key="user_count",
     )
 
 
@@ -317,7 +466,7 @@ def admin_overdue_send(request):
     )
     grouped: dict[int, list[Borrow]] = {}
     users: dict[int, object] = {}
-    for borrow in overdue_borrows_qs(today):
+    for borrow in overdue_borrows_qs():
         grouped.setdefault(borrow.user_id, []).append(borrow)
         users[borrow.user_id] = borrow.user
 
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'library_project.settings')
 
 application = get_asgi_application()
+
+# 搜索联想索引在后台线程中预先构建，首个请求不必等待
+from books.suggest import start_suggest_index  # noqa: E402
+
+start_suggest_index()
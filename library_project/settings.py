@@ -195,6 +195,35 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "").strip().lower() in {"1", "true", "yes", "y", "on"}
 EMAIL_USE_SSL = os.getenv("EMAIL_USE_SSL", "").strip().lower() in {"1", "true", "yes", "y", "on"}
 
+# Shared cache backend. Without REDIS_URL Django falls back to a per-process
+# LocMemCache, which cannot carry the catalog version across workers.
+REDIS_URL = os.getenv("REDIS_URL", "")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+
+# Catalog response cache (books/categories list), seconds; only on a shared cache
+CATALOG_CACHE_ENABLED = bool(REDIS_URL)
+CATALOG_CACHE_TIMEOUT = int(os.getenv("CATALOG_CACHE_TIMEOUT", "300"))
+CATALOG_CACHE_MAX_BYTES = int(os.getenv("CATALOG_CACHE_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# Incremental exports re-read this many seconds before the previous watermark so
+# rows stamped inside a then-open transaction are not skipped; keep it above the
+# longest write transaction
+EXPORT_WATERMARK_LAG_SECONDS = int(os.getenv("EXPORT_WATERMARK_LAG_SECONDS", "120"))
+
+# Import workers refresh BookImportJob.heartbeat_at every third of this many
+# seconds; running jobs with an older heartbeat are reclaimed and resumed by
+# another `import_books --worker`
+IMPORT_JOB_LEASE_SECONDS = int(os.getenv("IMPORT_JOB_LEASE_SECONDS", "300"))
+
+# List endpoints switch to StreamingHttpResponse above this many rows
+JSON_STREAM_THRESHOLD = int(os.getenv("JSON_STREAM_THRESHOLD", "200"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 